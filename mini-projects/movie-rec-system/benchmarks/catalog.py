@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from movie_rec_system.etl.database import MovieDatabase
+from movie_rec_system.etl.extract import MOVIE_COLUMNS
+
+# the movie genres of TMDB
+GENRES = {
+    28: "Action",
+    12: "Adventure",
+    16: "Animation",
+    35: "Comedy",
+    80: "Crime",
+    99: "Documentary",
+    18: "Drama",
+    10751: "Family",
+    14: "Fantasy",
+    36: "History",
+    27: "Horror",
+    10402: "Music",
+    9648: "Mystery",
+    10749: "Romance",
+    878: "Science Fiction",
+    10770: "TV Movie",
+    53: "Thriller",
+    10752: "War",
+    37: "Western",
+}
+
+
+def make_words(n_words, rng):
+    """Return ``n_words`` distinct made-up lowercase words"""
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = set()
+
+    while len(words) < n_words:
+        lengths = rng.integers(3, 10, n_words)
+        chars = rng.choice(letters, (n_words, 9))
+        words.update(
+            "".join(row[:length]) for row, length in zip(chars, lengths)
+        )
+
+    return np.array(sorted(words)[:n_words], dtype=object)
+
+
+def make_movies(n_movies, seed=0, n_topics=200, n_words=20_000):
+    """
+    Generate a synthetic catalog of ``n_movies`` movies with the
+    columns of the movies table.
+
+    Overviews mix words of one of ``n_topics`` topics with random
+    words, so movies of the same topic are similar to each other as
+    in a real catalog. Titles are made of one to four words; some are
+    repeated, like remakes. Popularity and vote counts are
+    long-tailed.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per movie, with unique ids.
+    """
+    rng = np.random.default_rng(seed)
+    words = make_words(n_words, rng)
+    topics = rng.integers(0, n_words, (n_topics, 40))
+    topic = rng.integers(0, n_topics, n_movies)
+    overview_words = np.concatenate(
+        [
+            words[topics[topic[:, None], rng.integers(0, 40, (n_movies, 15))]],
+            words[rng.integers(0, n_words, (n_movies, 5))],
+        ],
+        axis=1,
+    )
+    title_words = words[rng.integers(0, n_words, (n_movies, 4))]
+    title_lengths = rng.integers(1, 5, n_movies)
+    genre_ids = np.array(list(GENRES))
+    movie_genres = genre_ids[rng.integers(0, len(genre_ids), (n_movies, 3))]
+    genre_counts = rng.integers(1, 4, n_movies)
+
+    movies = pd.DataFrame(
+        {
+            "genre_ids": [
+                list(dict.fromkeys(row[:count].tolist()))
+                for row, count in zip(movie_genres, genre_counts)
+            ],
+            "id": np.arange(1, n_movies + 1),
+            "original_language": "en",
+            "overview": [" ".join(row) for row in overview_words],
+            "popularity": rng.pareto(1.5, n_movies) * 10,
+            "release_date": "2020-01-01",
+            "title": [
+                " ".join(row[:length]).title()
+                for row, length in zip(title_words, title_lengths)
+            ],
+            "vote_average": rng.uniform(1, 10, n_movies).round(1),
+            "vote_count": rng.zipf(1.8, n_movies).clip(1, 50_000),
+        }
+    )
+    return movies[MOVIE_COLUMNS]
+
+
+def make_catalog(path, n_movies, seed=0):
+    """
+    Write a synthetic catalog of ``n_movies`` movies (see
+    ``make_movies``) to a new DuckDB database at ``path`` with the ETL
+    pipeline's ``MovieDatabase``, so it has the same tables as a
+    database built from the API.
+    """
+    genres = pd.DataFrame({"id": list(GENRES), "name": list(GENRES.values())})
+
+    with MovieDatabase(str(path)) as db:
+        db.insert_movies(make_movies(n_movies, seed))
+        db.insert_genres(genres)
+
+    return path
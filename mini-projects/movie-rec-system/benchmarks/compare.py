@@ -0,0 +1,125 @@
+"""
+Compare two benchmark results saved by ``python -m benchmarks.run``.
+
+Prints the change of every metric for the catalog sizes in both
+results and exits with status 1 if a metric got worse by more than
+the threshold.
+
+Examples
+--------
+$ python -m benchmarks.compare benchmarks/results/a.json \\
+    benchmarks/results/b.json --threshold 0.2
+"""
+
+import argparse
+import json
+import sys
+
+# (section, metric, whether higher values are better)
+METRICS = (
+    ("cold_start", "index_s", False),
+    ("cold_start", "index_mb", False),
+    ("get_recommendation", "p50_ms", False),
+    ("get_recommendation", "p95_ms", False),
+    ("get_recommendation", "p99_ms", False),
+    ("endpoint", "p50_ms", False),
+    ("endpoint", "p95_ms", False),
+    ("endpoint", "p99_ms", False),
+    ("endpoint", "throughput_rps", True),
+    (None, "peak_rss_mb", False),
+)
+
+
+def compare(baseline, current, threshold=0.2) -> list:
+    """
+    Compare the metrics of two benchmark reports.
+
+    Parameters
+    ----------
+    baseline, current : dict
+        Reports, as returned by ``benchmarks.run.run``.
+
+    threshold : float
+        Relative change above which a metric that got worse is a
+        regression.
+
+    Returns
+    -------
+    list of dict
+        One row per catalog size in both reports and metric, with the
+        "size", the "metric", the "baseline" and "current" values, the
+        relative "change" and whether it is a "regression".
+    """
+    previous = {result["size"]: result for result in baseline["results"]}
+    rows = []
+
+    for result in current["results"]:
+        before = previous.get(result["size"])
+
+        if before is None:
+            continue
+
+        for section, metric, higher_is_better in METRICS:
+            old = before.get(section, {}) if section else before
+            new = result.get(section, {}) if section else result
+            old, new = old.get(metric), new.get(metric)
+
+            if not old or new is None:
+                continue
+
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            rows.append(
+                {
+                    "size": result["size"],
+                    "metric": f"{section}.{metric}" if section else metric,
+                    "baseline": old,
+                    "current": new,
+                    "change": change,
+                    "regression": worse > threshold,
+                }
+            )
+
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmark results"
+    )
+    parser.add_argument("baseline", help="JSON file with the baseline")
+    parser.add_argument("current", help="JSON file with the new results")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative change of a metric considered a regression",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(
+        f"baseline {(baseline['commit'] or '?')[:8]}, "
+        f"current {(current['commit'] or '?')[:8]}"
+    )
+    rows = compare(baseline, current, args.threshold)
+
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['size']:>9} {row['metric']:<30} "
+            f"{row['baseline']:>10} -> {row['current']:>10} "
+            f"{row['change']:+8.1%}{flag}"
+        )
+
+    if any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
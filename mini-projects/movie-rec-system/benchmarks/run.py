@@ -0,0 +1,335 @@
+"""
+Benchmark the recommender on synthetic catalogs.
+
+For each catalog size, a catalog is generated in a temporary DuckDB
+database and a new Python process measures:
+
+* the cold start: importing the API and loading the index (reading the
+  movie data and fitting the model)
+* the latency of ``get_recommendation`` called directly
+* the latency and throughput of the ``/recommendations/`` endpoint
+  under concurrent load
+* the peak resident set size (RSS) of the process and the memory of
+  each component of the index
+
+The results are saved as JSON, with the commit they were measured
+on, and can be compared with ``python -m benchmarks.compare``.
+
+Examples
+--------
+$ python -m benchmarks.run --sizes 1000 10000 100000
+$ python -m benchmarks.run --sizes 1000000 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.catalog import make_catalog
+
+RESULTS_PATH = Path(__file__).parent / "results"
+
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(seconds) -> dict:
+    """Return the count, mean and percentiles of latencies, in ms"""
+    ms = np.asarray(seconds) * 1000
+    summary = {"count": len(ms), "mean_ms": round(float(ms.mean()), 3)}
+
+    for q, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+        summary[f"p{q}_ms"] = round(float(value), 3)
+
+    summary["max_ms"] = round(float(ms.max()), 3)
+    return summary
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB"""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(peak * scale / 2**20, 1)
+
+
+def git_commit():
+    """Return the current commit and whether the tree has changes"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+    return commit, bool(status.strip())
+
+
+def measure(num_rec, requests, concurrency, seed):
+    """
+    Measure the recommender configured by the environment variables
+    in this process, see the module docstring
+    """
+    started = time.perf_counter()
+
+    import httpx
+
+    from movie_rec_system.app.app import app
+    from movie_rec_system.app.index import get_index
+    from movie_rec_system.app.recommender import get_recommendation
+    from movie_rec_system.app.workers import shutdown_worker_pool
+
+    imported = time.perf_counter()
+    index = get_index("english")
+    loaded = time.perf_counter()
+    cold_start = {
+        "import_s": round(imported - started, 3),
+        "index_s": round(loaded - imported, 3),
+        "index_mb": round(index.memory_usage()["total"] / 2**20, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    rng = np.random.default_rng(seed)
+    titles = list(index.titles[rng.integers(0, len(index), requests)])
+
+    for title in titles[:10]:
+        get_recommendation(title, num_rec)
+
+    latencies = []
+
+    for title in titles:
+        start = time.perf_counter()
+        get_recommendation(title, num_rec)
+        latencies.append(time.perf_counter() - start)
+
+    direct = {**summarize(latencies), "peak_rss_mb": peak_rss_mb()}
+
+    async def load():
+        transport = httpx.ASGITransport(app=app)
+        pending = iter(titles)
+        latencies, statuses = [], {}
+
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+
+            async def user():
+                for title in pending:
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/recommendations/",
+                        json={"movie": title, "num_rec": num_rec},
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    status = str(response.status_code)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(user() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+        return {
+            **summarize(latencies),
+            "concurrency": concurrency,
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "status": statuses,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    endpoint = asyncio.run(load())
+    shutdown_worker_pool()
+
+    return {
+        "cold_start": cold_start,
+        "index_memory": index.memory_usage(),
+        "get_recommendation": direct,
+        "endpoint": endpoint,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_catalog(
+    size, num_rec=10, requests=500, concurrency=16, seed=0, env=None
+) -> dict:
+    """
+    Generate a catalog of ``size`` movies and measure the recommender
+    on it in a new process, so every size starts cold and has its own
+    peak RSS.
+
+    The result cache is disabled (unless ``env`` sets
+    ``RECOMMENDER_CACHE_SIZE``), so every request computes its
+    recommendations. ``env`` overrides the settings of the recommender
+    (see ``Settings``).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        start = time.perf_counter()
+        make_catalog(directory / "movies.duckdb", size, seed)
+        generated = time.perf_counter() - start
+
+        child_env = {
+            **os.environ,
+            "RECOMMENDER_DATABASE_PATH": str(directory / "movies.duckdb"),
+            "RECOMMENDER_ARTIFACT_PATH": str(directory / "model"),
+            "RECOMMENDER_SNAPSHOT_PATH": str(directory / "snapshots"),
+            "RECOMMENDER_CACHE_SIZE": "0",
+            **(env or {}),
+        }
+        args = [num_rec, requests, concurrency, seed]
+        child = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--measure"]
+            + [str(arg) for arg in args],
+            env=child_env,
+            cwd=Path(__file__).parent.parent,
+            capture_output=True,
+            text=True,
+        )
+
+    if child.returncode:
+        raise RuntimeError(
+            f"Benchmark of {size} movies failed:\n{child.stderr}"
+        )
+
+    return {
+        "size": size,
+        "generate_s": round(generated, 3),
+        **json.loads(child.stdout.splitlines()[-1]),
+    }
+
+
+def run(sizes, num_rec=10, requests=500, concurrency=16, seed=0, env=None):
+    """
+    Benchmark the recommender on catalogs of every size in ``sizes``
+    (see ``bench_catalog``) and return the results with the commit,
+    the platform and the parameters they were measured with
+    """
+    commit, dirty = git_commit()
+    results = []
+
+    for size in sizes:
+        result = bench_catalog(size, num_rec, requests, concurrency, seed, env)
+        results.append(result)
+        print(
+            f"{size} movies: cold start {result['cold_start']['index_s']}s, "
+            f"p99 {result['get_recommendation']['p99_ms']}ms direct, "
+            f"{result['endpoint']['p99_ms']}ms endpoint, "
+            f"{result['peak_rss_mb']}MB peak RSS",
+            file=sys.stderr,
+        )
+
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {
+            "num_rec": num_rec,
+            "requests": requests,
+            "concurrency": concurrency,
+            "seed": seed,
+            "env": env or {},
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the recommender on synthetic catalogs"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000, 100_000],
+        help="number of movies of each catalog",
+    )
+    parser.add_argument("--num-rec", type=int, default=10)
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=500,
+        help="requests measured per catalog, directly and on the API",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="concurrent clients of the API",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="SETTING=VALUE",
+        help="recommender setting, e.g. --set backend=ivf",
+    )
+    parser.add_argument(
+        "--output",
+        help="JSON file with the results, defaults to "
+        "benchmarks/results/<time>-<commit>.json",
+    )
+    parser.add_argument("--measure", nargs=4, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    env = {}
+
+    for setting in args.set:
+        name, _, value = setting.partition("=")
+        env[f"RECOMMENDER_{name.upper()}"] = value
+
+    report = run(
+        args.sizes,
+        args.num_rec,
+        args.requests,
+        args.concurrency,
+        args.seed,
+        env,
+    )
+
+    if args.output:
+        output = Path(args.output)
+    else:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_PATH / f"{stamp}-{(report['commit'] or '')[:8]}.json"
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
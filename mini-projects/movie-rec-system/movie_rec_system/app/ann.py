@@ -0,0 +1,383 @@
+import argparse
+import dataclasses
+import json
+import time
+
+import numpy as np
+
+from .recommenderhelper import top_similar_positions
+
+
+class SearchBackend:
+    """
+    Base class of the nearest-neighbour search backends of the
+    recommender index. Subclasses implement ``search``, which returns
+    the rows of the ``top_n`` movies most similar to the movie at
+    ``position``, excluding the movie itself.
+
+    The approximate backends first select a small set of candidate
+    movies and only rank the candidates by their exact cosine
+    similarity, so the cost of a query depends on the number of
+    candidates instead of the size of the catalog.
+
+    The arrays a backend fits (see ``arrays``) are saved with the model
+    artifact, so the workers load them memory-mapped (see
+    ``from_arrays``) instead of each fitting its own.
+
+    Attributes
+    ----------
+    params : dict
+        The parameters the backend was built with.
+    """
+
+    name = None
+    # the names of the arrays fitted by the backend
+    _arrays = ()
+
+    def __init__(self, index, **params):
+        self.index = index
+        self.params = params
+
+    @classmethod
+    def from_arrays(cls, index, params, arrays):
+        """
+        Return the backend of ``index`` built with ``params``, with the
+        fitted ``arrays`` (see ``arrays``) instead of fitting them
+        """
+        backend = cls.__new__(cls)
+        SearchBackend.__init__(backend, index, **params)
+
+        for name in cls._arrays:
+            setattr(backend, name, arrays[name])
+
+        return backend
+
+    def arrays(self) -> dict:
+        """Return the arrays fitted by the backend, by name"""
+        return {name: getattr(self, name) for name in self._arrays}
+
+    def search(self, position: int, top_n=10) -> np.ndarray:
+        raise NotImplementedError
+
+    def search_batch(self, positions, top_n=10) -> np.ndarray:
+        top_n = max(0, min(top_n, len(self.index) - 1))
+        top = np.empty((len(positions), top_n), dtype=np.intp)
+
+        for i, position in enumerate(positions):
+            top[i] = self.search(position, top_n)
+
+        return top
+
+
+class ExactBackend(SearchBackend):
+    """Brute force search over every movie in the index"""
+
+    name = "exact"
+
+    def search(self, position, top_n=10):
+        return self.index.exact_top_positions(position, top_n)
+
+    def search_batch(self, positions, top_n=10):
+        return self.index.exact_top_positions_batch(positions, top_n)
+
+
+class _CandidateBackend(SearchBackend):
+    """
+    Rank candidate movies by their exact cosine similarity. Falls back
+    to the exact search when there are not enough candidates.
+    """
+
+    def candidates(self, position: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def search(self, position, top_n=10):
+        candidates = np.union1d(self.candidates(position), [position])
+
+        if len(candidates) <= top_n:
+            return self.index.exact_top_positions(position, top_n)
+
+        movie_sim = self.index.similarities_to(position, candidates)
+        # candidates are sorted, so ties are broken as in the exact search
+        return candidates[top_similar_positions(movie_sim, top_n)]
+
+
+class LSHBackend(_CandidateBackend):
+    """
+    Random-projection locality-sensitive hashing.
+
+    Each of the ``n_tables`` tables hashes a movie to ``n_bits`` bits:
+    the side of ``n_bits`` random hyperplanes its TF-IDF vector falls
+    on. Movies with a small angle between them are likely to share a
+    bucket, and the candidates of a query are the movies sharing a
+    bucket with it in any table.
+    """
+
+    name = "lsh"
+    _arrays = ("codes", "order", "sorted_codes")
+
+    def __init__(self, index, n_tables=8, n_bits=12, seed=0):
+        super().__init__(index, n_tables=n_tables, n_bits=n_bits, seed=seed)
+        rng = np.random.default_rng(seed)
+        n_terms = index.tfidf_matrix.shape[1]
+        hyperplanes = rng.standard_normal((n_terms, n_tables * n_bits)).astype(
+            np.float32
+        )
+
+        bits = _project(index.tfidf_matrix, hyperplanes) > 0
+        weights = np.left_shift(1, np.arange(n_bits, dtype=np.int64))
+        self.codes = (
+            bits.reshape(len(index), n_tables, n_bits) @ weights
+        ).astype(np.int64)
+        # rows sorted by code, so a bucket is a contiguous range
+        self.order = np.argsort(self.codes, axis=0, kind="stable")
+        self.sorted_codes = np.take_along_axis(self.codes, self.order, 0)
+
+    def candidates(self, position):
+        buckets = []
+
+        for table, code in enumerate(self.codes[position]):
+            codes = self.sorted_codes[:, table]
+            start = np.searchsorted(codes, code, side="left")
+            end = np.searchsorted(codes, code, side="right")
+            buckets.append(self.order[start:end, table])
+
+        return np.unique(np.concatenate(buckets))
+
+
+class IVFBackend(_CandidateBackend):
+    """
+    Inverted file index.
+
+    The movies are clustered with spherical k-means over their reduced
+    vectors: the truncated SVD embeddings of the index if it has them,
+    otherwise a Gaussian random projection of the TF-IDF vectors to
+    ``n_components`` dimensions.
+    The candidates of a query are the movies in the ``n_probes``
+    clusters whose centroids are the most similar to it.
+    """
+
+    name = "ivf"
+    _arrays = ("centroids", "order", "offsets")
+
+    def __init__(self, index, n_lists=0, n_probes=8, n_components=64, seed=0):
+        super().__init__(
+            index,
+            n_lists=n_lists,
+            n_probes=n_probes,
+            n_components=n_components,
+            seed=seed,
+        )
+        rng = np.random.default_rng(seed)
+        n_terms = index.tfidf_matrix.shape[1]
+        n_lists = n_lists or max(1, int(np.sqrt(len(index))))
+        self.n_probes = min(n_probes, n_lists)
+
+        if index.embeddings is not None:
+            self.vectors = index.embeddings
+        else:
+            projection = rng.standard_normal((n_terms, n_components)).astype(
+                np.float32
+            )
+            self.vectors = _normalize(_project(index.tfidf_matrix, projection))
+
+        self.centroids = _spherical_kmeans(self.vectors, n_lists, rng)
+
+        labels = _nearest_centroid(self.vectors, self.centroids)
+        self.order = np.argsort(labels, kind="stable")
+        self.offsets = np.searchsorted(
+            labels[self.order], np.arange(n_lists + 1)
+        )
+
+    @classmethod
+    def from_arrays(cls, index, params, arrays):
+        backend = super().from_arrays(index, params, arrays)
+        backend.n_probes = min(params["n_probes"], len(backend.centroids))
+        # the projected vectors, the embeddings are not saved twice
+        backend.vectors = arrays.get("vectors", index.embeddings)
+        return backend
+
+    def arrays(self):
+        arrays = super().arrays()
+
+        if self.vectors is not self.index.embeddings:
+            arrays["vectors"] = self.vectors
+
+        return arrays
+
+    def candidates(self, position):
+        scores = self.centroids @ self.vectors[position]
+        probes = np.argpartition(-scores, self.n_probes - 1)[: self.n_probes]
+        starts, ends = self.offsets[probes], self.offsets[probes + 1]
+        lists = [self.order[start:end] for start, end in zip(starts, ends)]
+        return np.unique(np.concatenate(lists))
+
+
+BACKENDS = {
+    backend.name: backend for backend in (ExactBackend, LSHBackend, IVFBackend)
+}
+
+
+def make_backend(index, settings) -> SearchBackend:
+    """
+    Create the search backend selected in ``settings`` (a ``Settings``
+    instance) for ``index``, or return the backend of the index if it
+    was built with the same parameters (as the backend loaded with a
+    model artifact).
+    """
+    if settings.backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown recommender backend {settings.backend!r}, "
+            f"expected one of {sorted(BACKENDS)}"
+        )
+
+    # the backends of the API are built with the default seed
+    params = {
+        "exact": {},
+        "lsh": {
+            "n_tables": settings.lsh_tables,
+            "n_bits": settings.lsh_bits,
+            "seed": 0,
+        },
+        "ivf": {
+            "n_lists": settings.ivf_lists,
+            "n_probes": settings.ivf_probes,
+            "n_components": settings.projection_components,
+            "seed": 0,
+        },
+    }[settings.backend]
+    backend = index.backend
+
+    if backend.name == settings.backend and backend.params == params:
+        return backend
+
+    return BACKENDS[settings.backend](index, **params)
+
+
+def evaluate_backend(index, backend, n_queries=200, top_n=10, seed=0):
+    """
+    Compare ``backend`` with the exact search on randomly sampled
+    movies of ``index``.
+
+    Returns
+    -------
+    dict
+        With the mean recall@``top_n`` of the backend (the fraction of
+        the exact recommendations it finds) and the mean, p50 and p95
+        query latency in milliseconds of both searches.
+    """
+    rng = np.random.default_rng(seed)
+    n_queries = min(n_queries, len(index))
+    queries = rng.choice(len(index), size=n_queries, replace=False)
+    exact = ExactBackend(index)
+    recalls = []
+    latencies = {"exact": [], backend.name: []}
+
+    for position in queries:
+        start = time.perf_counter()
+        expected = exact.search(position, top_n)
+        latencies["exact"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        found = backend.search(position, top_n)
+        latencies[backend.name].append(time.perf_counter() - start)
+
+        if len(expected):
+            recalls.append(
+                len(np.intersect1d(expected, found)) / len(expected)
+            )
+
+    return {
+        "backend": backend.name,
+        "n_movies": len(index),
+        "n_queries": int(n_queries),
+        "top_n": top_n,
+        "recall": float(np.mean(recalls)) if recalls else float("nan"),
+        "latency_ms": {
+            name: {
+                "mean": float(np.mean(values) * 1000),
+                "p50": float(np.percentile(values, 50) * 1000),
+                "p95": float(np.percentile(values, 95) * 1000),
+            }
+            for name, values in latencies.items()
+        },
+    }
+
+
+def _project(tfidf_matrix, projection, chunk_size=65536):
+    """Multiply the sparse rows by a dense projection, in chunks"""
+    projected = np.empty(
+        (tfidf_matrix.shape[0], projection.shape[1]), dtype=np.float32
+    )
+
+    for start in range(0, tfidf_matrix.shape[0], chunk_size):
+        end = start + chunk_size
+        projected[start:end] = tfidf_matrix[start:end] @ projection
+
+    return projected
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _nearest_centroid(vectors, centroids, chunk_size=65536):
+    labels = np.empty(len(vectors), dtype=np.intp)
+
+    for start in range(0, len(vectors), chunk_size):
+        end = start + chunk_size
+        labels[start:end] = np.argmax(vectors[start:end] @ centroids.T, 1)
+
+    return labels
+
+
+def _spherical_kmeans(vectors, n_clusters, rng, n_iter=10, sample_size=256):
+    """
+    Cluster unit vectors by cosine similarity. The centroids are
+    trained on a sample of at most ``sample_size`` vectors per cluster.
+    """
+    n_samples = min(len(vectors), n_clusters * sample_size)
+    sample = vectors[rng.choice(len(vectors), n_samples, replace=False)]
+    centroids = sample[rng.choice(n_samples, n_clusters, replace=False)]
+
+    for _ in range(n_iter):
+        labels = _nearest_centroid(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        # keep the previous centroid of empty clusters
+        empty = np.bincount(labels, minlength=n_clusters) == 0
+        sums[empty] = centroids[empty]
+        centroids = _normalize(sums)
+
+    return centroids
+
+
+def main():
+    """
+    Print the report of ``evaluate_backend`` for the current index::
+
+        python -m movie_rec_system.app.ann --backend ivf
+    """
+    from .config import get_settings
+    from .index import get_index
+
+    parser = argparse.ArgumentParser(
+        description="Report the recall and latency of a search backend "
+        "against the exact search on the current recommender index"
+    )
+    parser.add_argument("--backend", default=get_settings().backend)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    index = get_index()
+    settings = dataclasses.replace(get_settings(), backend=args.backend)
+    report = evaluate_backend(
+        index, make_backend(index, settings), args.queries, args.top_n
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
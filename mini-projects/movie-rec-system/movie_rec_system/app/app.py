@@ -1,15 +1,70 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, field_validator
-from .recommender import get_recommendation
-from fastapi.responses import JSONResponse
-import json
+import asyncio
+import secrets
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from pydantic import BaseModel, Field, field_validator
+from .cache import get_result_cache
+from .config import get_settings
+from .index import get_index
+from .metrics import collect_timings, get_stage_metrics, server_timing, timer
+from .recommender import (
+    get_recommendation,
+    get_recommendations_batch,
+    match_title,
+    resolve_title,
+)
+from .reload import get_reloader
+from .schemas import BatchRecommendation, Recommendation
+from .workers import PoolSaturated, get_worker_pool, shutdown_worker_pool
+from fastapi.responses import JSONResponse, Response
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build the recommender index and start the worker pool and the
+    reloader once, before serving requests, and stop them on shutdown.
+    """
+    reloader = get_reloader().start()
+    get_index("english")
+    get_worker_pool()
+    yield
+    reloader.stop()
+    shutdown_worker_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: PoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def check_admin_token(x_admin_token: str = Header(default="")):
+    """
+    Reject admin requests without the configured admin token, and
+    every admin request if no token is configured
+    """
+    token = get_settings().admin_token
+
+    if not token:
+        raise HTTPException(
+            status_code=403, detail="The admin endpoints are disabled"
+        )
+
+    if not secrets.compare_digest(x_admin_token.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
 
 
 class RecommendationRequest(BaseModel):
     movie: str
-    num_rec: int = 10
+    num_rec: int = Field(10, ge=1)
 
     @field_validator("movie")
     def format_movie_name(cls, movie_name):
@@ -18,6 +73,61 @@ class RecommendationRequest(BaseModel):
         return movie_name.title()  # Convert to title case
 
 
+class BatchRecommendationRequest(BaseModel):
+    movies: list[str]
+    num_rec: int = Field(10, ge=1)
+
+    @field_validator("movies")
+    def format_movie_names(cls, movie_names):
+        """Ensure the movie names are formatted with the
+        first letter capitalized."""
+        return [movie_name.title() for movie_name in movie_names]
+
+
+def model_response(model: BaseModel) -> Response:
+    """
+    Serialize ``model`` straight to JSON bytes with pydantic's compiled
+    serializer, skipping FastAPI's conversion to a dict and the
+    re-encoding with the standard json module.
+    """
+    return Response(model.model_dump_json(), media_type="application/json")
+
+
+async def run_recommender(timings, fn, *args):
+    """
+    Run ``fn`` on the worker pool. If ``timings`` is not None, the time
+    of the stages of ``fn`` and the time the job waited for a worker
+    ("queue") are added to it, to the time of the previous jobs of the
+    request if any.
+    """
+    if timings is None:
+        return await get_worker_pool().run(fn, *args)
+
+    start = time.perf_counter()
+    result, stages = await get_worker_pool().run(collect_timings, fn, *args)
+    waited = time.perf_counter() - start - sum(stages.values())
+    stages = {"queue": max(waited, 0.0), **stages}
+
+    for stage, seconds in stages.items():
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+    return result
+
+
+def with_server_timing(response, timings, operation, start):
+    """
+    Record the stage ``timings`` of a request in the histograms and
+    report them in the ``Server-Timing`` header of ``response``, if
+    the metrics are enabled (``timings`` is not None).
+    """
+    if timings is not None:
+        timings["total"] = time.perf_counter() - start
+        get_stage_metrics().observe(operation, timings)
+        response.headers["Server-Timing"] = server_timing(timings)
+
+    return response
+
+
 @app.get("/")
 async def root():
     return {
@@ -25,31 +135,172 @@ async def root():
     }
 
 
-@app.post("/recommendations/")
-def get_movie_recommendations(recommendation_request: RecommendationRequest):
+@app.get("/cache/")
+async def cache_stats():
+    """
+    Get the hit/miss counters and the size of the
+    recommendation result cache.
+    """
+    return get_result_cache().stats()
+
+
+@app.get("/workers/")
+async def worker_stats():
+    """
+    Get the size, the number of running and queued requests and the
+    number of rejected requests of the recommender worker pool.
+    """
+    return get_worker_pool().stats()
+
+
+@app.get("/admin/version/", dependencies=[Depends(check_admin_token)])
+async def model_version():
+    """
+    Get the version of the active recommender model, the version of
+    the data it was loaded from and the history of reloads.
+    """
+    return get_reloader().status()
+
+
+@app.get("/admin/memory/", dependencies=[Depends(check_admin_token)])
+async def model_memory():
+    """
+    Get the bytes used by each component of the active recommender
+    model, the precision of its TF-IDF weights and the memory budget.
+    """
+    index = get_index("english")
+    return {
+        "version": index.version,
+        "tfidf_dtype": index.tfidf_dtype,
+        "memory_budget_mb": get_settings().memory_budget_mb,
+        "bytes": await asyncio.to_thread(index.memory_usage),
+    }
+
+
+@app.post("/admin/reload/", dependencies=[Depends(check_admin_token)])
+async def reload_model(force: bool = False):
+    """
+    Reload the recommender model if a new model artifact or new data
+    is available (always with ``force``). The current model keeps
+    serving requests until the new one is ready.
+    """
+    reloader = get_reloader()
+    reloaded = await asyncio.to_thread(reloader.reload, force)
+    return {"reloaded": reloaded, **reloader.status()}
+
+
+@app.post("/recommendations/", response_model=Recommendation)
+async def get_movie_recommendations(
+    recommendation_request: RecommendationRequest,
+):
     """
     Get movie recommendations for a given movie.
 
     Parameters:
     - movie: The name of the movie for which you want recommendations.
-    - num_rec: The number of movie recommendations you want. Default is 10.
+    - num_rec: The number of movie recommendations you want (at least 1).
+      Default is 10.
 
     Returns:
-    JSON containing recommended movies and metrics.
+    JSON containing recommended movies and metrics, a 404 response with
+    similar titles ("did_you_mean") if the movie is not in the catalog
+    (none if it is, but there are no recommendations for it), or a 503
+    response with a Retry-After header if the recommender is busy.
+    Titles are matched ignoring case and punctuation, and
+    misspelled titles are resolved to the closest title.
+
+    With the metrics enabled, the time of each stage is reported in
+    the Server-Timing header.
     """
-    recommendations = get_recommendation(
-        recommendation_request.movie,
+    start = time.perf_counter()
+    timings = {} if get_settings().metrics else None
+
+    with timer(timings, "resolve"):
+        movie = resolve_title(recommendation_request.movie, fuzzy=False)
+
+    if movie is None:
+        # the trigram search runs on the worker pool, not on the loop
+        movie, suggestions = await run_recommender(
+            timings, match_title, recommendation_request.movie, "english"
+        )
+
+    if movie is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"message": "Movie not found", "did_you_mean": suggestions},
+        )
+
+    recommendations = await run_recommender(
+        timings,
+        get_recommendation,
+        movie,
         recommendation_request.num_rec,
         "english",
     )
 
-    if isinstance(recommendations, str):
-        recommendations = json.loads(recommendations)
-
     if not recommendations:
         raise HTTPException(
             status_code=404,
-            detail="Movie not found or no recommendations available",  # noqa E501
+            detail={
+                "message": "No recommendations available",
+                "did_you_mean": [],
+            },
         )
 
-    return JSONResponse(content=recommendations)
+    with timer(timings, "serialize"):
+        response = model_response(recommendations)
+
+    return with_server_timing(response, timings, "recommendation", start)
+
+
+@app.post("/recommendations/batch/", response_model=BatchRecommendation)
+async def get_movie_recommendations_batch(
+    recommendation_request: BatchRecommendationRequest,
+):
+    """
+    Get movie recommendations for several movies at once.
+
+    Parameters:
+    - movies: The names of the movies for which you want recommendations.
+    - num_rec: The number of movie recommendations you want for each
+      movie (at least 1). Default is 10.
+
+    Returns:
+    JSON containing the recommended movies and metrics of every movie
+    that was found ("results") and the movies that were not found
+    ("not_found") with similar titles ("did_you_mean"), or a 503
+    response with a Retry-After header if the recommender is busy.
+
+    With the metrics enabled, the time of each stage is reported in
+    the Server-Timing header.
+    """
+    start = time.perf_counter()
+    timings = {} if get_settings().metrics else None
+    recommendations = await run_recommender(
+        timings,
+        get_recommendations_batch,
+        recommendation_request.movies,
+        recommendation_request.num_rec,
+        "english",
+    )
+
+    with timer(timings, "serialize"):
+        response = model_response(recommendations)
+
+    return with_server_timing(response, timings, "batch", start)
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Get the histograms of the time spent in each stage of the
+    recommendations and of the model loads, in the Prometheus text
+    format. Returns a 404 response if the metrics are disabled.
+    """
+    if not get_settings().metrics:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+
+    return Response(
+        get_stage_metrics().render(),
+        media_type="text/plain; version=0.0.4",
+    )
@@ -0,0 +1,343 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# bump when the layout of the files in the artifact changes
+FORMAT_VERSION = 1
+
+_CURRENT = "CURRENT"
+_MANIFEST = "manifest.json"
+_ARRAYS = (
+    "tfidf_data",
+    "tfidf_indices",
+    "tfidf_indptr",
+    "idf",
+    "titles_blob",
+    "titles_offsets",
+    "metrics",
+)
+# only saved for indexes that can be updated incrementally
+_INCREMENTAL_ARRAYS = ("ids", "digests", "term_counts")
+
+
+def artifact_version(index) -> str:
+    """
+    Return the version of the artifact for ``index``: a hash of the
+    stop words, the TF-IDF matrix (and its row scales if it is
+    quantized), the titles, the metrics and the search backend (with
+    its parameters), so the same model always gets the same version.
+    """
+    digest = hashlib.sha256(str(index.stop_words).encode())
+
+    if index.backend.arrays():
+        backend = [index.backend.name, sorted(index.backend.params.items())]
+        digest.update(json.dumps(backend).encode())
+
+    for array in (
+        index.tfidf_matrix.data,
+        index.tfidf_matrix.indices,
+        index.tfidf_matrix.indptr,
+        index.data.metrics,
+    ):
+        digest.update(np.ascontiguousarray(array).tobytes())
+
+    for title in index.titles:
+        digest.update(title.encode())
+        digest.update(b"\0")
+
+    if index.embeddings is not None:
+        digest.update(np.ascontiguousarray(index.embeddings).tobytes())
+
+    if index.tfidf_scales is not None:
+        digest.update(index.tfidf_scales.tobytes())
+
+    return digest.hexdigest()[:16]
+
+
+def save_artifact(index, path, data_version=None) -> str:
+    """
+    Save the recommender index as a versioned model artifact.
+
+    The artifact is a directory ``path/<version>`` with the
+    vocabulary, the TF-IDF matrix in CSR form (with the dtype of the
+    index, see ``RecommenderIndex.compact``), the titles, the
+    metric columns and the SVD embeddings (if any), stored as
+    ``.npy`` files that can be memory-mapped. The arrays of the title
+    index, of the title resolver and of the search backend (see
+    ``SearchBackend.arrays``) are saved too, so loading the artifact
+    builds nothing. Once every file is
+    written, ``path/CURRENT`` is atomically updated to point to the
+    new version, so readers never see a partially written artifact.
+
+    Parameters
+    ----------
+    index : RecommenderIndex
+        The fitted recommender index.
+
+    path : str or pathlib.Path
+        The directory holding every version of the artifact.
+
+    data_version : str, optional
+        The version of the movie data the index was fitted on (see
+        ``data_version``), recorded in the manifest so the artifact is
+        ignored once the data changes (see ``current_manifest``). An
+        artifact without it is used until it is replaced.
+
+    Returns
+    -------
+    str
+        The version of the saved artifact.
+    """
+    path = Path(path)
+    version = index.version or artifact_version(index)
+    target = path / version
+
+    if not (target / _MANIFEST).exists():
+        path.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=path, prefix=f".{version}-"))
+
+        encoded = [title.encode() for title in index.titles]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(title) for title in encoded], out=offsets[1:])
+        arrays = {
+            "tfidf_data": index.tfidf_matrix.data,
+            "tfidf_indices": index.tfidf_matrix.indices,
+            "tfidf_indptr": index.tfidf_matrix.indptr,
+            "idf": index.vectorizer.idf_,
+            "titles_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "titles_offsets": offsets,
+            "metrics": np.ascontiguousarray(index.data.metrics),
+        }
+
+        if index.embeddings is not None:
+            arrays["embeddings"] = np.ascontiguousarray(index.embeddings)
+
+        if index.tfidf_scales is not None:
+            arrays["tfidf_scales"] = index.tfidf_scales
+
+        incremental = {
+            "ids": index.data.ids,
+            "digests": index.data.digests,
+            "term_counts": index.term_counts,
+        }
+
+        if all(array is not None for array in incremental.values()):
+            arrays.update(incremental)
+
+        groups = {
+            "title_index": index.title_index.arrays(),
+            "resolver": index.resolver.arrays(),
+            "backend": index.backend.arrays(),
+        }
+
+        for group, group_arrays in groups.items():
+            for name, array in group_arrays.items():
+                arrays[f"{group}_{name}"] = array
+
+        for name, array in arrays.items():
+            np.save(staging / f"{name}.npy", array)
+
+        vocabulary = {
+            term: int(column)
+            for term, column in index.vectorizer.vocabulary_.items()
+        }
+        (staging / "vocabulary.json").write_text(json.dumps(vocabulary))
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "stop_words": index.stop_words,
+            "n_movies": int(index.tfidf_matrix.shape[0]),
+            "n_terms": int(index.tfidf_matrix.shape[1]),
+            "tfidf_dtype": index.tfidf_matrix.dtype.name,
+            "svd_components": (
+                None
+                if index.embeddings is None
+                else int(index.embeddings.shape[1])
+            ),
+            "incremental": "term_counts" in arrays,
+            "title_index": sorted(groups["title_index"]),
+            "resolver": sorted(groups["resolver"]),
+            "backend": (
+                {
+                    "name": index.backend.name,
+                    "params": index.backend.params,
+                    "arrays": sorted(groups["backend"]),
+                }
+                if groups["backend"]
+                else None
+            ),
+            "updates": index.updates,
+            "data_version": data_version,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        (staging / _MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+        # a leftover of an interrupted save, without a manifest
+        if target.exists():
+            shutil.rmtree(target)
+
+        os.replace(staging, target)
+    elif data_version is not None:
+        # the same model fitted on a newer version of the data
+        manifest = read_manifest(path, version)
+
+        if manifest.get("data_version") not in (None, data_version):
+            manifest["data_version"] = data_version
+            _write_atomically(
+                target / _MANIFEST, json.dumps(manifest, indent=2)
+            )
+
+    _write_atomically(path / _CURRENT, version)
+    return version
+
+
+def current_version(path):
+    """
+    Return the version ``path/CURRENT`` points to, or None if there
+    is no artifact in ``path``.
+    """
+    try:
+        return (Path(path) / _CURRENT).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(path, version=None) -> dict:
+    """
+    Read the manifest of an artifact version (by default, the current
+    one). Raises FileNotFoundError if there is no such artifact.
+    """
+    version = version or current_version(path)
+
+    if version is None:
+        raise FileNotFoundError(f"No model artifact in {str(path)!r}")
+
+    manifest = json.loads((Path(path) / version / _MANIFEST).read_text())
+
+    if manifest["format_version"] != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported model artifact format "
+            f"{manifest['format_version']!r} (expected {FORMAT_VERSION})"
+        )
+
+    return manifest
+
+
+def load_artifact(path, version=None) -> dict:
+    """
+    Load an artifact version (by default, the current one).
+
+    The arrays are memory-mapped read-only, so processes loading the
+    same artifact share the same pages and nothing is copied
+    until it is used.
+
+    Returns
+    -------
+    dict
+        With the "manifest", the "idf" weights, the "tfidf_matrix"
+        (CSR, backed by the memory-mapped arrays), its row
+        "tfidf_scales" (None unless it is quantized), the "titles"
+        (object array), the "metrics" and the truncated SVD
+        "embeddings" (None if the artifact does not have them), the
+        TMDB "ids", text "digests" and raw "term_counts" used to update
+        the index incrementally (None for artifacts without them), and
+        the arrays of the "title_index", of the title "resolver" and of
+        the search "backend" (None for artifacts without them). The
+        vocabulary is not read, see ``read_vocabulary``.
+    """
+    manifest = read_manifest(path, version)
+    directory = Path(path) / manifest["version"]
+    arrays = {
+        name: np.load(directory / f"{name}.npy", mmap_mode="r")
+        for name in _ARRAYS
+    }
+
+    tfidf_matrix = csr_matrix(
+        (
+            arrays["tfidf_data"],
+            arrays["tfidf_indices"],
+            arrays["tfidf_indptr"],
+        ),
+        shape=(manifest["n_movies"], manifest["n_terms"]),
+        copy=False,
+    )
+
+    blob = arrays["titles_blob"].tobytes()
+    offsets = arrays["titles_offsets"].tolist()
+    titles = np.empty(manifest["n_movies"], dtype=object)
+    titles[:] = [
+        blob[start:end].decode() for start, end in zip(offsets, offsets[1:])
+    ]
+    titles.setflags(write=False)
+
+    embeddings = tfidf_scales = None
+
+    if manifest.get("svd_components"):
+        embeddings = np.load(directory / "embeddings.npy", mmap_mode="r")
+
+    if manifest.get("tfidf_dtype") == "uint8":
+        tfidf_scales = np.load(directory / "tfidf_scales.npy", mmap_mode="r")
+
+    incremental = {
+        name: (
+            np.load(directory / f"{name}.npy", mmap_mode="r")
+            if manifest.get("incremental")
+            else None
+        )
+        for name in _INCREMENTAL_ARRAYS
+    }
+
+    groups = {
+        group: (
+            {
+                name: np.load(directory / f"{group}_{name}.npy", mmap_mode="r")
+                for name in names
+            }
+            if names
+            else None
+        )
+        for group, names in (
+            ("title_index", manifest.get("title_index")),
+            ("resolver", manifest.get("resolver")),
+            ("backend", (manifest.get("backend") or {}).get("arrays")),
+        )
+    }
+
+    return {
+        "manifest": manifest,
+        "idf": np.asarray(arrays["idf"]),
+        "tfidf_matrix": tfidf_matrix,
+        "tfidf_scales": tfidf_scales,
+        "titles": titles,
+        "metrics": arrays["metrics"],
+        "embeddings": embeddings,
+        **incremental,
+        **groups,
+    }
+
+
+def read_vocabulary(path, version=None) -> dict:
+    """
+    Read the vocabulary of the TF-IDF vectorizer of an artifact
+    version (by default, the current one), from term to column
+    """
+    version = version or current_version(path)
+    return json.loads((Path(path) / version / "vocabulary.json").read_text())
+
+
+def _write_atomically(path, content):
+    """Replace the content of ``path`` so readers see old or new"""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-")
+
+    with os.fdopen(fd, "w") as f:
+        f.write(content)
+
+    os.replace(tmp, path)
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from .config import get_settings
+
+# returned by ResultCache.get when the key is not cached
+MISSING = object()
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of recommendation results, with an optional
+    time-to-live.
+
+    Each lookup passes the version of the model the result comes from.
+    When a lookup has a new version (the index was rebuilt or reloaded),
+    every cached result is dropped, so stale recommendations are never
+    served. A result set for another version than the one of the last
+    lookup comes from a request that started on a replaced model: it
+    is not cached, and the results of the new model are kept.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of cached results, the least recently used
+        result is evicted when the cache is full. 0 disables the cache.
+
+    ttl : float
+        Seconds a result stays in the cache, 0 means no expiration.
+
+    clock : callable
+        Returns the current time in seconds, used for the expiration.
+    """
+
+    def __init__(self, maxsize=1024, ttl=0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """
+        Return the result cached for ``key`` and model ``version``, or
+        ``MISSING`` if there is none.
+        """
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key, MISSING)
+
+            if entry is not MISSING:
+                expires, value = entry
+
+                if expires is None or expires > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                del self._entries[key]
+
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, version, value):
+        """
+        Cache ``value`` for ``key`` and model ``version``, unless the
+        cache has moved on to another version
+        """
+        if self.maxsize <= 0:
+            return
+
+        expires = self._clock() + self.ttl if self.ttl else None
+
+        with self._lock:
+            if self._version is None:
+                self._version = version
+            elif version != self._version:
+                return
+
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters and the size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "version": self._version,
+            }
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+
+@lru_cache(maxsize=None)
+def get_result_cache() -> ResultCache:
+    """Return the result cache shared by every request"""
+    settings = get_settings()
+    return ResultCache(settings.cache_size, settings.cache_ttl)
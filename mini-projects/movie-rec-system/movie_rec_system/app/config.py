@@ -0,0 +1,178 @@
+import os
+from dataclasses import dataclass, fields
+from functools import lru_cache
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Configuration of the recommender API.
+
+    Every setting can be overridden with an environment variable named
+    after it in upper case, prefixed with ``RECOMMENDER_`` (for example,
+    ``RECOMMENDER_BACKEND=ivf``). The artifact path is also read from
+    ``MODEL_ARTIFACT_PATH``.
+
+    Attributes
+    ----------
+    database_path : str
+        DuckDB database with the movie data written by the ETL pipeline.
+
+    snapshot_path : str
+        Directory with the Parquet snapshots of the movie data written
+        by the ETL pipeline. The movie data is read from the current
+        snapshot if there is one, otherwise from the database.
+
+    artifact_path : str
+        Directory with the model artifacts written by the ETL pipeline.
+
+    backend : str
+        Nearest-neighbour search backend: "exact" (brute force cosine
+        similarity), "lsh" (random-projection locality-sensitive
+        hashing) or "ivf" (inverted file index over k-means clusters).
+
+    lsh_tables, lsh_bits : int
+        Number of hash tables and bits per hash for the "lsh" backend.
+        More tables increase recall, more bits make buckets smaller.
+
+    ivf_lists, ivf_probes : int
+        Number of clusters (0 picks the square root of the number of
+        movies) and number of clusters searched per query for the
+        "ivf" backend. More probes increase recall and latency.
+
+    projection_components : int
+        Dimensions of the random projection the "ivf" backend clusters
+        when the index has no SVD embeddings.
+
+    svd_components : int
+        Project the TF-IDF vectors to this number of dimensions with a
+        truncated SVD and compute the similarities with the projected
+        vectors (0 disables it). Fewer dimensions are faster and use
+        less memory, more are closer to the TF-IDF similarities.
+
+    tfidf_dtype : str
+        Precision of the TF-IDF weights kept in memory: "float64" (as
+        fitted), "float32" (half the memory, the recommendations are
+        the same up to near ties) or "uint8" (an eighth of the memory,
+        the weights of each movie quantized to 256 levels, queries are
+        slower as the weights are converted to float32 in chunks). The
+        similarities are computed in float32 for "float32" and "uint8".
+        Only the weights are converted, the column indices of the
+        sparse matrix take 4 bytes per weight whatever the precision.
+        A model artifact saved with a lower precision keeps it.
+
+    memory_budget_mb : float
+        Maximum memory of the recommender index in MB (0 has no
+        budget). If the index needs more, its TF-IDF weights are
+        stored with a lower precision than ``tfidf_dtype`` (float32,
+        then uint8) and the index fails to load if it still does not
+        fit. The memory of each component is reported by the
+        ``/admin/memory/`` endpoint.
+
+    full_rebuild_every : int
+        When the model is reloaded from new data, the TF-IDF vectors
+        of the current model are updated with the movies that were
+        added or changed, and the vectorizer is fitted from scratch
+        only every ``full_rebuild_every`` reloads (0 always fits it
+        from scratch).
+
+    title_match_threshold : float
+        Minimum similarity (Dice coefficient of the title trigrams, from
+        0 to 1) for a misspelled title to be resolved to a title of the
+        catalog (0 only resolves titles that differ in case, accents or
+        punctuation). Unresolved titles get a 404 response with similar
+        titles.
+
+    cache_size, cache_ttl : int, float
+        Maximum number of recommendation results kept in memory
+        (0 disables the cache) and the seconds they are kept
+        (0 keeps them until they are evicted or the model changes).
+
+    worker_type : str
+        Where the recommendations are computed: "thread" (a thread
+        pool sharing the index of the API process) or "process" (a
+        process pool, every worker loads its own index).
+
+    workers, worker_queue : int
+        Number of workers computing recommendations (0 uses the number
+        of CPUs) and number of requests that can wait for a worker.
+        Further requests get a 503 response.
+
+    retry_after : int
+        Seconds a client is told to wait (``Retry-After`` header)
+        before retrying a request rejected with a 503 response.
+
+    reload_interval : float
+        Seconds between checks for a new model artifact or new data in
+        the database, a new version is loaded in the background and
+        replaces the current model (0 disables the checks, the model
+        can still be reloaded with the admin endpoint).
+
+    admin_token : str
+        Token the admin endpoints require in the ``X-Admin-Token``
+        header. The admin endpoints reject every request when it is
+        empty (the default).
+
+    metrics : bool
+        Time the stages of every recommendation, report them in a
+        ``Server-Timing`` response header and export their histograms
+        in the Prometheus format at ``/metrics`` (off by default,
+        disabled stage timers cost nothing).
+    """
+
+    database_path: str = "./movies_data.duckdb"
+    snapshot_path: str = "./snapshots"
+    artifact_path: str = "./model"
+    backend: str = "exact"
+    lsh_tables: int = 8
+    lsh_bits: int = 12
+    ivf_lists: int = 0
+    ivf_probes: int = 8
+    projection_components: int = 64
+    svd_components: int = 0
+    tfidf_dtype: str = "float64"
+    memory_budget_mb: float = 0
+    full_rebuild_every: int = 10
+    title_match_threshold: float = 0.6
+    cache_size: int = 1024
+    cache_ttl: float = 3600
+    worker_type: str = "thread"
+    workers: int = 0
+    worker_queue: int = 32
+    retry_after: int = 1
+    reload_interval: float = 0
+    admin_token: str = ""
+    metrics: bool = False
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """Read the settings from the environment variables"""
+        environ = os.environ if environ is None else environ
+        values = {}
+
+        for field in fields(cls):
+            name = f"RECOMMENDER_{field.name.upper()}"
+
+            if name in environ:
+                parse = _PARSERS.get(field.type, field.type)
+                values[field.name] = parse(environ[name])
+
+        if "artifact_path" not in values and "MODEL_ARTIFACT_PATH" in environ:
+            values["artifact_path"] = environ["MODEL_ARTIFACT_PATH"]
+
+        return cls(**values)
+
+
+def _parse_bool(value) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# parse the environment variables of the settings that are not
+# converted by calling their type
+_PARSERS = {bool: _parse_bool}
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Return the settings, read from the environment once"""
+    return Settings.from_env()
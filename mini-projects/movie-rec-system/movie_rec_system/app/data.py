@@ -0,0 +1,214 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from .config import get_settings
+from .recommenderhelper import create_combined, get_data
+from .snapshot import read_snapshot, snapshot_file
+from .titles import TitleIndex
+
+METRIC_COLUMNS = ("popularity", "vote_average", "vote_count")
+
+# table with the recommender-ready movie data, built by the ETL pipeline
+RECOMMENDER_TABLE = "recommender_movies"
+
+
+@dataclass(frozen=True)
+class MovieData:
+    """
+    Read-only snapshot of the movie data used by the recommender.
+
+    The snapshot is prepared once: titles are already lowercased, the
+    "combined" text is already built and the numeric columns are
+    stored in a single contiguous, read-only NumPy array. It is shared
+    by every request and thread, none of which should modify it.
+
+    Attributes
+    ----------
+    titles : numpy.ndarray
+        Lowercased movie titles, in row order.
+
+    combined : numpy.ndarray or None
+        Overview and genre names of each movie, as built by
+        ``create_combined``. It is only needed to fit the TF-IDF
+        vectorizer, and it is None for data loaded from a model
+        artifact.
+
+    metrics : numpy.ndarray
+        float64 array of shape (n_movies, 3) with the popularity,
+        vote average and vote count of each movie, in the order
+        of ``METRIC_COLUMNS``.
+
+    title_index : TitleIndex
+        Index from a (lowercased) title to its rows.
+
+    ids : numpy.ndarray or None
+        int64 TMDB id of each movie, None if the data has no "id"
+        column.
+
+    digests : numpy.ndarray or None
+        uint64 hash of the "combined" text of each movie, used to
+        find the movies whose text changed between two snapshots.
+    """
+
+    titles: np.ndarray
+    combined: np.ndarray
+    metrics: np.ndarray
+    title_index: TitleIndex
+    ids: np.ndarray = None
+    digests: np.ndarray = None
+
+    def __len__(self):
+        return len(self.titles)
+
+    def take(self, rows) -> "MovieData":
+        """Return a snapshot with the movies at ``rows``, in that order"""
+        titles = _read_only(self.titles[rows], dtype=object)
+        return MovieData(
+            titles=titles,
+            combined=(
+                None
+                if self.combined is None
+                else _read_only(self.combined[rows], dtype=object)
+            ),
+            metrics=_read_only(self.metrics[rows]),
+            title_index=TitleIndex(titles),
+            ids=None if self.ids is None else _read_only(self.ids[rows]),
+            digests=(
+                None
+                if self.digests is None
+                else _read_only(self.digests[rows])
+            ),
+        )
+
+    @property
+    def popularity(self) -> np.ndarray:
+        return self.metrics[:, 0]
+
+    @property
+    def vote_average(self) -> np.ndarray:
+        return self.metrics[:, 1]
+
+    @property
+    def vote_count(self) -> np.ndarray:
+        return self.metrics[:, 2]
+
+
+def _read_only(values, dtype=None) -> np.ndarray:
+    array = np.array(values, dtype=dtype, order="C")
+    array.setflags(write=False)
+    return array
+
+
+def prepare_movie_data(df: pd.DataFrame, weight=2) -> MovieData:
+    """
+    Build a ``MovieData`` snapshot from the movie data,
+    without modifying ``df``.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The movie data, as returned by ``get_data``.
+
+    weight : int, default=2
+        The number of times "genre_names" is repeated in
+        the "combined" text.
+
+    Returns
+    -------
+    MovieData
+        The prepared snapshot.
+    """
+    text = df[["overview", "genre_names"]].copy()
+    combined = create_combined(text, weight)["combined"]
+    return _movie_data(df, df["title"].str.lower(), combined)
+
+
+def read_movie_data(path, snapshot_path=None) -> MovieData:
+    """
+    Read the snapshot of the movie data from the
+    ``recommender_movies`` table the ETL pipeline builds, which
+    already has lowercased titles and the "combined" text. Only the
+    columns the recommender uses are read.
+
+    The table is read from the current Parquet snapshot in
+    ``snapshot_path`` if there is one, without opening the DuckDB
+    database (so an ETL run in progress does not block it), otherwise
+    from the DuckDB database at ``path``. Databases without the table
+    (built before the ETL pipeline materialized it) are read and
+    prepared with ``get_data`` and ``prepare_movie_data``.
+    """
+    columns = ["id", "title", "combined", *METRIC_COLUMNS]
+
+    if snapshot_path and snapshot_file(snapshot_path, RECOMMENDER_TABLE):
+        df = read_snapshot(snapshot_path, RECOMMENDER_TABLE, columns)
+        return _movie_data(df, df["title"], df["combined"])
+
+    con = duckdb.connect(path)
+
+    try:
+        tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+
+        if RECOMMENDER_TABLE in tables:
+            df = con.execute(
+                f"SELECT {', '.join(columns)} FROM {RECOMMENDER_TABLE}"
+            ).fetchdf()
+        else:
+            df = None
+    finally:
+        con.close()
+
+    if df is None:
+        return prepare_movie_data(get_data())
+
+    return _movie_data(df, df["title"], df["combined"])
+
+
+def _movie_data(df, titles, combined) -> MovieData:
+    titles = _read_only(titles, dtype=object)
+    digests = pd.util.hash_pandas_object(combined, index=False)
+
+    return MovieData(
+        titles=titles,
+        combined=_read_only(combined, dtype=object),
+        metrics=_read_only(df[list(METRIC_COLUMNS)], dtype=np.float64),
+        title_index=TitleIndex(titles),
+        ids=_read_only(df["id"], dtype=np.int64) if "id" in df else None,
+        digests=_read_only(digests, dtype=np.uint64),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_movie_data() -> MovieData:
+    """
+    Return the snapshot of the movie data (see ``read_movie_data``),
+    reading it on first use.
+    """
+    settings = get_settings()
+    return read_movie_data(settings.database_path, settings.snapshot_path)
+
+
+def data_version(settings=None):
+    """
+    Return the version of the movie data: the current Parquet snapshot
+    if there is one, otherwise the modification time and size of the
+    DuckDB database. Returns None if neither exists.
+    """
+    settings = settings or get_settings()
+    file = settings.snapshot_path and snapshot_file(
+        settings.snapshot_path, RECOMMENDER_TABLE
+    )
+
+    if file:
+        return f"snapshot:{file.parent.name}"
+
+    try:
+        stat = os.stat(settings.database_path)
+    except FileNotFoundError:
+        return None
+
+    return f"database:{stat.st_mtime_ns}-{stat.st_size}"
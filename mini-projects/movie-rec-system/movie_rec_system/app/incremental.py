@@ -0,0 +1,170 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+
+def fit_term_counts(documents, stop_words="english"):
+    """
+    Fit a TF-IDF vectorizer on ``documents``, keeping the raw term
+    counts so the vectorization can later be updated incrementally.
+
+    Produces the same vocabulary and TF-IDF matrix as
+    ``fit_tfidf_vectorizer``.
+
+    Returns
+    -------
+    vectorizer : sklearn.feature_extraction.text.TfidfVectorizer
+        The fitted vectorizer.
+
+    counts : scipy.sparse.csr_matrix
+        The number of times each term appears in each document.
+
+    tfidf_matrix : scipy.sparse.csr_matrix
+        The L2-normalized TF-IDF matrix, with the same sparsity
+        structure as ``counts``.
+    """
+    counter = CountVectorizer(stop_words=stop_words, dtype=np.int32)
+    counts = counter.fit_transform(documents).tocsr()
+    counts.sort_indices()
+    idf, tfidf_matrix = tfidf_from_counts(counts)
+    vectorizer = make_vectorizer(stop_words, counter.vocabulary_, idf)
+    return vectorizer, counts, tfidf_matrix
+
+
+def tfidf_from_counts(counts):
+    """
+    Weight the term ``counts`` by their smoothed inverse document
+    frequency and L2-normalize the rows, as ``TfidfVectorizer`` does
+    with its default parameters.
+
+    This is linear in the number of non-zero counts and does not
+    tokenize anything, so it is cheap to redo when the document
+    frequencies change.
+
+    Returns
+    -------
+    idf : numpy.ndarray
+        The inverse document frequency of each term.
+
+    tfidf_matrix : scipy.sparse.csr_matrix
+        The TF-IDF matrix.
+    """
+    n_documents = counts.shape[0]
+    document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+    tfidf_matrix = csr_matrix(
+        (counts.data * idf[counts.indices], counts.indices, counts.indptr),
+        shape=counts.shape,
+    )
+    return idf, normalize(tfidf_matrix, copy=False)
+
+
+def count_new_terms(documents, analyzer, vocabulary):
+    """
+    Count the terms of ``documents``, adding the terms that are not in
+    ``vocabulary`` as new columns at the end.
+
+    Parameters
+    ----------
+    documents : iterable of str
+        The documents to vectorize.
+
+    analyzer : callable
+        Splits a document into terms, as returned by
+        ``TfidfVectorizer.build_analyzer``.
+
+    vocabulary : dict
+        Term -> column of the existing vectorization, not modified.
+
+    Returns
+    -------
+    counts : scipy.sparse.csr_matrix
+        The term counts, one row per document.
+
+    vocabulary : dict
+        ``vocabulary`` with the new terms.
+    """
+    vocabulary = dict(vocabulary)
+    indptr, indices, data = [0], [], []
+
+    for document in documents:
+        terms = Counter(analyzer(document))
+
+        for term in terms:
+            if term not in vocabulary:
+                vocabulary[term] = len(vocabulary)
+
+        ordered = sorted(terms, key=vocabulary.__getitem__)
+        indices.extend(vocabulary[term] for term in ordered)
+        data.extend(terms[term] for term in ordered)
+        indptr.append(len(indices))
+
+    counts = csr_matrix(
+        (
+            np.array(data, dtype=np.int32),
+            np.array(indices, dtype=np.int32),
+            np.array(indptr, dtype=np.int64),
+        ),
+        shape=(len(indptr) - 1, len(vocabulary)),
+    )
+    return counts, vocabulary
+
+
+def update_counts(counts, replaced, delta):
+    """
+    Return ``counts`` with the rows at ``replaced`` replaced by the
+    first rows of ``delta`` and the remaining rows of ``delta``
+    appended at the end.
+
+    ``delta`` may have more columns (new terms) than ``counts``.
+    """
+    n_rows = counts.shape[0]
+    counts = csr_matrix(
+        (counts.data, counts.indices, counts.indptr),
+        shape=(n_rows, delta.shape[1]),
+    )
+    # row i of the result is row order[i] of counts stacked on delta
+    order = np.arange(n_rows + delta.shape[0] - len(replaced))
+    order[replaced] = n_rows + np.arange(len(replaced))
+    order[n_rows:] = n_rows + np.arange(len(replaced), delta.shape[0])
+    updated = vstack([counts, delta], format="csr")[order]
+    updated.sort_indices()
+    return updated
+
+
+def align_rows(previous_ids, ids):
+    """
+    Find the rows of a new snapshot of the movies with TMDB ``ids`` in
+    a previous snapshot with ``previous_ids``.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        The rows of the new snapshot in the order of the previous
+        snapshot, followed by the rows of the new movies, or None if
+        the ids are not unique or a movie of the previous snapshot is
+        not in the new one.
+    """
+    index = pd.Index(ids)
+
+    if not index.is_unique or not pd.Index(previous_ids).is_unique:
+        return None
+
+    rows = index.get_indexer(previous_ids)
+
+    if (rows < 0).any():
+        return None
+
+    added = np.setdiff1d(np.arange(len(ids)), rows, assume_unique=True)
+    return np.concatenate([rows, added])
+
+
+def make_vectorizer(stop_words, vocabulary, idf):
+    """Return a TF-IDF vectorizer with a known vocabulary and idf"""
+    vectorizer = TfidfVectorizer(stop_words=stop_words, vocabulary=vocabulary)
+    vectorizer.idf_ = idf
+    return vectorizer
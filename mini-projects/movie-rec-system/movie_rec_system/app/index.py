@@ -0,0 +1,705 @@
+import logging
+import threading
+import time
+from functools import cached_property
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from .ann import BACKENDS, ExactBackend, make_backend
+from .artifact import (
+    artifact_version,
+    load_artifact,
+    read_manifest,
+    read_vocabulary,
+)
+from .config import get_settings
+from .data import MovieData, data_version, get_movie_data
+from .incremental import (
+    align_rows,
+    count_new_terms,
+    fit_term_counts,
+    make_vectorizer,
+    tfidf_from_counts,
+    update_counts,
+)
+from .metrics import collect_timings, get_stage_metrics, timed
+from .recommenderhelper import get_data, top_similar_positions
+from .storage import (
+    TFIDF_DTYPES,
+    convert_tfidf,
+    dequantize_rows,
+    dot_rows,
+    dot_rows_batch,
+    nbytes,
+    tfidf_row,
+)
+from .titles import TitleIndex, TitleResolver
+
+logger = logging.getLogger(__name__)
+
+# upper bound on the number of similarities computed at once in a batch
+_MAX_SIMILARITIES = 2**24
+
+
+class RecommenderIndex:
+    """
+    A fitted content-based recommender over the whole movie catalog.
+
+    The index is built once and holds the fitted TF-IDF vectorizer,
+    the sparse TF-IDF matrix and the title -> row index. A query
+    only computes the similarities between the input movie and
+    every other movie (a single row), instead of the full N x N
+    similarity matrix.
+
+    Parameters
+    ----------
+    data : MovieData
+        The prepared movie data.
+
+    vectorizer : sklearn.feature_extraction.text.TfidfVectorizer
+        The vectorizer fitted on the "combined" column. None for the
+        indexes loaded from an artifact, which read it on first use
+        (only updating or saving the index needs it).
+
+    tfidf_matrix : scipy.sparse.csr_matrix
+        The L2-normalized TF-IDF matrix, one row per movie, with float64,
+        float32 or quantized uint8 weights (see ``compact``).
+
+    stop_words : str
+        The stop words used to fit the vectorizer.
+
+    version : str, optional
+        The version of the model, see ``artifact_version``.
+
+    embeddings : numpy.ndarray, optional
+        Dense, L2-normalized float32 vectors of the movies, one row per
+        movie. When provided, the similarities are computed with these
+        vectors instead of the TF-IDF matrix, see ``reduce_dimensions``.
+
+    term_counts : numpy.ndarray, optional
+        The raw term counts behind the TF-IDF matrix, aligned with
+        ``tfidf_matrix.data``. Needed to ``update`` the index.
+
+    updates : int
+        Number of incremental updates since the TF-IDF vectorizer was
+        last fitted from scratch.
+
+    tfidf_scales : numpy.ndarray, optional
+        The scale of each row of a quantized (uint8) TF-IDF matrix, see
+        ``quantize_rows``.
+
+    Attributes
+    ----------
+    backend : SearchBackend
+        The nearest-neighbour search used by ``top_positions``. The
+        exact search by default, see ``use_backend``.
+
+    resolver : TitleResolver
+        Resolves misspelled titles to the titles in the index, built
+        on first use.
+    """
+
+    def __init__(
+        self,
+        data,
+        vectorizer,
+        tfidf_matrix,
+        stop_words="english",
+        version=None,
+        embeddings=None,
+        term_counts=None,
+        updates=0,
+        tfidf_scales=None,
+    ):
+        self.data = data
+
+        if vectorizer is not None:
+            self.vectorizer = vectorizer
+
+        self.tfidf_matrix = tfidf_matrix
+        self.stop_words = stop_words
+        self.titles = data.titles
+        self.title_index = data.title_index
+        self.version = version
+        self.embeddings = embeddings
+        self.term_counts = term_counts
+        self.updates = updates
+        self.tfidf_scales = tfidf_scales
+        self.backend = ExactBackend(self)
+
+    @classmethod
+    def build(cls, data: MovieData, stop_words="english"):
+        """
+        Fit the TF-IDF vectorizer on the "combined" text of ``data``
+        and return a new index.
+        """
+        vectorizer, counts, tfidf_matrix = fit_term_counts(
+            data.combined, stop_words
+        )
+        index = cls(
+            data, vectorizer, tfidf_matrix, stop_words, term_counts=counts.data
+        )
+        index.version = artifact_version(index)
+        return index
+
+    @classmethod
+    def from_artifact(cls, path, version=None):
+        """
+        Load the index from a model artifact saved with
+        ``save_artifact`` (by default, its current version). The
+        TF-IDF matrix, the metrics, the title index, the title resolver
+        and the search backend are memory-mapped, the titles are
+        decoded and the vocabulary is read on first use.
+        """
+        artifact = load_artifact(path, version)
+        manifest = artifact["manifest"]
+        titles = artifact["titles"]
+
+        if artifact["title_index"] is None:
+            title_index = TitleIndex(titles)
+        else:
+            title_index = TitleIndex.from_arrays(
+                titles, artifact["title_index"]
+            )
+
+        data = MovieData(
+            titles=titles,
+            combined=None,
+            metrics=artifact["metrics"],
+            title_index=title_index,
+            ids=artifact["ids"],
+            digests=artifact["digests"],
+        )
+        index = cls(
+            data,
+            None,
+            artifact["tfidf_matrix"],
+            manifest["stop_words"],
+            manifest["version"],
+            artifact["embeddings"],
+            artifact["term_counts"],
+            manifest.get("updates", 0),
+            artifact["tfidf_scales"],
+        )
+        index._read_vectorizer = lambda: make_vectorizer(
+            manifest["stop_words"],
+            read_vocabulary(path, manifest["version"]),
+            artifact["idf"],
+        )
+
+        if artifact["resolver"] is not None:
+            index.__dict__["resolver"] = TitleResolver.from_arrays(
+                titles, title_index, artifact["resolver"]
+            )
+
+        if artifact["backend"] is not None:
+            backend = manifest["backend"]
+            index.backend = BACKENDS[backend["name"]].from_arrays(
+                index, backend["params"], artifact["backend"]
+            )
+
+        return index
+
+    def update(self, data: MovieData):
+        """
+        Return a new index for ``data``, a newer snapshot of the
+        movies in this index (keyed by their TMDB id).
+
+        Only the text of the movies that were added or whose text
+        changed is vectorized: their term counts replace or are
+        appended to the counts of the index, new terms are added to
+        the vocabulary, and the TF-IDF weights are recomputed from the
+        counts with the updated document frequencies (no tokenization,
+        linear in the number of non-zero counts). The result is the
+        same as fitting the vectorizer on ``data`` from scratch, up to
+        the order of the rows and of the vocabulary. The movies keep
+        their rows and new movies are appended.
+
+        The index is not modified. Returns None when it cannot be
+        updated: it has no term counts or ids, the ids are not unique
+        or some of its movies are not in ``data``.
+        """
+        if self.term_counts is None or self.data.ids is None:
+            return None
+
+        if data.ids is None or data.digests is None or data.combined is None:
+            return None
+
+        if self.data.digests is None:
+            return None
+
+        rows = align_rows(self.data.ids, data.ids)
+
+        if rows is None:
+            return None
+
+        data = data.take(rows)
+        n_rows = len(self)
+        changed = np.flatnonzero(self.data.digests != data.digests[:n_rows])
+        delta_rows = np.concatenate([changed, np.arange(n_rows, len(data))])
+
+        if len(delta_rows):
+            delta, vocabulary = count_new_terms(
+                data.combined[delta_rows],
+                self.vectorizer.build_analyzer(),
+                self.vectorizer.vocabulary_,
+            )
+            counts = update_counts(self._counts(), changed, delta)
+            idf, tfidf_matrix = tfidf_from_counts(counts)
+            vectorizer = make_vectorizer(self.stop_words, vocabulary, idf)
+            scales = None
+        else:
+            counts, tfidf_matrix = self._counts(), self.tfidf_matrix
+            vectorizer = self.vectorizer
+            scales = self.tfidf_scales
+
+        index = RecommenderIndex(
+            data,
+            vectorizer,
+            tfidf_matrix,
+            self.stop_words,
+            term_counts=counts.data,
+            updates=self.updates + 1,
+            tfidf_scales=scales,
+        )
+        index.version = artifact_version(index)
+        return index
+
+    def _counts(self):
+        return csr_matrix(
+            (
+                self.term_counts,
+                self.tfidf_matrix.indices,
+                self.tfidf_matrix.indptr,
+            ),
+            shape=self.tfidf_matrix.shape,
+        )
+
+    def reduce_dimensions(self, n_components=128, seed=0):
+        """
+        Project the TF-IDF matrix to ``n_components`` dimensions with a
+        truncated SVD (latent semantic analysis) and compute the
+        similarities with the projected vectors from now on.
+
+        The vectors are stored as a contiguous float32 array, so a
+        query is a small dense matrix-vector product and the memory
+        used is fixed (4 * n_components bytes per movie) regardless of
+        the size of the vocabulary. Fewer components are faster and
+        use less memory, more components are closer to the TF-IDF
+        similarities.
+        """
+        n_components = min(n_components, self.tfidf_matrix.shape[1] - 1)
+        svd = TruncatedSVD(n_components=n_components, random_state=seed)
+        tfidf_matrix = self.tfidf_matrix
+
+        if self.tfidf_scales is not None:
+            tfidf_matrix = dequantize_rows(tfidf_matrix, self.tfidf_scales)
+
+        embeddings = normalize(svd.fit_transform(tfidf_matrix))
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.embeddings.setflags(write=False)
+        # the backend may search the previous vectors
+        self.backend = ExactBackend(self)
+        self.version = artifact_version(self)
+        return self
+
+    @property
+    def tfidf_dtype(self) -> str:
+        """The precision of the TF-IDF weights, see ``compact``"""
+        return self.tfidf_matrix.dtype.name
+
+    def compact(self, dtype="float32"):
+        """
+        Store the TF-IDF weights with ``dtype``: "float64" (as
+        fitted), "float32" (half the memory of the weights, the
+        similarities differ by about 1e-7) or "uint8" (an eighth of
+        the memory, each row quantized to 256 levels, see
+        ``quantize_rows``). The similarities are computed with the
+        same precision, float32 for "float32" and "uint8".
+
+        Converting to a more precise dtype does not restore the
+        precision that was lost.
+        """
+        matrix, scales = convert_tfidf(
+            self.tfidf_matrix, self.tfidf_scales, dtype
+        )
+
+        if matrix is not self.tfidf_matrix:
+            self.tfidf_matrix, self.tfidf_scales = matrix, scales
+            self.version = artifact_version(self)
+
+        return self
+
+    def memory_usage(self) -> dict:
+        """
+        Return the bytes used by each component of the index (see
+        ``nbytes``), and their "total". Memory-mapped arrays are
+        counted, objects shared by several components are counted in
+        the first one.
+        """
+        # the backends reference the index
+        seen = {id(self)}
+        components = {
+            "tfidf_matrix": (self.tfidf_matrix, self.tfidf_scales),
+            "embeddings": (self.embeddings,),
+            "term_counts": (self.term_counts,),
+            "vectorizer": (self.__dict__.get("vectorizer"),),
+            "titles": (self.titles, self.title_index),
+            "combined": (self.data.combined,),
+            "metrics": (self.data.metrics,),
+            "ids": (self.data.ids, self.data.digests),
+            "resolver": (self.__dict__.get("resolver"),),
+            "backend": (self.backend,),
+        }
+        usage = {
+            name: sum(nbytes(value, seen) for value in values)
+            for name, values in components.items()
+        }
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def __len__(self):
+        return self.tfidf_matrix.shape[0]
+
+    @cached_property
+    def vectorizer(self):
+        return self._read_vectorizer()
+
+    @cached_property
+    def resolver(self) -> TitleResolver:
+        return TitleResolver(self.titles, self.title_index)
+
+    def position(self, movie: str):
+        """
+        Return the row of ``movie`` in the index, or None if the
+        movie is not in the catalog.
+        """
+        return self.title_index.first(movie)
+
+    def similarities(self, position: int) -> np.ndarray:
+        """
+        Compute the cosine similarity between the movie at
+        ``position`` and every movie in the index.
+
+        Since the TF-IDF rows are L2-normalized, the cosine
+        similarity is the dot product of the rows. Multiplying the
+        CSR matrix by the dense row is much faster than a sparse
+        row times the transposed matrix.
+        """
+        if self.embeddings is not None:
+            return self.embeddings @ self.embeddings[position]
+
+        # the whole matrix, indexing it with a slice would copy it
+        return dot_rows(
+            self.tfidf_matrix, self.tfidf_scales, self._row(position)
+        )
+
+    def similarities_to(self, position: int, rows) -> np.ndarray:
+        """
+        Compute the cosine similarity between the movie at
+        ``position`` and the movies at ``rows``.
+        """
+        if self.embeddings is not None:
+            return self.embeddings[rows] @ self.embeddings[position]
+
+        scales = self.tfidf_scales
+        return dot_rows(
+            self.tfidf_matrix[rows],
+            None if scales is None else scales[rows],
+            self._row(position),
+        )
+
+    def _row(self, position):
+        return tfidf_row(self.tfidf_matrix, self.tfidf_scales, position)
+
+    def similarities_batch(self, positions) -> np.ndarray:
+        """
+        Compute the cosine similarity between the movies at
+        ``positions`` and every movie in the index, as a single
+        matrix product.
+
+        Returns a dense array of shape (len(positions), len(self)).
+        """
+        if self.embeddings is not None:
+            return self.embeddings[positions] @ self.embeddings.T
+
+        rows = self.tfidf_matrix[positions]
+
+        if self.tfidf_scales is not None:
+            rows = dequantize_rows(rows, self.tfidf_scales[positions])
+
+        return dot_rows_batch(self.tfidf_matrix, self.tfidf_scales, rows)
+
+    def recommend(self, movie: str, top_n=10) -> list:
+        """
+        Return the titles of the ``top_n`` movies most similar
+        to ``movie`` (excluding the movie itself), or an empty list
+        if the movie is not in the catalog.
+        """
+        position = self.position(movie)
+
+        if position is None:
+            return []
+
+        return list(self.titles[self.top_positions(position, top_n)])
+
+    def use_backend(self, backend):
+        """Search the similar movies with ``backend``"""
+        previous, self.backend = self.backend, backend
+
+        # the backend is saved with the artifact, see ``artifact_version``
+        if (previous.name, previous.params) != (backend.name, backend.params):
+            self.version = artifact_version(self)
+
+        return self
+
+    def top_positions(self, position: int, top_n=10) -> np.ndarray:
+        """
+        Return the rows of the ``top_n`` movies most similar to the
+        movie at ``position`` (excluding the movie itself), as found
+        by the search backend.
+        """
+        return self.backend.search(position, top_n)
+
+    def top_positions_batch(self, positions, top_n=10) -> np.ndarray:
+        """
+        Return the rows of the ``top_n`` movies most similar to each
+        movie at ``positions``, as an array of shape
+        (len(positions), min(top_n, len(self) - 1)).
+        """
+        return self.backend.search_batch(positions, top_n)
+
+    def exact_top_positions(self, position: int, top_n=10) -> np.ndarray:
+        """
+        Same as ``top_positions``, comparing the movie with every
+        movie in the index.
+        """
+        return top_similar_positions(self.similarities(position), top_n)
+
+    def exact_top_positions_batch(self, positions, top_n=10) -> np.ndarray:
+        """
+        Same as ``top_positions_batch``, comparing the movies with
+        every movie in the index.
+
+        The similarity rows are computed in chunks, so the dense
+        similarities in memory stay bounded for large catalogs.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        top_n = max(0, min(top_n, len(self) - 1))
+        top = np.empty((len(positions), top_n), dtype=np.intp)
+        chunk_size = max(1, _MAX_SIMILARITIES // max(len(self), 1))
+
+        for start in range(0, len(positions), chunk_size):
+            chunk = positions[start : start + chunk_size]  # noqa E203
+
+            for offset, movie_sim in enumerate(self.similarities_batch(chunk)):
+                top[start + offset] = top_similar_positions(movie_sim, top_n)
+
+        return top
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_index(stop_words="english") -> RecommenderIndex:
+    """
+    Return the recommender index for ``stop_words``, loading it
+    on first use. The same index is shared by every request.
+    """
+    index = _indexes.get(stop_words)
+
+    if index is None:
+        with _lock:
+            index = _indexes.get(stop_words)
+
+            if index is None:
+                index = _indexes[stop_words] = _load_index(stop_words)
+
+    return index
+
+
+def rebuild_index(stop_words="english") -> RecommenderIndex:
+    """
+    Reload the movie data and rebuild the recommender index for
+    ``stop_words``, updating the current index incrementally when
+    possible (see ``refresh_index``). Requests keep using the
+    previous index until the new one is ready.
+    """
+    get_data.cache_clear()
+    get_movie_data.cache_clear()
+    index = _load_index(stop_words, previous=_indexes.get(stop_words))
+
+    with _lock:
+        _indexes[stop_words] = index
+
+    return index
+
+
+def refresh_index(
+    previous, data: MovieData, stop_words="english", full_rebuild_every=10
+) -> RecommenderIndex:
+    """
+    Return an index for ``data``: ``previous`` updated incrementally
+    with the movies that were added or changed (see
+    ``RecommenderIndex.update``), or a new index fitted from scratch if
+    there is no ``previous`` index, it cannot be updated or it was
+    already updated ``full_rebuild_every`` times (0 always fits from
+    scratch). The periodic full rebuild drops the terms no movie uses
+    anymore and restores the order of the rows in ``data``.
+    """
+    if (
+        previous is not None
+        and previous.stop_words == stop_words
+        and previous.updates < full_rebuild_every
+    ):
+        index = previous.update(data)
+
+        if index is not None:
+            return index
+
+    return RecommenderIndex.build(data, stop_words)
+
+
+def current_manifest(settings=None):
+    """
+    Return the manifest of the current model artifact, or None if
+    there is none or it is stale: it was fitted on a version of the
+    movie data (see ``data_version``) that has since been replaced.
+    The artifacts of the model task do not record the data they were
+    fitted on, they are only replaced by the next run of the task.
+    """
+    settings = settings or get_settings()
+
+    try:
+        manifest = read_manifest(settings.artifact_path)
+    except FileNotFoundError:
+        return None
+
+    fitted_on = manifest.get("data_version")
+
+    if fitted_on is None:
+        return manifest
+
+    # without any movie data, the artifact is all there is to serve
+    return manifest if data_version(settings) in (None, fitted_on) else None
+
+
+def load_index(stop_words="english", previous=None) -> RecommenderIndex:
+    """
+    Load the recommender index from the current model artifact if
+    it was built with ``stop_words`` and is not stale (see
+    ``current_manifest``), otherwise fit it on the data in
+    DuckDB, updating the ``previous`` index incrementally if given
+    (see ``refresh_index``). The artifact directory, the search backend,
+    the full rebuild period, the precision of the TF-IDF weights and the
+    memory budget are read from the settings (see ``Settings``).
+    """
+    settings = get_settings()
+    manifest = current_manifest(settings)
+
+    if manifest is not None and manifest["stop_words"] == stop_words:
+        with timed("artifact"):
+            index = RecommenderIndex.from_artifact(
+                settings.artifact_path, manifest["version"]
+            )
+    else:
+        with timed("data"):
+            data = get_movie_data()
+
+        with timed("fit"):
+            index = refresh_index(
+                previous, data, stop_words, settings.full_rebuild_every
+            )
+
+    n_components = settings.svd_components
+
+    if not n_components:
+        if index.embeddings is not None:
+            index.embeddings = None
+            index.backend = ExactBackend(index)
+            index.version = artifact_version(index)
+    elif index.embeddings is None or index.embeddings.shape[1] != min(
+        n_components, index.tfidf_matrix.shape[1] - 1
+    ):
+        with timed("svd"):
+            index.reduce_dimensions(n_components)
+
+    # build the title resolver before the index serves requests
+    with timed("resolver"):
+        index.resolver
+
+    with timed("backend"):
+        index.use_backend(make_backend(index, settings))
+
+    with timed("compact"):
+        # converting the weights of an artifact to a more precise dtype
+        # would not restore their precision, only copy them
+        position = TFIDF_DTYPES.index(index.tfidf_dtype)
+
+        if settings.tfidf_dtype not in TFIDF_DTYPES[: position + 1]:
+            index.compact(settings.tfidf_dtype)
+
+        return fit_memory_budget(index, settings.memory_budget_mb)
+
+
+def fit_memory_budget(index, budget_mb) -> RecommenderIndex:
+    """
+    Lower the precision of the TF-IDF weights of ``index`` (float32,
+    then uint8, see ``RecommenderIndex.compact``) until the memory it
+    uses (see ``RecommenderIndex.memory_usage``) fits in ``budget_mb``
+    megabytes. Nothing is done if ``budget_mb`` is 0.
+
+    Raises MemoryError if the index does not fit in the budget even
+    with uint8 weights.
+    """
+    if not budget_mb:
+        return index
+
+    budget = budget_mb * 2**20
+    usage = index.memory_usage()
+    position = TFIDF_DTYPES.index(index.tfidf_dtype)
+
+    for dtype in TFIDF_DTYPES[position + 1 :]:  # noqa E203
+        if usage["total"] <= budget:
+            break
+
+        previous = usage["tfidf_matrix"]
+        index.compact(dtype)
+        # only the TF-IDF weights changed
+        usage["tfidf_matrix"] = nbytes(index.tfidf_matrix) + nbytes(
+            index.tfidf_scales
+        )
+        usage["total"] += usage["tfidf_matrix"] - previous
+        logger.warning(
+            "Stored the TF-IDF weights as %s to fit in the memory budget "
+            "of %s MB",
+            dtype,
+            budget_mb,
+        )
+
+    if usage["total"] > budget:
+        raise MemoryError(
+            f"The recommender index needs {usage['total'] / 2**20:.1f} MB, "
+            f"more than the memory budget of {budget_mb} MB"
+        )
+
+    return index
+
+
+def _load_index(stop_words="english", previous=None) -> RecommenderIndex:
+    """
+    ``load_index``, recording the time of its stages in the "load"
+    histograms when the metrics are enabled
+    """
+    if not get_settings().metrics:
+        return load_index(stop_words, previous)
+
+    start = time.perf_counter()
+    index, timings = collect_timings(load_index, stop_words, previous)
+    timings["total"] = time.perf_counter() - start
+    get_stage_metrics().observe("load", timings)
+    return index
@@ -0,0 +1,184 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+# the timings of the call being timed, see ``collect_timings``
+_timings = ContextVar("timings", default=None)
+
+
+class _Timer:
+    __slots__ = ("timings", "stage", "start")
+
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        # added when the stage starts, so the stages keep their order
+        self.timings.setdefault(self.stage, 0.0)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings[self.stage] += time.perf_counter() - self.start
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timer(timings, stage):
+    """
+    Time a stage, adding its duration to the ``timings`` dictionary,
+    or do nothing if ``timings`` is None (the metrics are disabled).
+
+    Disabled timers are a shared context manager that does nothing, so
+    they cost next to nothing.
+    """
+    return _NO_TIMER if timings is None else _Timer(timings, stage)
+
+
+def timed(stage):
+    """
+    Time a stage of the call being timed (see ``collect_timings``), do
+    nothing outside of a timed call.
+
+    Examples
+    --------
+    >>> with timed("similarity"):
+    ...     positions = index.top_positions(position, 10)
+    """
+    return timer(_timings.get(), stage)
+
+
+def collect_timings(fn, *args, **kwargs):
+    """
+    Call ``fn`` and return its result and the seconds spent in each
+    stage it timed with ``timed``, in the order they started.
+
+    This is a plain module-level function so it can be sent to a worker
+    process, the timings are returned with the result.
+    """
+    timings = {}
+    token = _timings.set(timings)
+
+    try:
+        return fn(*args, **kwargs), timings
+    finally:
+        _timings.reset(token)
+
+
+def server_timing(timings) -> str:
+    """
+    Format stage timings (in seconds) as a ``Server-Timing`` header,
+    with the durations in milliseconds
+    """
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.3f}"
+        for stage, seconds in timings.items()
+    )
+
+
+class StageMetrics:
+    """
+    Histograms of the time spent in each stage of the recommender,
+    exported in the Prometheus text format.
+
+    There is one histogram per operation ("recommendation", "load",
+    ...) and stage, with the cumulative buckets, the sum and the count
+    Prometheus expects. Observations are thread-safe.
+
+    Parameters
+    ----------
+    buckets : tuple of float
+        Upper bounds of the buckets, in seconds, sorted.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, operation, timings):
+        """Record the stage ``timings`` (in seconds) of an operation"""
+        with self._lock:
+            for stage, seconds in timings.items():
+                key = (operation, stage)
+                histogram = self._histograms.get(key)
+
+                if histogram is None:
+                    histogram = self._histograms[key] = [
+                        [0] * (len(self.buckets) + 1),
+                        0.0,
+                    ]
+
+                histogram[0][bisect_left(self.buckets, seconds)] += 1
+                histogram[1] += seconds
+
+    def render(self) -> str:
+        """Return the histograms in the Prometheus text format"""
+        name = "recommender_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each stage of the recommender.",
+            f"# TYPE {name} histogram",
+        ]
+
+        with self._lock:
+            histograms = sorted(
+                (key, list(counts), total)
+                for key, (counts, total) in self._histograms.items()
+            )
+
+        for (operation, stage), counts, total in histograms:
+            labels = f'operation="{operation}",stage="{stage}"'
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+
+            lines.append(f"{name}_sum{{{labels}}} {total}")
+            lines.append(f"{name}_count{{{labels}}} {cumulative}")
+
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_stage_metrics() -> StageMetrics:
+    """Return the stage histograms of the API process"""
+    return StageMetrics()
@@ -1,12 +1,9 @@
-import json
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from .recommenderhelper import (
-    content_movie_recommender,
-    compute_metrics,
-    retrieve_and_transform_data,
-    compute_tfidf_vectorization,
-)
+from .cache import MISSING, get_result_cache
+from .config import get_settings
+from .index import get_index
+from .metrics import timed
+from .recommenderhelper import compute_metrics_batch
+from .schemas import BatchRecommendation, Metrics, Recommendation
 
 
 def get_recommendation(movie: str, num_rec: int = 10, stop_words="english"):
@@ -14,13 +11,19 @@ def get_recommendation(movie: str, num_rec: int = 10, stop_words="english"):
     Generate movie recommendations based on
     content similarity and computes associated metrics.
 
-    This function retrieves movie data,
-    calculates cosine similarity between movies using
-    TF-IDF vectorization of their combined overview
-    and genre, and returns a list of recommended
-    movies along with certain metrics
+    This function uses the shared recommender index
+    to compute the cosine similarity between the movie
+    and every other movie using TF-IDF vectorization of
+    their combined overview and genre, and returns a
+    list of recommended movies along with certain metrics
     (popularity, vote average, and vote count RMSE).
 
+    Results are cached by movie, number of recommendations
+    and stop words until the model version changes.
+
+    The "cache" lookup, the "similarity" search and the
+    "metrics" are timed with ``timed`` (see ``collect_timings``).
+
     Parameters
     ----------
     movie : str
@@ -38,18 +41,18 @@ def get_recommendation(movie: str, num_rec: int = 10, stop_words="english"):
 
     Returns
     -------
-    str
-        A JSON-formatted string containing
-        the original movie, a list of recommendations,
+    Recommendation or None
+        The original movie, a list of recommendations,
         and associated metrics
-        (popularity, vote average, and vote count RMSE).
+        (popularity, vote average, and vote count RMSE),
+        or None if the movie was not found.
 
     Examples
     --------
     >>> result = get_recommendation("Inception", num_rec=5)
-    >>> print(json.loads(result))
+    >>> print(result.model_dump())
     {
-        "movie": "Inception",
+        "movie": "inception",
         "recommendations": [...],
         "metrics": {
             "popularity": ...,
@@ -60,35 +63,181 @@ def get_recommendation(movie: str, num_rec: int = 10, stop_words="english"):
 
     """
     movie = movie.lower()
-    df = retrieve_and_transform_data()
+    index = get_index(stop_words)
+    cache = get_result_cache()
+    key = (movie, num_rec, stop_words)
 
-    tfidf_matrix = compute_tfidf_vectorization(df, stop_words)
-    similarity = cosine_similarity(tfidf_matrix)
+    with timed("cache"):
+        result = cache.get(key, index.version)
 
-    similarity_df = pd.DataFrame(
-        similarity, index=df.title.values, columns=df.title.values
-    )
-    movie_list = similarity_df.columns.values
-    recommendations = content_movie_recommender(
-        movie, similarity_df, movie_list, num_rec
-    )
+    if result is MISSING:
+        result = _get_recommendation(index, movie, num_rec)
+        cache.set(key, index.version, result)
+
+    return result
+
+
+def resolve_title(movie: str, stop_words="english", fuzzy=True):
+    """
+    Return the title of the catalog ``movie`` refers to, ignoring
+    case, accents and punctuation and tolerating misspellings (see
+    ``TitleResolver.resolve``), or None if it is not in the catalog.
+
+    This only looks up the title index, so unknown titles can be
+    rejected before any recommendation is computed. Without ``fuzzy``,
+    only the hash lookups of the exact and normalized titles are done,
+    cheap enough for the event loop: misspelled titles are not
+    resolved, see ``match_title``.
 
-    if not recommendations:
+    Examples
+    --------
+    >>> resolve_title("Spiderman: Across the Spiderverse")
+    'spider-man: across the spider-verse'
+    """
+    threshold = get_settings().title_match_threshold if fuzzy else 0
+    return get_index(stop_words).resolver.resolve(movie, threshold)
+
+
+def suggest_titles(movie: str, limit=5, stop_words="english") -> list:
+    """Return up to ``limit`` titles of the catalog similar to ``movie``"""
+    return get_index(stop_words).resolver.suggest(movie, limit)
+
+
+def match_title(movie: str, stop_words="english"):
+    """
+    Resolve a misspelled ``movie`` with the trigram search of the
+    title resolver, meant to run on the worker pool when
+    ``resolve_title`` without ``fuzzy`` found nothing.
+
+    The "resolve" stage is timed with ``timed``.
+
+    Returns
+    -------
+    title : str or None
+        The title of the catalog ``movie`` refers to, if any.
+
+    suggestions : list
+        The titles similar to ``movie`` if it was not resolved (see
+        ``suggest_titles``), otherwise empty.
+    """
+    with timed("resolve"):
+        title = resolve_title(movie, stop_words)
+
+        if title is not None:
+            return title, []
+
+        return None, suggest_titles(movie, stop_words=stop_words)
+
+
+def _get_recommendation(index, movie, num_rec):
+    position = index.position(movie)
+
+    if position is None:
         return None
 
-    popularity_rmse, vote_avg_rmse, vote_count_rmse = compute_metrics(
-        df, movie, recommendations
-    )
+    with timed("similarity"):
+        positions = index.top_positions(position, num_rec)
 
-    result = {
-        "movie": movie,
-        "recommendations": recommendations,
-        "metrics": {
-            "popularity": popularity_rmse,
-            "vote_avg": vote_avg_rmse,
-            "vote_count": vote_count_rmse,
-        },
+    if not len(positions):
+        return None
+
+    with timed("metrics"):
+        recommendations = list(index.titles[positions])
+        (rmse,) = compute_metrics_batch(
+            index.data.metrics, [position], [positions]
+        )
+        return _recommendation_result(movie, recommendations, rmse)
+
+
+def get_recommendations_batch(
+    movies: list, num_rec: int = 10, stop_words="english"
+):
+    """
+    Generate movie recommendations and their metrics for
+    several movies at once.
+
+    The similarities of every movie in the batch are
+    computed together with a sparse matrix product, and the
+    metrics of the whole batch in a single vectorized pass.
+
+    Parameters
+    ----------
+    movies : list of str
+        The titles of the movies for which
+        recommendations are to be generated.
+
+    num_rec : int, optional
+        The number of movie recommendations
+        to generate for each movie. Default is 10.
+
+    stop_words : str, optional
+        The language of stop words to be
+        used when vectorizing the "combined" column.
+        Default is "english".
+
+    Returns
+    -------
+    BatchRecommendation
+        The ``results`` for every movie that was found (in
+        the same order as ``movies``, as returned by
+        ``get_recommendation``) and the titles in ``movies``
+        that were ``not_found``, with the titles they are similar to
+        (``did_you_mean``). Titles are resolved as in
+        ``resolve_title``.
+
+    Examples
+    --------
+    >>> result = get_recommendations_batch(["Inception", "Nope"], 5)
+    >>> print(result.model_dump())
+    {
+        "results": [{"movie": "inception", ...}],
+        "not_found": ["Nope"],
+        "did_you_mean": {"Nope": ["nope"]}
     }
+    """
+    index = get_index(stop_words)
+    threshold = get_settings().title_match_threshold
+    found, positions, not_found, did_you_mean = [], [], [], {}
+
+    with timed("resolve"):
+        for movie in movies:
+            title = index.resolver.resolve(movie, threshold)
+
+            if title is None:
+                not_found.append(movie)
+                did_you_mean[movie] = index.resolver.suggest(movie)
+            else:
+                found.append(title)
+                positions.append(index.position(title))
 
-    result_json = json.dumps(result)
-    return result_json
+    with timed("similarity"):
+        top = index.top_positions_batch(positions, num_rec)
+
+    results = []
+
+    with timed("metrics"):
+        if positions and top.shape[1]:
+            rmse = compute_metrics_batch(index.data.metrics, positions, top)
+            results = [
+                _recommendation_result(movie, list(index.titles[rows]), values)
+                for movie, rows, values in zip(found, top, rmse)
+            ]
+
+    return BatchRecommendation(
+        results=results, not_found=not_found, did_you_mean=did_you_mean
+    )
+
+
+def _recommendation_result(movie, recommendations, rmse):
+    popularity_rmse, vote_avg_rmse, vote_count_rmse = (
+        round(float(value), 3) for value in rmse
+    )
+    return Recommendation(
+        movie=movie,
+        recommendations=recommendations,
+        metrics=Metrics(
+            popularity=popularity_rmse,
+            vote_avg=vote_avg_rmse,
+            vote_count=vote_count_rmse,
+        ),
+    )
@@ -3,6 +3,8 @@ import pandas as pd
 import duckdb
 from functools import lru_cache
 from sklearn.feature_extraction.text import TfidfVectorizer
+from .config import get_settings
+from .titles import TitleIndex
 
 
 def content_movie_recommender(
@@ -10,6 +12,7 @@ def content_movie_recommender(
     similarity_database: pd.DataFrame,
     movie_database_list: list,
     top_n=10,
+    title_index: TitleIndex = None,
 ) -> list:
     """
     Function that uses a similarity matrix to find similar movies
@@ -24,28 +27,89 @@ def content_movie_recommender(
         movies in our similarity matrix
     top_n : int
         number of similar movies to output
+    title_index : TitleIndex, optional
+        index of the titles in ``similarity_database``, if not
+        provided, the hash table of the DataFrame index is used
     """
-    try:
-        # get movie similarity records
-        movie_sim = similarity_database[
-            similarity_database.index == input_movie
-        ].values[0]
-
-        # get movies sorted by similarity
-        sorted_movie_ids = np.argsort(movie_sim)[::-1]
-        recommended_movies = movie_database_list[
-            sorted_movie_ids[1 : top_n + 1]  # noqa E203
-        ]  # noqa E501
-        return list(recommended_movies)
-    except IndexError:
-        return []
+    if title_index is not None:
+        position = title_index.first(input_movie)
+
+        if position is None:
+            return []
+    else:
+        # the index keeps a hash table of the titles, so the lookup
+        # does not scan the whole similarity matrix
+        try:
+            position = similarity_database.index.get_loc(input_movie)
+        except KeyError:
+            return []
+
+        # duplicated titles return a slice or a mask, use the first one
+        if isinstance(position, slice):
+            position = position.start
+        elif isinstance(position, np.ndarray):
+            position = int(np.argmax(position))
+
+    # get movie similarity records
+    movie_sim = similarity_database.iloc[position].values
+
+    recommended_movies = np.asarray(movie_database_list)[
+        top_similar_positions(movie_sim, top_n)
+    ]
+    return list(recommended_movies)
+
+
+def top_similar_positions(movie_sim: np.ndarray, top_n=10) -> np.ndarray:
+    """
+    Find the positions of the ``top_n`` most similar movies, skipping
+    the most similar one (the input movie itself).
+
+    Only the ``top_n + 1`` largest similarities are sorted, so the
+    cost is linear in the number of movies instead of a full sort.
+    The result is the same as
+    ``np.argsort(movie_sim, kind="stable")[::-1][1 : top_n + 1]``:
+    movies are sorted by decreasing similarity and ties are broken
+    by decreasing position.
+
+    Parameters
+    ----------
+    movie_sim : numpy.ndarray
+        similarities between the input movie and every movie
+    top_n : int
+        number of similar movies to output
+
+    Returns
+    -------
+    numpy.ndarray
+        positions of the recommended movies, most similar first
+    """
+    movie_sim = np.asarray(movie_sim)
+    n = len(movie_sim)
+    k = min(top_n + 1, n)
+
+    if k <= 1:
+        return np.empty(0, dtype=np.intp)
+
+    if k < n:
+        # every movie tied with the k-th largest similarity is a
+        # candidate, so ties are resolved the same way as a full sort
+        threshold = np.partition(movie_sim, n - k)[n - k]
+        candidates = np.flatnonzero(movie_sim >= threshold)
+    else:
+        candidates = np.arange(n)
+
+    order = np.lexsort((-candidates, -movie_sim[candidates]))
+    return candidates[order[1:k]]
 
 
 def get_popularity_rmse(
-    df: pd.DataFrame, sample_movie: str, recommendations: list
+    df: pd.DataFrame,
+    sample_movie: str,
+    recommendations: list,
+    title_index: TitleIndex = None,
 ) -> float:
     """
-    Compute RMSE for popularity, vote average, and vote count
+    Compute RMSE for popularity
     for the provided movie and recommendations.
 
     Parameters
@@ -61,38 +125,28 @@ def get_popularity_rmse(
     recommendations : list
         A list of recommended movies.
 
+    title_index : TitleIndex, optional
+        The index of the (lowercased) titles in ``df``. If not
+        provided, it is built from the lowercased "title" column.
+
     Returns
     -------
     popularity_rmse : float
         The RMSE for popularity.
     """
-    # Convert titles in dataframe and sample_movie to lowercase
-    df["title"] = df["title"].str.lower()
-    sample_movie = sample_movie.lower()
-
-    filtered_df = df[df["title"] == sample_movie]
-
-    if not filtered_df.empty:
-        sample_movie_popularity = filtered_df.popularity.iloc[0]
-        recommendations_popularity = df[
-            df["title"].isin(recommendations)
-        ].popularity.values
-
-        squared_diffs = (
-            sample_movie_popularity - recommendations_popularity
-        ) ** 2  # noqa E501
-        rmse = np.sqrt(squared_diffs.mean())
-
-        return round(float(rmse), 3)
-    else:
-        return float("nan")
+    return _compute_rmse(
+        df, "popularity", sample_movie, recommendations, title_index
+    )
 
 
 def get_vote_avg_rmse(
-    df: pd.DataFrame, sample_movie: str, recommendations: list
+    df: pd.DataFrame,
+    sample_movie: str,
+    recommendations: list,
+    title_index: TitleIndex = None,
 ) -> float:
     """
-    Compute RMSE for popularity, vote average, and vote count
+    Compute RMSE for vote average
     for the provided movie and recommendations.
 
     Parameters
@@ -108,34 +162,28 @@ def get_vote_avg_rmse(
     recommendations : list
         A list of recommended movies.
 
+    title_index : TitleIndex, optional
+        The index of the (lowercased) titles in ``df``. If not
+        provided, it is built from the lowercased "title" column.
+
     Returns
     -------
-    popularity_rmse : float
-        The RMSE for popularity.
+    vote_avg_rmse : float
+        The RMSE for vote average.
     """
-    sample_movie_vote_average = df[
-        df["title"] == sample_movie
-    ].vote_average.iloc[  # noqa E501
-        0
-    ]
-    recommendations_vote_average = df[
-        df["title"].isin(recommendations)
-    ].vote_average.values
-
-    squared_diffs = (
-        sample_movie_vote_average - recommendations_vote_average
-    ) ** 2  # noqa E501
-    rmse = np.sqrt(squared_diffs.mean())
-
-    return round(float(rmse), 3)
+    return _compute_rmse(
+        df, "vote_average", sample_movie, recommendations, title_index
+    )
 
 
 def get_vote_count_rmse(
-    df: pd.DataFrame, sample_movie: str, recommendations: list
+    df: pd.DataFrame,
+    sample_movie: str,
+    recommendations: list,
+    title_index: TitleIndex = None,
 ) -> float:
     """
-
-    Compute RMSE for popularity, vote average, and vote count
+    Compute RMSE for vote count
     for the provided movie and recommendations.
 
     Parameters
@@ -151,22 +199,47 @@ def get_vote_count_rmse(
     recommendations : list
         A list of recommended movies.
 
+    title_index : TitleIndex, optional
+        The index of the (lowercased) titles in ``df``. If not
+        provided, it is built from the lowercased "title" column.
+
     Returns
     -------
-        popularity_rmse : float
-        The RMSE for popularity.
+    vote_count_rmse : float
+        The RMSE for vote count.
     """
-    sample_movie_popularity = df[df["title"] == sample_movie].vote_count.iloc[
-        0
-    ]  # noqa E501
-    recommendations_popularity = df[
-        df["title"].isin(recommendations)
-    ].vote_count.values  # noqa E501
+    return _compute_rmse(
+        df, "vote_count", sample_movie, recommendations, title_index
+    )
 
-    squared_diffs = (recommendations_popularity - sample_movie_popularity) ** 2
-    rmse = np.sqrt(squared_diffs.mean())
 
-    return round(float(rmse), 3)
+def _compute_rmse(df, column, sample_movie, recommendations, title_index):
+    """
+    Compute the RMSE of ``column`` between the movie and its
+    recommendations, locating the rows through the title index.
+    Only the values of these rows are read from ``df``. Returns NaN if
+    the movie is not in ``df``.
+    """
+    # Compare titles in dataframe and sample_movie in lowercase,
+    # without modifying the dataframe
+    if title_index is None:
+        title_index = _lowercase_title_index(df)
+
+    position = title_index.first(sample_movie.lower())
+
+    if position is None:
+        return float("nan")
+
+    rows = np.concatenate([[position], title_index.gather(recommendations)])
+    # the movie first, then its recommendations
+    values = df[column].to_numpy()[rows].astype(np.float64).reshape(-1, 1)
+    rmse = compute_metrics_batch(values, [0], [np.arange(1, len(rows))])
+    return round(float(rmse[0, 0]), 3)
+
+
+def _lowercase_title_index(df) -> TitleIndex:
+    """Index the lowercased titles of ``df``, without modifying it"""
+    return TitleIndex(df["title"].str.lower().values)
 
 
 @lru_cache(maxsize=None)
@@ -176,7 +249,7 @@ def get_data() -> pd.DataFrame:
     to duckdb as a GET call upon launch
     of FastAPI
     """
-    con = duckdb.connect("./movies_data.duckdb")
+    con = duckdb.connect(get_settings().database_path)
     query = "SELECT * FROM movie_genre_data"
     df = con.execute(query).fetchdf()
     con.close()
@@ -233,7 +306,8 @@ def retrieve_and_transform_data() -> pd.DataFrame:
     pd.DataFrame
         The transformed DataFrame with an additional "combined" column.
     """
-    df = get_data()
+    # get_data is cached and shared, so transform a copy
+    df = get_data().copy()
     df["title"] = df["title"].str.lower()
     df = create_combined(df)
     return df
@@ -259,12 +333,41 @@ def compute_tfidf_vectorization(df, stop_words="english"):
     -------
     tfidf_matrix:    scipy.sparse.csr.csr_matrix
         The TF-IDF vectorization of the "combined" column."""
-    tfidf = TfidfVectorizer(stop_words=stop_words)
-    tfidf_matrix = tfidf.fit_transform(df["combined"])
+    _, tfidf_matrix = fit_tfidf_vectorizer(df["combined"], stop_words)
     return tfidf_matrix
 
 
-def compute_metrics(df, movie, recommendations):
+def fit_tfidf_vectorizer(documents, stop_words="english"):
+    """
+    Fit a TF-IDF vectorizer on the provided documents,
+    usually the "combined" text of each movie.
+
+    Parameters
+    ----------
+    documents : iterable of str
+        The text to vectorize, one document per movie.
+
+    stop_words : str, optional
+        The language of stop words to be
+        used when vectorizing the documents.
+        Default is "english".
+
+    Returns
+    -------
+    tfidf : sklearn.feature_extraction.text.TfidfVectorizer
+        The fitted vectorizer, which can transform new text
+        into the same vector space.
+
+    tfidf_matrix : scipy.sparse.csr_matrix
+        The TF-IDF vectorization of the documents.
+        Rows are L2-normalized.
+    """
+    tfidf = TfidfVectorizer(stop_words=stop_words)
+    tfidf_matrix = tfidf.fit_transform(documents).tocsr()
+    return tfidf, tfidf_matrix
+
+
+def compute_metrics(df, movie, recommendations, title_index=None):
     """
     Compute RMSE for popularity, vote average, and vote count
     for the provided movie and recommendations.
@@ -282,6 +385,11 @@ def compute_metrics(df, movie, recommendations):
     recommendations : list
         A list of recommended movies.
 
+    title_index : TitleIndex, optional
+        The index of the (lowercased) titles in ``df``, built once
+        alongside the data. If not provided, it is built from the
+        lowercased "title" column.
+
     Returns
     -------
     popularity_rmse : float
@@ -290,10 +398,64 @@ def compute_metrics(df, movie, recommendations):
     vote_avg_rmse : float
         The RMSE for vote average.
 
-        ote_count_rmse : float
+    vote_count_rmse : float
         The RMSE for vote count.
     """
-    popularity_rmse = get_popularity_rmse(df, movie, recommendations)
-    vote_avg_rmse = get_vote_avg_rmse(df, movie, recommendations)
-    vote_count_rmse = get_vote_count_rmse(df, movie, recommendations)
+    if title_index is None:
+        title_index = _lowercase_title_index(df)
+
+    popularity_rmse = get_popularity_rmse(
+        df, movie, recommendations, title_index
+    )
+    vote_avg_rmse = get_vote_avg_rmse(df, movie, recommendations, title_index)
+    vote_count_rmse = get_vote_count_rmse(
+        df, movie, recommendations, title_index
+    )
     return popularity_rmse, vote_avg_rmse, vote_count_rmse
+
+
+def compute_metrics_batch(metrics, sources, recommendations):
+    """
+    Compute the RMSE of every metric between each source movie and
+    its recommendations, for a batch of queries at once.
+
+    The values of the source movies and their recommendations are
+    gathered from ``metrics`` in a single indexing operation.
+
+    Parameters
+    ----------
+    metrics : numpy.ndarray
+        Array of shape (n_movies, n_metrics), such as
+        ``MovieData.metrics``.
+
+    sources : array-like
+        Rows of the source movies, shape (n_queries,).
+
+    recommendations : array-like
+        Rows of the recommended movies for each query, shape
+        (n_queries, n_recommendations).
+
+    Returns
+    -------
+    numpy.ndarray
+        Unrounded RMSE of shape (n_queries, n_metrics). It is NaN
+        for queries without recommendations.
+
+    Examples
+    --------
+    >>> metrics = np.array([[1.0, 10.0], [2.0, 20.0], [4.0, 40.0]])
+    >>> compute_metrics_batch(metrics, [0], [[1, 2]])
+    array([[ 2.23606798, 22.36067977]])
+    """
+    sources = np.asarray(sources, dtype=np.intp).reshape(-1, 1)
+    recommendations = np.asarray(recommendations, dtype=np.intp).reshape(
+        len(sources), -1
+    )
+
+    if recommendations.shape[1] == 0:
+        return np.full((len(sources), metrics.shape[1]), np.nan)
+
+    # (n_queries, 1 + n_recommendations, n_metrics), source first
+    values = metrics[np.hstack([sources, recommendations])]
+    squared_diffs = (values[:, 1:] - values[:, :1]) ** 2
+    return np.sqrt(squared_diffs.mean(axis=1))
@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from .config import get_settings
+from .data import data_version
+from .index import current_manifest, get_index, rebuild_index
+from .workers import restart_worker_pool
+
+logger = logging.getLogger(__name__)
+
+
+def source_version(settings=None) -> str:
+    """
+    Return the version of the data the recommender index is loaded
+    from: the current model artifact if there is one and it is not
+    stale (see ``current_manifest``), otherwise the version of the
+    movie data (see ``data_version``).
+
+    Returns None if neither exists.
+    """
+    settings = settings or get_settings()
+    manifest = current_manifest(settings)
+
+    if manifest is not None:
+        return f"artifact:{manifest['version']}"
+
+    return data_version(settings)
+
+
+class Reloader:
+    """
+    Reload the recommender index when a new version of its data is
+    available, without restarting the API.
+
+    The new index is built on the reloader's thread (or the caller's,
+    see ``reload``) while requests keep using the current one, and
+    then replaces it in a single assignment, so a request sees either
+    the previous or the new model. The result cache is dropped because
+    the model version changes.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between checks for a new version of the data, 0 never
+        checks (``reload`` can still be called).
+
+    stop_words : str
+        The stop words of the index to reload.
+    """
+
+    def __init__(self, interval=0, stop_words="english"):
+        self.interval = interval
+        self.stop_words = stop_words
+        self.source_version = None
+        self.reloads = 0
+        self.last_reload = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Record the version of the data and start the checks"""
+        if self.source_version is None:
+            self.source_version = source_version()
+
+        if self.interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="recommender-reloader", daemon=True
+            )
+            self._thread.start()
+
+        return self
+
+    def stop(self):
+        """Stop the checks, waits for a reload in progress"""
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self) -> bool:
+        """
+        Reload the index if the data changed since the last load.
+        Returns True if the index was reloaded.
+        """
+        if source_version() == self.source_version:
+            return False
+
+        return self.reload()
+
+    def reload(self, force=False) -> bool:
+        """
+        Rebuild the index from the current data and swap it in. Unless
+        ``force``, nothing is done if the data has not changed since
+        the last load. Reloads never run concurrently.
+
+        Returns True if the index was reloaded.
+        """
+        with self._lock:
+            version = source_version()
+
+            if not force and version == self.source_version:
+                return False
+
+            started = time.perf_counter()
+
+            try:
+                index = rebuild_index(self.stop_words)
+            except Exception as e:
+                self.last_error = repr(e)
+                raise
+
+            self.source_version = version
+            self.reloads += 1
+            self.last_error = None
+            self.last_reload = {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "seconds": round(time.perf_counter() - started, 3),
+                "version": index.version,
+            }
+
+            if get_settings().worker_type == "process":
+                restart_worker_pool()
+
+            logger.info("Reloaded the recommender index %s", index.version)
+            return True
+
+    def status(self) -> dict:
+        """Return the active model version and the reload history"""
+        return {
+            "version": get_index(self.stop_words).version,
+            "source_version": self.source_version,
+            "reload_interval": self.interval,
+            "reloads": self.reloads,
+            "last_reload": self.last_reload,
+            "last_error": self.last_error,
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Failed to reload the recommender index")
+
+
+@lru_cache(maxsize=None)
+def get_reloader() -> Reloader:
+    """Return the reloader of the index used by the API"""
+    return Reloader(get_settings().reload_interval)
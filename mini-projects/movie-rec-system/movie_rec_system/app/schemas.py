@@ -0,0 +1,31 @@
+from pydantic import BaseModel, ConfigDict
+
+
+class Metrics(BaseModel):
+    """RMSE between a movie and its recommendations"""
+
+    model_config = ConfigDict(frozen=True)
+
+    popularity: float
+    vote_avg: float
+    vote_count: float
+
+
+class Recommendation(BaseModel):
+    """Recommended movies for a movie, and their metrics"""
+
+    model_config = ConfigDict(frozen=True)
+
+    movie: str
+    recommendations: list[str]
+    metrics: Metrics
+
+
+class BatchRecommendation(BaseModel):
+    """Recommendations for several movies"""
+
+    model_config = ConfigDict(frozen=True)
+
+    results: list[Recommendation]
+    not_found: list[str]
+    did_you_mean: dict[str, list[str]] = {}
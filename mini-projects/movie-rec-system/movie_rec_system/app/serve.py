@@ -0,0 +1,111 @@
+"""
+Serve the recommender API with several uvicorn worker processes
+sharing a single copy of the model.
+
+Before the workers start, a loader process brings the model artifact
+up to date with the settings (see ``prepare_artifact``): the TF-IDF
+model is fitted once, there. Every worker then memory-maps the same
+read-only artifact files instead of reading the movie data and
+fitting its own model, so the operating system keeps a single copy of
+the model in memory however many workers there are, and the workers
+are ready as soon as the files are mapped. The TF-IDF matrix, the SVD
+embeddings, the title index, the title resolver and the search backend
+are mapped; only the titles are decoded into each worker (the
+vocabulary is read on first use, to update the model).
+
+The workers reload the model when the ETL pipeline publishes a new
+artifact (see ``Settings.reload_interval``). When the movie data is
+refreshed without a new artifact, the artifact fitted here is stale:
+each worker then fits its own model on the new data until the next
+start fits a new shared artifact.
+
+Examples
+--------
+$ python -m movie_rec_system.app.serve --workers 4 --port 8000
+"""
+
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .artifact import save_artifact
+from .config import get_settings
+from .data import data_version
+from .index import current_manifest, load_index
+
+
+def prepare_artifact(stop_words="english") -> str:
+    """
+    Make the current model artifact the model the workers serve and
+    return its version.
+
+    The index is loaded as a worker loads it (see ``load_index``):
+    from the current artifact, or fitted on the movie data if there is
+    none or it is stale, with the SVD embeddings, the precision of the
+    TF-IDF weights and the memory budget of the settings. It is saved
+    as the current artifact if it differs from it, so the workers map
+    it as is, without fitting or converting anything.
+
+    An artifact fitted here records the version of the movie data (see
+    ``data_version``), so it does not hide newer data: once the data
+    is refreshed, the artifact is stale and the next start fits it
+    again. A converted artifact keeps the data version of the artifact
+    it was loaded from, none for the artifacts of the model task.
+    """
+    settings = get_settings()
+    manifest = current_manifest(settings)
+
+    if manifest is not None and manifest["stop_words"] == stop_words:
+        fitted_on = manifest.get("data_version")
+    else:
+        # read before the data, data replaced while the model is
+        # fitted leaves the new artifact stale
+        fitted_on = data_version(settings)
+
+    index = load_index(stop_words)
+    return save_artifact(index, settings.artifact_path, fitted_on)
+
+
+def prepare_in_subprocess(stop_words="english") -> str:
+    """
+    Run ``prepare_artifact`` in a new process, so the memory used to
+    fit the model is released before the workers start
+    """
+    context = multiprocessing.get_context("spawn")
+
+    with ProcessPoolExecutor(1, mp_context=context) as executor:
+        return executor.submit(prepare_artifact, stop_words).result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve the recommender API with shared-memory workers"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("WEB_CONCURRENCY", 0)) or os.cpu_count(),
+        help="uvicorn worker processes, defaults to $WEB_CONCURRENCY "
+        "or the number of CPUs",
+    )
+    args = parser.parse_args(argv)
+
+    version = prepare_in_subprocess()
+    print(f"Serving model {version} with {args.workers} workers")
+
+    # only needed to serve, the artifact can be prepared without it
+    import uvicorn
+
+    uvicorn.run(
+        "movie_rec_system.app.app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
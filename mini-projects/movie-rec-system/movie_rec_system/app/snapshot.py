@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import duckdb
+
+from .artifact import _write_atomically, current_version
+
+_CURRENT = "CURRENT"
+_MANIFEST = "manifest.json"
+
+
+def publish_snapshot(conn, path, tables, keep=5) -> str:
+    """
+    Export ``tables`` as a new, immutable version of the Parquet
+    snapshot of the movie data.
+
+    Every table is written as a zstd-compressed Parquet file in a
+    directory ``path/<version>``, named after the UTC time of the
+    export so versions sort chronologically. Once every file is
+    written, ``path/CURRENT`` is atomically updated to point to the
+    new version. Readers never open the DuckDB database, so they are
+    not blocked by (and do not block) an ETL run, and rolling back is
+    just pointing ``CURRENT`` to a previous version (see
+    ``rollback_snapshot``).
+
+    Parameters
+    ----------
+    conn : duckdb.DuckDBPyConnection
+        Connection to the database with the tables.
+
+    path : str or pathlib.Path
+        The directory holding every version of the snapshot.
+
+    tables : iterable of str
+        Tables to export.
+
+    keep : int, default=5
+        Number of versions kept, older ones are deleted (0 keeps
+        every version).
+
+    Returns
+    -------
+    str
+        The version of the snapshot.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    staging = Path(tempfile.mkdtemp(dir=path, prefix=f".{version}-"))
+
+    try:
+        rows = {}
+
+        for table in tables:
+            target = _quote(staging / f"{table}.parquet")
+            conn.execute(
+                f"COPY {table} TO {target} (FORMAT PARQUET, COMPRESSION ZSTD)"
+            )
+            rows[table] = conn.execute(
+                f"SELECT count(*) FROM {table}"
+            ).fetchone()[0]
+
+        manifest = {
+            "version": version,
+            "tables": rows,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        (staging / _MANIFEST).write_text(json.dumps(manifest, indent=2))
+        os.replace(staging, path / version)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_atomically(path / _CURRENT, version)
+
+    if keep:
+        for old in list_snapshots(path)[:-keep]:
+            shutil.rmtree(path / old, ignore_errors=True)
+
+    return version
+
+
+def list_snapshots(path) -> list:
+    """Return the versions of the snapshot in ``path``, oldest first"""
+    path = Path(path)
+
+    if not path.is_dir():
+        return []
+
+    return sorted(
+        entry.name
+        for entry in path.iterdir()
+        if not entry.name.startswith(".") and (entry / _MANIFEST).exists()
+    )
+
+
+def snapshot_file(path, table, version=None):
+    """
+    Return the Parquet file of ``table`` in a snapshot version (by
+    default, the current one), or None if there is no such file.
+    """
+    version = version or current_version(path)
+
+    if version is None:
+        return None
+
+    file = Path(path) / version / f"{table}.parquet"
+    return file if file.exists() else None
+
+
+def read_snapshot(path, table, columns=None, version=None):
+    """
+    Read ``table`` from a snapshot version (by default, the current
+    one) without opening the DuckDB database.
+
+    Only ``columns`` (by default, all of them) are read from the
+    Parquet file.
+
+    Returns
+    -------
+    pd.DataFrame
+        The table.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the snapshot does not have the table.
+    """
+    file = snapshot_file(path, table, version)
+
+    if file is None:
+        raise FileNotFoundError(f"No snapshot of {table!r} in {str(path)!r}")
+
+    projection = ", ".join(columns) if columns else "*"
+    conn = duckdb.connect()
+
+    try:
+        return conn.execute(
+            f"SELECT {projection} FROM read_parquet({_quote(file)})"
+        ).fetchdf()
+    finally:
+        conn.close()
+
+
+def rollback_snapshot(path, version=None) -> str:
+    """
+    Point ``path/CURRENT`` to ``version`` (by default, the version
+    published before the current one) and return it.
+
+    Raises
+    ------
+    ValueError
+        If there is no such version.
+    """
+    versions = list_snapshots(path)
+
+    if version is None:
+        current = current_version(path)
+        older = [v for v in versions if current is None or v < current]
+
+        if not older:
+            raise ValueError(f"No snapshot older than {current!r}")
+
+        version = older[-1]
+    elif version not in versions:
+        raise ValueError(f"Unknown snapshot version {version!r}")
+
+    _write_atomically(Path(path) / _CURRENT, version)
+    return version
+
+
+def _quote(path):
+    """Quote ``path`` as a SQL string literal"""
+    return "'" + str(path).replace("'", "''") + "'"
@@ -0,0 +1,205 @@
+import sys
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+# precisions the TF-IDF matrix can be stored with, most precise first
+TFIDF_DTYPES = ("float64", "float32", "uint8")
+
+# rows multiplied at once by a quantized matrix, the weights of these
+# rows are converted to float32 for the product
+_CHUNK_ROWS = 65536
+
+
+def quantize_rows(matrix):
+    """
+    Quantize the non-negative weights of a CSR matrix to 8 bits.
+
+    Each row is scaled so its largest weight is 255 and the weights
+    are rounded to integers: a weight is ``data * scales[row]`` up to
+    half a quantization step. The sparsity structure is kept, weights
+    rounded to 0 stay stored, so the matrix stays aligned with the
+    term counts.
+
+    Returns
+    -------
+    quantized : scipy.sparse.csr_matrix
+        uint8 weights, sharing the indices and indptr of ``matrix``.
+
+    scales : numpy.ndarray
+        float32 scale of each row.
+    """
+    maxima = matrix.max(axis=1).toarray().ravel()
+    scales = (maxima / 255).astype(np.float32)
+    steps = np.where(scales > 0, scales, 1)[_row_ids(matrix)]
+    data = np.rint(matrix.data / steps).astype(np.uint8)
+    return _with_data(matrix, data), scales
+
+
+def dequantize_rows(matrix, scales):
+    """Return the float32 weights of a matrix quantized by rows"""
+    data = matrix.data * scales[_row_ids(matrix)]
+    return _with_data(matrix, data.astype(np.float32, copy=False))
+
+
+def convert_tfidf(matrix, scales, dtype):
+    """
+    Convert a TF-IDF matrix (with the row ``scales`` if it is
+    quantized, otherwise None) to ``dtype``, one of ``TFIDF_DTYPES``.
+
+    Only the weights are converted, the indices and indptr arrays are
+    shared with ``matrix``.
+
+    Returns
+    -------
+    matrix : scipy.sparse.csr_matrix
+        The converted matrix, ``matrix`` itself if it already has
+        ``dtype``.
+
+    scales : numpy.ndarray or None
+        The row scales for "uint8", otherwise None.
+    """
+    if dtype not in TFIDF_DTYPES:
+        raise ValueError(
+            f"Unknown TF-IDF dtype {dtype!r}, expected one of "
+            f"{list(TFIDF_DTYPES)}"
+        )
+
+    if matrix.dtype == dtype:
+        return matrix, scales
+
+    if scales is not None:
+        matrix = dequantize_rows(matrix, scales)
+
+    if dtype == "uint8":
+        return quantize_rows(matrix)
+
+    data = matrix.data.astype(dtype, copy=False)
+    return _with_data(matrix, data), None
+
+
+def tfidf_row(matrix, scales, position) -> np.ndarray:
+    """Return the TF-IDF weights of the movie at ``position``, dense"""
+    row = matrix[position].toarray().ravel()
+
+    if scales is None:
+        return row
+
+    return row.astype(np.float32) * scales[position]
+
+
+def dot_rows(matrix, scales, vector) -> np.ndarray:
+    """
+    Multiply the TF-IDF ``matrix`` (with the row ``scales`` if it is
+    quantized) by a dense ``vector``.
+
+    A quantized matrix is multiplied in chunks of rows, so only one
+    chunk of its weights is converted to float at a time.
+    """
+    if scales is None:
+        return matrix @ vector
+
+    product = np.empty(matrix.shape[0], dtype=np.float32)
+
+    for start, end, chunk in _row_chunks(matrix):
+        product[start:end] = chunk @ vector
+
+    return product * scales
+
+
+def dot_rows_batch(matrix, scales, rows) -> np.ndarray:
+    """
+    Same as ``dot_rows`` for the sparse ``rows``, returns a dense
+    array of shape (rows.shape[0], matrix.shape[0])
+    """
+    if scales is None:
+        return (matrix @ rows.T).T.toarray()
+
+    product = np.empty((rows.shape[0], matrix.shape[0]), dtype=np.float32)
+
+    for start, end, chunk in _row_chunks(matrix):
+        product[:, start:end] = (rows @ chunk.T).toarray()
+
+    product *= scales
+    return product
+
+
+def nbytes(value, seen=None) -> int:
+    """
+    Estimate the memory used by ``value`` in bytes: the buffers of
+    NumPy arrays and sparse matrices (memory-mapped or not), the
+    Python objects in object arrays and containers and the attributes
+    of other objects.
+
+    Objects in ``seen`` (a set of ids, updated) are not counted, so
+    objects shared by several values are only counted once.
+    """
+    seen = set() if seen is None else seen
+
+    if value is None or id(value) in seen:
+        return 0
+
+    seen.add(id(value))
+
+    if isinstance(value, np.ndarray):
+        size = value.nbytes
+
+        if value.dtype == object:
+            size += sum(nbytes(item, seen) for item in value.flat)
+
+        return size
+
+    if issparse(value):
+        return sum(
+            nbytes(getattr(value, name, None), seen)
+            for name in ("data", "indices", "indptr")
+        )
+
+    size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        size += sum(
+            nbytes(key, seen) + nbytes(item, seen)
+            for key, item in value.items()
+        )
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(nbytes(item, seen) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += nbytes(vars(value), seen)
+
+    return size
+
+
+def _row_ids(matrix):
+    return np.repeat(
+        np.arange(matrix.shape[0], dtype=np.int32), np.diff(matrix.indptr)
+    )
+
+
+def _row_chunks(matrix):
+    """
+    Yield the start and end rows and the rows of ``matrix`` in chunks
+    of ``_CHUNK_ROWS`` rows, as matrices viewing its arrays (slicing a
+    CSR matrix copies the rows)
+    """
+    indptr = matrix.indptr
+
+    for start in range(0, matrix.shape[0], _CHUNK_ROWS):
+        end = min(start + _CHUNK_ROWS, matrix.shape[0])
+        first, last = indptr[start], indptr[end]
+        chunk = csr_matrix(
+            (
+                matrix.data[first:last],
+                matrix.indices[first:last],
+                indptr[start : end + 1] - first,  # noqa E203
+            ),
+            shape=(end - start, matrix.shape[1]),
+            copy=False,
+        )
+        yield start, end, chunk
+
+
+def _with_data(matrix, data):
+    return csr_matrix(
+        (data, matrix.indices, matrix.indptr), shape=matrix.shape, copy=False
+    )
@@ -0,0 +1,369 @@
+import hashlib
+import itertools
+import math
+import re
+import unicodedata
+
+import numpy as np
+
+# dropped from titles ("spider-man" is "spiderman"), other punctuation
+# separates words
+_JOINERS = re.compile(r"['\u2019-]")
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+_NO_TITLES = np.empty(0, dtype=np.int32)
+# the arrays of a TitleResolver, see ``TitleResolver.arrays``
+_RESOLVER_ARRAYS = (
+    "rows",
+    "ranks",
+    "sizes",
+    "key_hashes",
+    "key_order",
+    "gram_hashes",
+    "gram_offsets",
+    "gram_keys",
+)
+
+
+class TitleIndex:
+    """
+    Hash index from a movie title to its row positions.
+
+    The index is built once alongside the movie data, so looking up
+    a title costs a binary search over the sorted 64-bit hashes of the
+    titles (see ``stable_hash``) instead of a scan over the whole
+    catalog. The hashes and the rows are two NumPy arrays (see
+    ``arrays``), so the index can be saved with the model artifact
+    and memory-mapped by every worker instead of being a dictionary
+    in each process.
+
+    Parameters
+    ----------
+    titles : sequence of str
+        The titles of the movies, in row order.
+
+    Examples
+    --------
+    >>> index = TitleIndex(["heat", "up", "heat"])
+    >>> index.first("heat")
+    0
+    >>> index.positions("heat")
+    (0, 2)
+    """
+
+    def __init__(self, titles):
+        self._titles = titles
+        self._hashes, self._rows = _hash_table(
+            [stable_hash(title) for title in titles]
+        )
+
+    @classmethod
+    def from_arrays(cls, titles, arrays):
+        """Return the index of ``titles`` with the arrays of ``arrays``"""
+        index = cls.__new__(cls)
+        index._titles = titles
+        index._hashes, index._rows = arrays["hashes"], arrays["rows"]
+        return index
+
+    def arrays(self) -> dict:
+        """Return the arrays of the index, see ``from_arrays``"""
+        return {"hashes": self._hashes, "rows": self._rows}
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self._hashes))) + bool(
+            len(self._hashes)
+        )
+
+    def __contains__(self, title):
+        return self.first(title) is not None
+
+    def first(self, title):
+        """
+        Return the first row with ``title``, or None if the title
+        is not in the index.
+        """
+        for row in _lookup(self._hashes, self._rows, title):
+            if self._titles[row] == title:
+                return int(row)
+
+        return None
+
+    def positions(self, title) -> tuple:
+        """
+        Return every row with ``title``, or an empty tuple if the
+        title is not in the index.
+        """
+        return tuple(
+            int(row)
+            for row in _lookup(self._hashes, self._rows, title)
+            if self._titles[row] == title
+        )
+
+    def gather(self, titles) -> np.ndarray:
+        """
+        Return the sorted rows of every movie whose title is in
+        ``titles``, the same rows selected by
+        ``df[df["title"].isin(titles)]``.
+        """
+        rows = set()
+
+        for title in titles:
+            rows.update(self.positions(title))
+
+        return np.array(sorted(rows), dtype=np.intp)
+
+
+def stable_hash(text) -> int:
+    """
+    Return a 64-bit hash of ``text`` that is the same in every
+    process, unlike ``hash``, so it can be saved
+    """
+    digest = hashlib.blake2b(text.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _hash_table(hashes):
+    """
+    Return the sorted ``hashes`` and the positions they had, sorted
+    by hash and then by position
+    """
+    hashes = np.array(hashes, dtype=np.uint64)
+    order = np.argsort(hashes, kind="stable").astype(np.int32)
+    return hashes[order], order
+
+
+def _lookup(hashes, values, text) -> np.ndarray:
+    """Return the ``values`` of the hash table entries with ``text``"""
+    key = np.uint64(stable_hash(text))
+    start = hashes.searchsorted(key, side="left")
+    end = hashes.searchsorted(key, side="right")
+    return values[start:end]
+
+
+def normalize_title(title) -> str:
+    """
+    Return the lookup key of ``title``: case-folded, without accents,
+    hyphens and apostrophes, and with every other run of punctuation
+    and whitespace replaced by a single space, so "Spider-Man: Far
+    From Home" and "spiderman far from home " have the same key.
+
+    Examples
+    --------
+    >>> normalize_title("Amélie (2001)")
+    'amelie 2001'
+    """
+    decomposed = unicodedata.normalize("NFKD", title.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    joined = _JOINERS.sub("", stripped)
+    return " ".join(_NON_ALPHANUMERIC.sub(" ", joined).split())
+
+
+def trigrams(key) -> set:
+    """Return the trigrams of a normalized title, padded like pg_trgm"""
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}  # noqa E203
+
+
+class TitleResolver:
+    """
+    Resolve titles that are misspelled or punctuated differently to
+    the titles in the catalog.
+
+    The resolver is built once per model: a hash table from the
+    normalized title (see ``normalize_title``) to a title of the
+    catalog, and an inverted index from each trigram to the normalized
+    titles that have it. Titles that only differ in case, accents or
+    punctuation are resolved with a hash lookup; otherwise the
+    candidates are the titles that share trigrams with the query,
+    scored by their Dice coefficient (twice the shared trigrams over
+    the trigrams of both). Only the posting lists of the rarest
+    trigrams of the query are scanned for candidates, so common
+    trigrams ("the") do not make the lookup linear in the size of the
+    catalog.
+
+    Both are stored as NumPy arrays (the posting lists one after the
+    other, in the order of the hashes of their trigrams), so the
+    resolver can be saved with the model artifact and memory-mapped by
+    every worker (see ``arrays``).
+
+    Parameters
+    ----------
+    titles : sequence of str
+        The (lowercased) titles of the movies, in row order.
+
+    title_index : TitleIndex, optional
+        The index of ``titles``, built if not given.
+
+    Examples
+    --------
+    >>> resolver = TitleResolver(["spider-man: far from home", "heat"])
+    >>> resolver.resolve("Spiderman: far from home")
+    'spider-man: far from home'
+    >>> resolver.resolve("spider man far from hom")
+    'spider-man: far from home'
+    >>> resolver.suggest("heet")
+    ['heat']
+    """
+
+    def __init__(self, titles, title_index=None):
+        self._titles = titles
+        self._title_index = (
+            TitleIndex(titles) if title_index is None else title_index
+        )
+        # the row of the first title of each normalized key
+        rows = {}
+
+        for row, title in enumerate(titles):
+            rows.setdefault(normalize_title(title), row)
+
+        keys = np.empty(len(rows), dtype=object)
+        keys[:] = list(rows)
+        self._rows = np.fromiter(rows.values(), np.int32, len(rows))
+        # the rank of each key in alphabetical order, to break ties
+        self._ranks = np.empty(len(keys), dtype=np.int32)
+        self._ranks[np.argsort(keys, kind="stable")] = np.arange(len(keys))
+        self._key_hashes, self._key_order = _hash_table(
+            [stable_hash(key) for key in keys]
+        )
+        self._sizes = np.empty(len(keys), dtype=np.int32)
+        postings = {}
+
+        for position, key in enumerate(keys):
+            grams = trigrams(key)
+            self._sizes[position] = len(grams)
+
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+
+        grams = list(postings)
+        self._gram_hashes, order = _hash_table(
+            [stable_hash(gram) for gram in grams]
+        )
+        lists = [postings[grams[position]] for position in order]
+        self._gram_offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(
+            [len(posting) for posting in lists], out=self._gram_offsets[1:]
+        )
+        self._gram_keys = np.fromiter(
+            itertools.chain.from_iterable(lists),
+            np.int32,
+            self._gram_offsets[-1],
+        )
+
+    @classmethod
+    def from_arrays(cls, titles, title_index, arrays):
+        """
+        Return the resolver of ``titles`` (with their ``title_index``)
+        with the arrays of ``arrays``
+        """
+        resolver = cls.__new__(cls)
+        resolver._titles = titles
+        resolver._title_index = title_index
+
+        for name in _RESOLVER_ARRAYS:
+            setattr(resolver, f"_{name}", arrays[name])
+
+        return resolver
+
+    def arrays(self) -> dict:
+        """Return the arrays of the resolver, see ``from_arrays``"""
+        return {name: getattr(self, f"_{name}") for name in _RESOLVER_ARRAYS}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def resolve(self, title, threshold=0.6):
+        """
+        Return the title of the catalog ``title`` refers to, or None
+        if there is none.
+
+        A title is resolved if it is in the catalog (lowercased) or its
+        normalized key is, otherwise to the most similar title if its
+        score is at least ``threshold`` and no other title scores the
+        same (0 disables the fuzzy match).
+        """
+        if title.lower() in self._title_index:
+            return title.lower()
+
+        key = normalize_title(title)
+        match = self._match(key)
+
+        if match is not None or not threshold:
+            return match
+
+        matches = self.matches(key, limit=2, min_score=threshold)
+
+        if len(matches) == 1 or (
+            len(matches) == 2 and matches[0][1] > matches[1][1]
+        ):
+            return matches[0][0]
+
+        return None
+
+    def suggest(self, title, limit=5, min_score=0.3) -> list:
+        """
+        Return up to ``limit`` titles of the catalog similar to
+        ``title``, the most similar first.
+        """
+        matches = self.matches(normalize_title(title), limit, min_score)
+        return [match for match, _ in matches]
+
+    def matches(self, key, limit=5, min_score=0.3) -> list:
+        """
+        Return up to ``limit`` ``(title, score)`` pairs for the titles
+        whose Dice coefficient with the normalized ``key`` is at least
+        ``min_score``, the highest score first (ties by title).
+        """
+        grams = trigrams(key)
+        postings = sorted(map(self._posting, grams), key=len)
+        # a title with a score of at least min_score shares at least
+        # ``required`` trigrams with the key, so it has one of its
+        # ``len(grams) - required + 1`` rarest trigrams: only those
+        # (short) posting lists are read to find the candidates and
+        # count their shared trigrams
+        bound = min_score * len(grams) / (2 - min_score)
+        required = max(1, math.ceil(bound - 1e-9))
+        rare = len(grams) - required + 1
+        positions, shared = np.unique(
+            np.concatenate(postings[:rare]), return_counts=True
+        )
+
+        if not len(positions):
+            return []
+
+        # the candidates can only have the other (common) trigrams too,
+        # count them with a binary search in each posting list
+        for posting in postings[rare:]:
+            found = np.searchsorted(posting, positions)
+            found[found == len(posting)] = 0
+            shared += posting[found] == positions
+
+        scores = 2 * shared / (len(grams) + self._sizes[positions])
+        keep = scores >= min_score
+        positions, scores = positions[keep], scores[keep]
+        order = np.lexsort((self._ranks[positions], -scores))[:limit]
+
+        return [
+            (self._titles[self._rows[position]], float(score))
+            for position, score in zip(positions[order], scores[order])
+        ]
+
+    def _match(self, key):
+        """Return the title with the normalized ``key``, if any"""
+        for position in _lookup(self._key_hashes, self._key_order, key):
+            title = self._titles[self._rows[position]]
+
+            if normalize_title(title) == key:
+                return title
+
+        return None
+
+    def _posting(self, gram) -> np.ndarray:
+        """Return the positions of the keys with the trigram ``gram``"""
+        key = np.uint64(stable_hash(gram))
+        found = self._gram_hashes.searchsorted(key)
+
+        if found == len(self._gram_hashes) or self._gram_hashes[found] != key:
+            return _NO_TITLES
+
+        start, end = self._gram_offsets[found : found + 2]  # noqa E203
+        return self._gram_keys[start:end]
@@ -0,0 +1,155 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+
+from .config import get_settings
+from .index import get_index
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+
+class PoolSaturated(Exception):
+    """
+    Raised when a job is submitted to a ``WorkerPool`` that already has
+    as many running and queued jobs as it accepts.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("The recommender is busy, try again later")
+        self.retry_after = retry_after
+
+
+class WorkerPool:
+    """
+    Run the recommender work outside of the event loop, on a dedicated
+    executor with a bounded queue.
+
+    At most ``max_workers`` jobs run at the same time and at most
+    ``max_queue`` wait for a worker, further jobs are rejected right
+    away with ``PoolSaturated``, so a burst of requests is turned
+    away quickly instead of piling up.
+
+    Parameters
+    ----------
+    kind : str
+        "thread" runs the jobs on a thread pool, sharing the index of
+        the API process. "process" runs them on a process pool, so
+        they do not compete with the event loop for the GIL, but every
+        worker process loads its own index and result cache.
+
+    max_workers : int
+        Number of workers, 0 uses the number of CPUs.
+
+    max_queue : int
+        Number of jobs that can wait for a worker.
+
+    retry_after : int
+        Seconds clients are told to wait when the pool is saturated.
+
+    initializer : callable, optional
+        Called with ``initargs`` when every worker starts.
+    """
+
+    def __init__(
+        self,
+        kind="thread",
+        max_workers=0,
+        max_queue=32,
+        retry_after=1,
+        initializer=None,
+        initargs=(),
+    ):
+        if kind not in EXECUTORS:
+            raise ValueError(
+                f"Unknown worker pool {kind!r}, "
+                f"expected one of {sorted(EXECUTORS)}"
+            )
+
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.pending = 0
+        self.rejected = 0
+        self._executor = EXECUTORS[kind](
+            self.max_workers, initializer=initializer, initargs=initargs
+        )
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of running and queued jobs"""
+        return self.max_workers + self.max_queue
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run ``fn(*args, **kwargs)`` on a worker and return its result.
+        Must be called from the event loop, raises ``PoolSaturated``
+        if the pool is full.
+        """
+        # only the event loop thread updates the counter, no lock needed
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise PoolSaturated(self.retry_after)
+
+        self.pending += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, partial(fn, *args, **kwargs)
+            )
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        """Return the size, load and rejected jobs of the pool"""
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait=True):
+        """
+        Stop the workers. With ``wait``, cancel the queued jobs and
+        wait for the running ones, otherwise let every submitted job
+        finish in the background.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=wait)
+
+
+@lru_cache(maxsize=None)
+def get_worker_pool() -> WorkerPool:
+    """Return the worker pool shared by every request"""
+    settings = get_settings()
+    initializer = get_index if settings.worker_type == "process" else None
+    return WorkerPool(
+        settings.worker_type,
+        settings.workers,
+        settings.worker_queue,
+        settings.retry_after,
+        initializer=initializer,
+        initargs=("english",) if initializer else (),
+    )
+
+
+def shutdown_worker_pool():
+    """Stop the shared worker pool, a new one is created when needed"""
+    if get_worker_pool.cache_info().currsize:
+        get_worker_pool().shutdown()
+        get_worker_pool.cache_clear()
+
+
+def restart_worker_pool():
+    """
+    Replace the shared worker pool with a new one. The jobs submitted
+    to the previous pool still finish, used to start new worker
+    processes once the model is reloaded.
+    """
+    if get_worker_pool.cache_info().currsize:
+        pool = get_worker_pool()
+        get_worker_pool.cache_clear()
+        pool.shutdown(wait=False)
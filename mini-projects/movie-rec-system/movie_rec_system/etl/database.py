@@ -0,0 +1,267 @@
+from contextlib import contextmanager
+
+import duckdb
+
+from movie_rec_system.app.data import RECOMMENDER_TABLE
+from movie_rec_system.app.snapshot import publish_snapshot
+
+# schema of the tables loaded by the ETL
+TABLES = {
+    "movies": """
+        genre_ids INT[],
+        id INTEGER,
+        original_language VARCHAR,
+        overview VARCHAR,
+        popularity DOUBLE,
+        release_date TIMESTAMP,
+        title VARCHAR,
+        vote_average DOUBLE,
+        vote_count INTEGER
+    """,
+    "genres": """
+        id INTEGER,
+        name VARCHAR
+    """,
+}
+
+_INSERT_MOVIES = """
+    INSERT INTO {table}
+    SELECT
+        CAST(genre_ids AS INT[]),
+        id,
+        original_language,
+        overview,
+        popularity,
+        TRY_CAST(NULLIF(release_date, '') AS TIMESTAMP),
+        title,
+        vote_average,
+        vote_count
+    FROM batch;
+"""
+
+# movies with their genre names, explored in the EDA notebook
+_MOVIE_GENRE_DATA = """
+    CREATE OR REPLACE TABLE movie_genre_data AS
+    WITH movie_genres AS (
+        SELECT
+            id,
+            UNNEST(genre_ids) AS genre_id,
+            generate_subscripts(genre_ids, 1) AS position
+        FROM movies
+    ),
+    genre_names AS (
+        SELECT
+            mg.id AS movie_id,
+            STRING_AGG(g.name, ', ' ORDER BY mg.position) AS genre_names
+        FROM movie_genres mg
+        JOIN genres g ON mg.genre_id = g.id
+        GROUP BY mg.id
+    )
+    SELECT gn.genre_names, m.id, m.original_language,
+           m.overview, m.popularity, m.release_date,
+           m.title, m.vote_average, m.vote_count
+    FROM genre_names gn
+    JOIN movies m
+    ON gn.movie_id = m.id
+    WHERE m.vote_count != 0
+"""
+
+# what the recommender reads: lowercased titles and the text it
+# vectorizes (the overview followed by the genre names, twice, as built
+# by create_combined), sorted by id
+_RECOMMENDER_MOVIES = f"""
+    CREATE OR REPLACE TABLE {RECOMMENDER_TABLE} AS
+    SELECT
+        id,
+        lower(title) AS title,
+        overview || ' ' || repeat(genre_names || ', ', 2) AS combined,
+        popularity,
+        vote_average,
+        vote_count
+    FROM movie_genre_data
+    ORDER BY id
+"""
+
+# tables exported to the Parquet snapshots, read by the API and the
+# notebooks without opening the database
+SNAPSHOT_TABLES = ("movie_genre_data", RECOMMENDER_TABLE)
+
+
+class MovieDatabase:
+    """
+    Load the movie data into DuckDB over a single connection and a
+    single transaction per ETL run.
+
+    The connection is opened when entering the context manager. With
+    ``replace``, every table loaded during the run is written to a
+    staging table, which replaces the table when the context manager
+    exits without errors. Otherwise, the rows are added to the existing
+    tables. In both cases everything is committed at once: other
+    connections see the previous tables until the whole load is done,
+    and nothing changes if the load fails.
+
+    Before committing, the tables derived from the movies and genres
+    are rebuilt: ``movie_genre_data`` (the movies with their genre
+    names) and ``recommender_movies``, which has everything the
+    recommender needs already built, so the API only reads it.
+
+    With ``snapshot_path``, once the load is committed the derived
+    tables are also published as a new version of the Parquet snapshot
+    in that directory (see ``publish_snapshot``), so readers never
+    have to open the database while the ETL writes to it.
+
+    Parameters
+    ----------
+    path : str
+        Path to the DuckDB database file
+    replace : bool
+        Replace the tables instead of adding rows to them
+    snapshot_path : str, optional
+        Directory with the versions of the Parquet snapshot
+    keep_snapshots : int
+        Number of snapshot versions kept (0 keeps every version)
+
+    Examples
+    --------
+    >>> with MovieDatabase("movies_data.duckdb") as db:
+    ...     db.insert_movies(batch)
+    ...     db.insert_genres(genres)
+    """
+
+    def __init__(
+        self, path, replace=True, snapshot_path=None, keep_snapshots=5
+    ):
+        self.path = path
+        self.replace = replace
+        self.snapshot_path = snapshot_path
+        self.keep_snapshots = keep_snapshots
+        self.snapshot = None
+        self.conn = None
+        self._staged = []
+        self._written = False
+
+    def __enter__(self):
+        self.conn = duckdb.connect(self.path, read_only=False)
+        self.conn.begin()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self._swap()
+
+                built = self._written and self.build_derived_tables()
+                self.conn.commit()
+
+                if built and self.snapshot_path:
+                    self.snapshot = publish_snapshot(
+                        self.conn,
+                        self.snapshot_path,
+                        SNAPSHOT_TABLES,
+                        self.keep_snapshots,
+                    )
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+            self.conn = None
+
+    def insert_movies(self, batch, upsert=False):
+        """
+        Insert a batch of movies
+
+        Parameters
+        ----------
+        batch : pd.DataFrame
+            Movies, with the columns of the movies table
+        upsert : bool
+            Replace the movies that are already in the table (by id)
+            instead of inserting them again
+        """
+        table = self._table("movies")
+        self.conn.register("batch", batch)
+
+        if upsert:
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE id IN (SELECT id FROM batch);"
+            )
+
+        self.conn.execute(_INSERT_MOVIES.format(table=table))
+        self.conn.unregister("batch")
+
+    def insert_genres(self, batch):
+        """
+        Insert a batch of genres, replacing the genres that are already
+        in the table (by id)
+
+        Parameters
+        ----------
+        batch : pd.DataFrame
+            Genres, with "id" and "name" columns
+        """
+        table = self._table("genres")
+        self.conn.register("batch", batch)
+        self.conn.execute(
+            f"DELETE FROM {table} WHERE id IN (SELECT id FROM batch);"
+        )
+        self.conn.execute(f"INSERT INTO {table} SELECT id, name FROM batch;")
+        self.conn.unregister("batch")
+
+    def build_derived_tables(self):
+        """
+        Rebuild ``movie_genre_data`` and ``recommender_movies`` from the
+        movies and genres tables, if both exist
+
+        Returns
+        -------
+        bool
+            Whether the tables were rebuilt
+        """
+        tables = {
+            row[0] for row in self.conn.execute("SHOW TABLES;").fetchall()
+        }
+
+        if {"movies", "genres"} <= tables:
+            self.conn.execute(_MOVIE_GENRE_DATA)
+            self.conn.execute(_RECOMMENDER_MOVIES)
+            return True
+
+        return False
+
+    def _table(self, name):
+        """Return the table rows of ``name`` are written to"""
+        self._written = True
+
+        if not self.replace:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} ({TABLES[name]});"
+            )
+            return name
+
+        staging = f"{name}_staging"
+
+        if name not in self._staged:
+            self.conn.execute(f"DROP TABLE IF EXISTS {staging};")
+            self.conn.execute(f"CREATE TABLE {staging} ({TABLES[name]});")
+            self._staged.append(name)
+
+        return staging
+
+    def _swap(self):
+        for name in self._staged:
+            self.conn.execute(f"DROP TABLE IF EXISTS {name};")
+            self.conn.execute(f"ALTER TABLE {name}_staging RENAME TO {name};")
+
+
+@contextmanager
+def movie_database(database, replace=True):
+    """
+    Use ``database`` if it is an open ``MovieDatabase``, otherwise open
+    one for the DuckDB file at path ``database`` for the duration of
+    the context
+    """
+    if isinstance(database, MovieDatabase):
+        yield database
+    else:
+        with MovieDatabase(database, replace) as db:
+            yield db
@@ -1,17 +1,64 @@
 # + tags=["parameters"]
 # declare a list tasks whose products you want to use as inputs
 upstream = None
+product = None
+# update the movies that changed since the last run instead of
+# downloading every movie again
+incremental = False
 
 # -
 
 # flake8: noqa
-import duckdb
-import requests
+import pandas as pd
+import itertools
+import json
 import os
 from dotenv import load_dotenv
+from movie_rec_system.etl.database import MovieDatabase, movie_database
+from movie_rec_system.etl.fetch import (
+    TMDB_URL,
+    APIError,
+    TokenBucket,
+    fetch_json,
+    fetch_pages,
+    fetch_with_retries,
+    make_session,
+)
+from movie_rec_system.etl.pipeline import Pipeline
+
+# columns of the movies table, in order
+MOVIE_COLUMNS = [
+    "genre_ids",
+    "id",
+    "original_language",
+    "overview",
+    "popularity",
+    "release_date",
+    "title",
+    "vote_average",
+    "vote_count",
+]
+
+
+def movies_frame(movies):
+    """
+    Collect the movies of API call results into a DataFrame with the
+    columns of the movies table
+
+    Parameters
+    ----------
+    movies : list
+        Movies, as returned by the API
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per movie
+    """
+    return pd.DataFrame.from_records(movies, columns=MOVIE_COLUMNS)
 
 
-def init_duck_db_movies(duckdb_file_path, res):
+def init_duck_db_movies(duckdb_file_path, res, incremental=False):
     """
     Create table for movies API call in DuckDB
     If the table exists, new data is inserted
@@ -22,44 +69,13 @@ def init_duck_db_movies(duckdb_file_path, res):
         Path to the DuckDB database file
     res : requests object
         API call results
+    incremental : bool
+        Replace the movies that are already in the table (by id)
+        instead of inserting them again
     """
     try:
-        conn = duckdb.connect(duckdb_file_path, read_only=False)
-
-        tables = conn.execute("SHOW TABLES;").fetchall()
-        if ("movies",) not in tables:
-            conn.execute(
-                """
-                CREATE TABLE movies (
-                    genre_ids INT[],
-                    id INTEGER,
-                    original_language VARCHAR,
-                    overview VARCHAR,
-                    popularity DOUBLE,
-                    release_date TIMESTAMP,
-                    title VARCHAR,
-                    vote_average DOUBLE,
-                    vote_count INTEGER
-                );
-            """
-            )
-
-        for movie in res["results"]:
-            genre_ids_str = ",".join(map(str, movie["genre_ids"]))
-            conn.execute(
-                f"""
-                INSERT INTO movies VALUES (ARRAY[{genre_ids_str}], {movie['id']},
-                '{movie['original_language']}',
-                '{movie['overview'].replace("'", "''")}',
-                {movie['popularity']},
-                '{movie['release_date']}',
-                '{movie['title'].replace("'", "''")}',
-                {movie['vote_average']},
-                {movie['vote_count']});
-            """
-            )
-
-        conn.close()
+        with MovieDatabase(duckdb_file_path, replace=False) as db:
+            db.insert_movies(movies_frame(res["results"]), incremental)
 
     except Exception as e:
         print(e)
@@ -79,92 +95,47 @@ def init_duck_db_genres(duckdb_file_path, genres_data):
 
     """
     try:
-        conn = duckdb.connect(duckdb_file_path, read_only=False)
-
-        tables = conn.execute("SHOW TABLES;").fetchall()
-        if ("genres",) not in tables:
-            conn.execute(
-                """
-                CREATE TABLE genres (
-                    id INTEGER,
-                    name VARCHAR
-                );
-            """
-            )
-
-        for genre in genres_data:
-            conn.execute(
-                f"""
-                INSERT INTO genres VALUES ({genre['id']},
-                '{genre['name']}');
-            """
-            )
-
-        conn.close()
+        with MovieDatabase(duckdb_file_path, replace=False) as db:
+            db.insert_genres(genres_frame(genres_data))
 
     except Exception as e:
         print(e)
 
 
-def drop_existing_movies_table(duckdb_file_path):
+def genres_frame(genres):
     """
-    Drops existing movies tables
-
-    Parameters
-    ----------
-    duckdb_file_path : str
-        Path to the DuckDB database file
+    Collect the genres of an API call result into a DataFrame with the
+    columns of the genres table
     """
-    try:
-        conn = duckdb.connect(duckdb_file_path, read_only=False)
-
-        movies_table_exists = conn.execute(
-            "SELECT 1 FROM information_schema.tables WHERE table_name = 'movies'"
-        ).fetchone()
-
-        if movies_table_exists:
-            conn.execute("DROP TABLE movies;")
-            print("Table 'movies' dropped.")
-        else:
-            print("Table 'movies' does not yet exist. Creating 'movies' now.")
-
-        conn.close()
-
-    except Exception as e:
-        print(e)
-
-
-def drop_existing_genres_table(duckdb_file_path):
+    return pd.DataFrame.from_records(genres, columns=["id", "name"])
+
+
+def get_movies(
+    lang,
+    freq,
+    database,
+    api_key,
+    incremental=False,
+    concurrency=4,
+    rate=20,
+    base_url=TMDB_URL,
+    queue_size=4,
+):
     """
-    Drops existing genres table
-
-    Parameters
-    ----------
-    duckdb_file_path : str
-        Path to the DuckDB database file
-    """
-    try:
-        conn = duckdb.connect(duckdb_file_path, read_only=False)
-
-        genres_table_exists = conn.execute(
-            "SELECT 1 FROM information_schema.tables WHERE table_name = 'genres'"
-        ).fetchone()
-
-        if genres_table_exists:
-            conn.execute("DROP TABLE genres;")
-            print("Table 'genres' dropped.")
-        else:
-            print("Table 'genres' does not yet exist. Creating 'genres' now.")
-
-        conn.close()
-
-    except Exception as e:
-        print(e)
+    Inserts API call results into DuckDB
 
+    The first page is fetched to learn the number of movies per page.
+    The pages are then loaded by a pipeline of three stages running at
+    the same time, connected by queues of ``queue_size`` pages:
+    fetching the pages (concurrently, over a shared keep-alive session),
+    parsing them into batches of movies, and writing the batches to
+    DuckDB in page order. The time spent by each stage is printed at
+    the end
 
-def get_movies(lang, freq, duckdb_file_path, api_key):
-    """
-    Inserts API call results into DuckDB
+    Every page is written in the same transaction: if a request fails
+    after the retries, the error is raised and the database is left
+    as it was (unless ``database`` is a ``MovieDatabase`` and the
+    caller handles the error)
 
     Parameters
     ----------
@@ -172,50 +143,78 @@ def get_movies(lang, freq, duckdb_file_path, api_key):
         Language of movies
     freq : int
         Amount of movies to extract
-    duckdb_file_path : str
-        Path to the DuckDB database file
+    database : str or MovieDatabase
+        Path to the DuckDB database file, or the database of the ETL
+        run
     api_key : str
         API key for The Movie Database
+    incremental : bool
+        Upsert the movies (by id) into the existing table instead of
+        replacing it, so movies from previous runs are kept and the
+        recommender only re-vectorizes the new or changed ones
+    concurrency : int
+        Number of pages fetched at the same time
+    rate : float
+        Maximum number of requests per second (0 for no limit)
+    base_url : str
+        URL of the API
+    queue_size : int
+        Number of pages each stage can get ahead of the next one
     """
-    url = "https://api.themoviedb.org/3/movie/popular?api_key={api_key}&with_original_language={lang}".format(  # noqa E501
-        api_key=api_key, lang=lang
-    )
+    url = f"{base_url}/movie/popular"
+    params = {"api_key": api_key, "with_original_language": lang}
+    limiter = TokenBucket(rate)
     movies = 0
-    page = 1
     progress = 0
 
-    drop_existing_movies_table(duckdb_file_path)
+    def fetch(page):
+        return fetch_with_retries(
+            session, url, dict(params, page=page), limiter=limiter
+        ).content
 
-    while movies < freq:
-        try:
-            res = requests.get(url + "&page=" + str(page))
-        except requests.exceptions.RequestException as e:
-            print("An error occurred during the request:", e)
-            break
-        if res.status_code != 200:
-            print("error")
-            return []
-
-        res = res.json()
+    def parse(content):
+        res = json.loads(content)
 
         if "errors" in res.keys():
-            print("api error !!!")
-            return movies
+            raise APIError(res["errors"])
+
+        return res
+
+    def write(res):
+        db.insert_movies(movies_frame(res["results"]), incremental)
+        return len(res["results"])
+
+    with make_session(concurrency) as session, movie_database(
+        database, replace=not incremental
+    ) as db:
+        first = parse(fetch(1))
+        page_size = max(1, len(first["results"]))
+        last_page = min(-(-freq // page_size), first.get("total_pages") or 1)
+        pages = fetch_pages(fetch, range(2, last_page + 1), concurrency)
+        pipeline = Pipeline(
+            (content for _, content in pages),
+            [("parse", parse), ("write", write)],
+            maxsize=queue_size,
+            source_name="fetch",
+        )
 
-        movies += len(res["results"])
+        for written in itertools.chain([write(first)], pipeline):
+            movies += written
 
-        init_duck_db_movies(duckdb_file_path, res)
+            if progress != round(movies / freq * 100):
+                progress = round(movies / freq * 100)
+                if progress % 5 == 0:
+                    print(progress, end="%, ")
 
-        if progress != round(movies / freq * 100):
-            progress = round(movies / freq * 100)
-            if progress % 5 == 0:
-                print(progress, end="%, ")
+    print()
+
+    for stats in pipeline.stats:
+        print(stats)
 
-        page = page + 1
     return movies
 
 
-def get_genres(lang, duckdb_file_path, api_key):
+def get_genres(lang, database, api_key, base_url=TMDB_URL):
     """
     Inserts API call results into DuckDB
 
@@ -223,37 +222,27 @@ def get_genres(lang, duckdb_file_path, api_key):
     ----------
     lang : str
         Language of movies
-    freq : int
-        Amount of movies to extract
-    duckdb_file_path : str
-        Path to the DuckDB database file
+    database : str or MovieDatabase
+        Path to the DuckDB database file, or the database of the ETL
+        run
     api_key : str
         API key for The Movie Database
+    base_url : str
+        URL of the API
     """
-    url = "https://api.themoviedb.org/3/genre/movie/list?api_key={api_key}&with_original_language={lang}".format(  # noqa E501
-        api_key=api_key, lang=lang
-    )
-
-    drop_existing_genres_table(duckdb_file_path)
-
-    try:
-        res = requests.get(url)
-    except requests.exceptions.RequestException as e:
-        print("An error occurred during the request:", e)
-        return []
+    url = f"{base_url}/genre/movie/list"
+    params = {"api_key": api_key, "with_original_language": lang}
 
-    if res.status_code != 200:
-        print("error")
-        return []
-
-    res = res.json()
+    with make_session(1) as session:
+        res = fetch_json(session, url, params)
 
     if "errors" in res.keys():
-        print("api error !!!")
-        return []
+        raise APIError(res["errors"])
 
     genres_data = res["genres"]
-    init_duck_db_genres(duckdb_file_path, genres_data)
+
+    with movie_database(database) as db:
+        db.insert_genres(genres_frame(genres_data))
 
     return len(genres_data)
 
@@ -267,12 +256,25 @@ if __name__ == "__main__":
     load_dotenv(".env")
     api_key = os.getenv("API_KEY")
 
-    for key in language_count:
-        # print(key,language_count[key])
-        print("Downloading", key, end=": ")
-        movies = get_movies(
-            key, language_count[key], "movies_data.duckdb", api_key
-        )  # noqa E501
-        print("Total movies found:", movies)
-        genres = get_genres(key, "movies_data.duckdb", api_key)
-        print("Total genres found:", genres)
+    # the products of the pipeline task (see pipeline.yaml), the same
+    # paths when the script is run directly
+    if product is None:
+        product = {"data": "movies_data.duckdb", "snapshots": "snapshots"}
+
+    # a single connection and transaction for the whole run, the tables
+    # are replaced (or updated) only once everything is downloaded, and
+    # then published as a new Parquet snapshot
+    with MovieDatabase(
+        product["data"],
+        replace=not incremental,
+        snapshot_path=product["snapshots"],
+    ) as db:
+        for key in language_count:
+            # print(key,language_count[key])
+            print("Downloading", key, end=": ")
+            movies = get_movies(
+                key, language_count[key], db, api_key, incremental
+            )
+            print("Total movies found:", movies)
+            genres = get_genres(key, db, api_key)
+            print("Total genres found:", genres)
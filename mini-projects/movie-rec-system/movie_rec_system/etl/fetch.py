@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TMDB_URL = "https://api.themoviedb.org/3"
+
+# responses worth retrying: rate limited or a server error
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class APIError(Exception):
+    """The API answered with an error message instead of results"""
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter, safe to share between threads.
+
+    The bucket holds up to ``capacity`` tokens and refills at ``rate``
+    tokens per second. Each request takes a token, waiting for one if
+    the bucket is empty, so bursts of up to ``capacity`` requests are
+    allowed but the average rate never exceeds ``rate``.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second, 0 disables the limit
+    capacity : int, optional
+        Maximum number of tokens, defaults to ``rate`` (one second of
+        requests)
+    """
+
+    def __init__(
+        self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep
+    ):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available"""
+        if not self.rate:
+            return
+
+        while True:
+            with self._lock:
+                now = self._clock()
+                elapsed = now - self._updated
+                self.tokens = min(
+                    self.capacity, self.tokens + elapsed * self.rate
+                )
+                self._updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            self._sleep(wait)
+
+
+def make_session(concurrency=4):
+    """
+    Create an HTTP session that keeps up to ``concurrency`` connections
+    alive, shared by every request of an ETL run
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_json(session, url, params=None, **kwargs):
+    """
+    GET ``url`` and return the decoded JSON response, see
+    ``fetch_with_retries``
+    """
+    return fetch_with_retries(session, url, params, **kwargs).json()
+
+
+def fetch_with_retries(
+    session,
+    url,
+    params=None,
+    limiter=None,
+    retries=5,
+    backoff=0.5,
+    timeout=30,
+    sleep=time.sleep,
+):
+    """
+    GET ``url`` and return the successful response.
+
+    Rate limited (429) responses, server errors (5xx), connection errors
+    and timeouts are retried up to ``retries`` times, waiting for the
+    ``Retry-After`` header if there is one, otherwise with exponential
+    backoff (``backoff``, ``2 * backoff``, ...). Every attempt takes a
+    token from ``limiter``.
+
+    Raises
+    ------
+    requests.exceptions.RequestException
+        If the request still fails after the retries
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ):
+            if attempt == retries:
+                raise
+
+            sleep(backoff * 2**attempt)
+            continue
+
+        if response.status_code in RETRY_STATUS and attempt < retries:
+            delay = _retry_after(response)
+            sleep(backoff * 2**attempt if delay is None else delay)
+            continue
+
+        response.raise_for_status()
+        return response
+
+
+def fetch_pages(fetch, pages, concurrency=4):
+    """
+    Fetch ``pages`` concurrently and yield ``(page, result)`` in the
+    order of ``pages``.
+
+    At most ``2 * concurrency`` pages are fetched ahead of the page
+    being consumed, so a slow consumer (the DuckDB writer) bounds the
+    memory used by the results waiting to be written.
+
+    Parameters
+    ----------
+    fetch : callable
+        Called with a page number, returns its result
+    pages : iterable of int
+        Page numbers to fetch
+    concurrency : int
+        Number of pages fetched at the same time
+    """
+    pages = iter(pages)
+    pending = deque()
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        try:
+            for page in pages:
+                pending.append((page, executor.submit(fetch, page)))
+
+                if len(pending) >= 2 * concurrency:
+                    page, future = pending.popleft()
+                    yield page, future.result()
+
+            while pending:
+                page, future = pending.popleft()
+                yield page, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
@@ -0,0 +1,93 @@
+# + tags=["parameters"]
+# declare a list tasks whose products you want to use as inputs
+upstream = ["extract"]
+product = None
+
+# -
+
+# flake8: noqa
+
+from movie_rec_system.app.artifact import save_artifact
+from movie_rec_system.app.config import get_settings
+from movie_rec_system.app.data import read_movie_data
+from movie_rec_system.app.index import RecommenderIndex, refresh_index
+
+
+def build_model_artifact(
+    artifact_path,
+    stop_words="english",
+    svd_components=0,
+    full_rebuild_every=10,
+    database_path=None,
+    snapshot_path=None,
+    tfidf_dtype="float64",
+):
+    """
+    Fit the recommender index on the movie data in DuckDB and save
+    it as a new version of the model artifact, which the API loads
+    at startup instead of fitting the TF-IDF vectorizer itself.
+
+    If there is a previous version of the artifact, its index is
+    updated incrementally with the movies that were added or changed
+    since, and the vectorizer is only fitted from scratch every
+    ``full_rebuild_every`` versions.
+
+    Parameters
+    ----------
+    artifact_path : str
+        Directory holding the versions of the model artifact
+    stop_words : str
+        The language of stop words used by the TF-IDF vectorizer
+    svd_components : int
+        Dimensions of the truncated SVD embeddings to include in the
+        artifact (0 to skip them)
+    full_rebuild_every : int
+        Number of incremental updates between two full fits (0 to
+        always fit from scratch)
+    database_path : str
+        DuckDB database with the movie data, defaults to the one in
+        the settings
+    snapshot_path : str
+        Directory with the Parquet snapshots of the movie data, read
+        instead of the database if there is a current snapshot
+    tfidf_dtype : str
+        Precision of the TF-IDF weights saved in the artifact
+        ("float64", "float32" or "uint8", see
+        ``RecommenderIndex.compact``), the API memory-maps them
+        without a conversion when its ``tfidf_dtype`` setting matches
+
+    Returns
+    -------
+    str
+        The version of the artifact
+    """
+    settings = get_settings()
+    data = read_movie_data(
+        database_path or settings.database_path, snapshot_path
+    )
+
+    try:
+        previous = RecommenderIndex.from_artifact(artifact_path)
+    except FileNotFoundError:
+        previous = None
+
+    index = refresh_index(previous, data, stop_words, full_rebuild_every)
+
+    if svd_components:
+        index.reduce_dimensions(svd_components)
+
+    index.compact(tfidf_dtype)
+    return save_artifact(index, artifact_path)
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+    version = build_model_artifact(
+        product["model"],
+        svd_components=settings.svd_components,
+        full_rebuild_every=settings.full_rebuild_every,
+        database_path=upstream["extract"]["data"],
+        snapshot_path=upstream["extract"]["snapshots"],
+        tfidf_dtype=settings.tfidf_dtype,
+    )
+    print("Model artifact version:", version)
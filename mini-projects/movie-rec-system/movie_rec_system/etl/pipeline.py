@@ -0,0 +1,201 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+# marks the end of the items of a stage
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """
+    Timing of a pipeline stage
+
+    Attributes
+    ----------
+    name : str
+        Name of the stage
+    items : int
+        Number of items the stage produced
+    busy : float
+        Seconds spent producing the items
+    blocked : float
+        Seconds spent waiting for the next stage to take an item
+        (backpressure)
+    """
+
+    name: str
+    items: int = 0
+    busy: float = 0.0
+    blocked: float = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.name}: {self.items} items, {self.busy:.2f}s busy, "
+            f"{self.blocked:.2f}s blocked"
+        )
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+class Pipeline:
+    """
+    Run a source and a chain of stages on separate threads, connected
+    by bounded queues, so the stages overlap (the network keeps
+    fetching while the database writes).
+
+    When a queue is full the stage feeding it waits, so a slow stage
+    slows down the ones before it instead of letting items pile up in
+    memory. Iterating the pipeline yields the items of the last stage
+    in the order of the source. An exception in any stage stops the
+    pipeline and is raised to the consumer.
+
+    Parameters
+    ----------
+    source : iterable
+        Items fed to the first stage
+    stages : list of (str, callable)
+        Name and function of each stage, called with each item of the
+        previous stage
+    maxsize : int
+        Capacity of the queue after the source and each stage
+    source_name : str
+        Name of the source in the stats
+    """
+
+    def __init__(self, source, stages, maxsize=4, source_name="source"):
+        self.stats = [StageStats(source_name)] + [
+            StageStats(name) for name, _ in stages
+        ]
+        self._queues = [queue.Queue(maxsize) for _ in self.stats]
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(
+                target=self._produce,
+                args=(
+                    self._read(source, self.stats[0]),
+                    self._queues[0],
+                    self.stats[0],
+                ),
+                daemon=True,
+            )
+        ]
+
+        for (_, fn), inbox, outbox, stats in zip(
+            stages, self._queues, self._queues[1:], self.stats[1:]
+        ):
+            self._threads.append(
+                threading.Thread(
+                    target=self._produce,
+                    args=(self._apply(fn, inbox, stats), outbox, stats),
+                    daemon=True,
+                )
+            )
+
+    def __iter__(self):
+        for thread in self._threads:
+            thread.start()
+
+        outbox = self._queues[-1]
+
+        try:
+            while True:
+                item = outbox.get()
+
+                if item is _DONE:
+                    return
+
+                if isinstance(item, _Failed):
+                    raise item.error
+
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop every stage and wait for their threads"""
+        self._stop.set()
+
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+
+    @staticmethod
+    def _read(source, stats):
+        items = iter(source)
+
+        try:
+            while True:
+                start = time.perf_counter()
+
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+
+                stats.busy += time.perf_counter() - start
+                stats.items += 1
+                yield item
+        finally:
+            # stop a generator source (e.g. pending requests) early
+            if hasattr(items, "close"):
+                items.close()
+
+    def _apply(self, fn, inbox, stats):
+        while True:
+            item = self._get(inbox)
+
+            if item is _DONE:
+                return
+
+            if isinstance(item, _Failed):
+                yield item
+                return
+
+            start = time.perf_counter()
+            item = fn(item)
+            stats.busy += time.perf_counter() - start
+            stats.items += 1
+            yield item
+
+    def _produce(self, items, outbox, stats):
+        try:
+            for item in items:
+                if not self._put(outbox, item, stats):
+                    return
+
+                if isinstance(item, _Failed):
+                    return
+
+            self._put(outbox, _DONE, stats)
+        except Exception as e:
+            self._put(outbox, _Failed(e), stats)
+        finally:
+            items.close()
+
+    def _get(self, inbox):
+        while not self._stop.is_set():
+            try:
+                return inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+        return _DONE
+
+    def _put(self, outbox, item, stats):
+        start = time.perf_counter()
+
+        while not self._stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+
+            stats.blocked += time.perf_counter() - start
+            return True
+
+        return False
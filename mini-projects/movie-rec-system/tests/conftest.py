@@ -0,0 +1,191 @@
+import mmap
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from movie_rec_system.app import app as app_module
+from movie_rec_system.app.config import Settings, get_settings
+from movie_rec_system.etl.database import MovieDatabase
+from movie_rec_system.etl.extract import movies_frame
+
+GENRES = pd.DataFrame(
+    {
+        "id": [12, 18, 28, 35, 80, 878],
+        "name": [
+            "Adventure",
+            "Drama",
+            "Action",
+            "Comedy",
+            "Crime",
+            "Science Fiction",
+        ],
+    }
+)
+
+# title, overview and genres of the movies in the test database
+MOVIES = [
+    (
+        "Inception",
+        "A thief who steals secrets from dreams is offered a last job: "
+        "planting an idea in the mind of an heir.",
+        [28, 878, 12],
+    ),
+    (
+        "Interstellar",
+        "Explorers travel through a wormhole in space to find a new home "
+        "for humanity as the Earth is dying.",
+        [12, 18, 878],
+    ),
+    (
+        "The Dark Knight",
+        "Batman fights the Joker, a criminal mastermind who wants to plunge "
+        "Gotham City into anarchy.",
+        [18, 28, 80],
+    ),
+    (
+        "The Dark Knight Rises",
+        "Eight years after the Joker, Batman returns to save Gotham City "
+        "from the terrorist Bane.",
+        [28, 80, 18],
+    ),
+    (
+        "Batman Begins",
+        "Bruce Wayne trains with a secret league and returns to Gotham "
+        "City to fight crime as Batman.",
+        [28, 80, 18],
+    ),
+    (
+        "The Matrix",
+        "A hacker learns that the world is a simulation run by machines "
+        "and joins the rebels fighting them.",
+        [28, 878],
+    ),
+    (
+        "Memento",
+        "A man who cannot form new memories hunts the killer of his wife "
+        "with notes and tattoos.",
+        [80, 18],
+    ),
+    (
+        "The Prestige",
+        "Two rival magicians in London obsess over the secret of the "
+        "perfect illusion.",
+        [18, 878],
+    ),
+    (
+        "Alien",
+        "The crew of a space freighter is hunted by a deadly alien "
+        "creature aboard their ship.",
+        [878],
+    ),
+    (
+        "Aliens",
+        "Ripley returns to the planet of the alien creature with a unit "
+        "of space marines.",
+        [28, 878, 12],
+    ),
+    (
+        "Heat",
+        "A detective hunts a crew of professional thieves in Los Angeles "
+        "after a robbery.",
+        [28, 80, 18],
+    ),
+    (
+        "Up",
+        "An old man ties thousands of balloons to his house to fly to "
+        "South America with a young explorer.",
+        [12, 35],
+    ),
+    (
+        "Amélie",
+        "A shy waitress in Paris decides to change the lives of the "
+        "people around her.",
+        [35],
+    ),
+    (
+        "The Grand Budapest Hotel",
+        "A hotel concierge and his lobby boy are caught up in the theft "
+        "of a priceless painting.",
+        [35, 80, 12],
+    ),
+]
+
+
+@pytest.fixture
+def admin_headers(monkeypatch):
+    """Configure an admin token and return the headers sending it"""
+    monkeypatch.setattr(
+        app_module, "get_settings", lambda: Settings(admin_token="secret")
+    )
+    return {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture(scope="session")
+def make_movies():
+    """Return a function building the movies table of the given ids"""
+
+    def make(*ids):
+        return movies_frame(
+            [
+                {
+                    "genre_ids": [28],
+                    "id": id,
+                    "original_language": "en",
+                    "overview": "an overview",
+                    "popularity": 1.0,
+                    "release_date": "2020-01-01",
+                    "title": f"Movie {id}",
+                    "vote_average": 7.0,
+                    "vote_count": 10,
+                }
+                for id in ids
+            ]
+        )
+
+    return make
+
+
+@pytest.fixture
+def memory_mapped():
+    """Return a function telling if an array is backed by a memory map"""
+
+    def is_memory_mapped(array):
+        while isinstance(array, np.ndarray) and array.base is not None:
+            array = array.base
+
+        return isinstance(array, mmap.mmap)
+
+    return is_memory_mapped
+
+
+@pytest.fixture(scope="session", autouse=True)
+def movie_database(tmp_path_factory, make_movies):
+    """
+    Build a small movie database with the ETL and point the settings
+    at it, with empty snapshot and artifact directories, so the tests
+    do not depend on the data of the pipeline
+    """
+    directory = tmp_path_factory.mktemp("data")
+    path = str(directory / "movies.duckdb")
+    movies = make_movies(*range(1, len(MOVIES) + 1))
+    movies["title"], movies["overview"], movies["genre_ids"] = zip(*MOVIES)
+    movies["popularity"] = np.linspace(10.0, 100.0, len(MOVIES))
+    movies["vote_count"] = np.arange(len(MOVIES)) * 100 + 50
+
+    with MovieDatabase(path) as db:
+        db.insert_movies(movies)
+        db.insert_genres(GENRES)
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("RECOMMENDER_DATABASE_PATH", path)
+        monkeypatch.setenv(
+            "RECOMMENDER_SNAPSHOT_PATH", str(directory / "snapshots")
+        )
+        monkeypatch.setenv(
+            "RECOMMENDER_ARTIFACT_PATH", str(directory / "model")
+        )
+        get_settings.cache_clear()
+        yield path
+
+    get_settings.cache_clear()
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from movie_rec_system.app.ann import (
+    ExactBackend,
+    IVFBackend,
+    LSHBackend,
+    evaluate_backend,
+    make_backend,
+)
+from movie_rec_system.app.config import Settings
+from movie_rec_system.app.data import prepare_movie_data
+from movie_rec_system.app.index import RecommenderIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    rng = np.random.default_rng(0)
+    words = np.array([f"word{i}" for i in range(300)])
+    topics = rng.integers(0, len(words), size=(10, 20))
+    overviews = [
+        " ".join(words[rng.choice(topics[topic], 12)])
+        for topic in rng.integers(0, len(topics), 400)
+    ]
+    df = pd.DataFrame(
+        {
+            "title": [f"movie {i}" for i in range(400)],
+            "overview": overviews,
+            "genre_names": ["Drama"] * 400,
+            "popularity": rng.random(400),
+            "vote_average": rng.random(400),
+            "vote_count": rng.integers(1, 1000, 400),
+        }
+    )
+    return RecommenderIndex.build(prepare_movie_data(df))
+
+
+@pytest.mark.parametrize(
+    "backend",
+    [
+        # every movie is a candidate, so the results must be exact
+        lambda index: IVFBackend(index, n_lists=5, n_probes=5),
+        lambda index: LSHBackend(index, n_tables=1, n_bits=0),
+    ],
+    ids=["ivf", "lsh"],
+)
+def test_exhaustive_search_matches_exact(index, backend):
+    backend = backend(index)
+    exact = ExactBackend(index)
+
+    np.testing.assert_array_equal(
+        backend.search_batch(np.arange(50), 10),
+        exact.search_batch(np.arange(50), 10),
+    )
+
+
+@pytest.mark.parametrize("name", ["lsh", "ivf"])
+def test_approximate_backend_report(index, name):
+    backend = make_backend(index, Settings(backend=name))
+
+    report = evaluate_backend(index, backend, n_queries=50)
+
+    assert report["backend"] == name
+    assert 0 < report["recall"] <= 1
+    assert set(report["latency_ms"]) == {"exact", name}
+
+
+def test_backend_with_the_same_params_is_kept(index):
+    settings = Settings(backend="lsh", lsh_bits=4)
+    backend = make_backend(index, settings)
+    index.use_backend(backend)
+
+    try:
+        assert make_backend(index, settings) is backend
+        assert make_backend(index, Settings(backend="lsh")) is not backend
+    finally:
+        index.use_backend(ExactBackend(index))
+
+
+def test_unknown_backend(index):
+    with pytest.raises(ValueError, match="Unknown recommender backend"):
+        make_backend(index, Settings(backend="faiss"))
+
+
+def test_settings_from_env():
+    settings = Settings.from_env(
+        {
+            "RECOMMENDER_BACKEND": "ivf",
+            "RECOMMENDER_IVF_PROBES": "4",
+            "MODEL_ARTIFACT_PATH": "/models",
+        }
+    )
+
+    assert settings.backend == "ivf"
+    assert settings.ivf_probes == 4
+    assert settings.artifact_path == "/models"
@@ -1,5 +1,10 @@
+import threading
+
 from fastapi.testclient import TestClient
+from movie_rec_system.app import app as app_module
 from movie_rec_system.app.app import app
+from movie_rec_system.app.config import Settings
+from movie_rec_system.app.recommender import match_title, resolve_title
 
 client = TestClient(app)
 
@@ -25,6 +30,67 @@ def test_recommendation_for_nonexistent_movie():
     test_data = {"movie": "NonExistentMovie", "num_rec": 5}
     response = client.post("/recommendations/", json=test_data)
     assert response.status_code == 404
+    detail = response.json()["detail"]
+    assert detail["message"] == "Movie not found"
+    assert isinstance(detail["did_you_mean"], list)
+
+
+def test_recommendation_without_recommendations(monkeypatch):
+    monkeypatch.setattr(app_module, "get_recommendation", lambda *args: None)
+
+    response = client.post(
+        "/recommendations/", json={"movie": "Inception", "num_rec": 5}
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == {
+        "message": "No recommendations available",
+        "did_you_mean": [],
+    }
+
+
+def test_recommendation_for_misspelled_movie():
+    response = client.post(
+        "/recommendations/", json={"movie": "the dark-knigt", "num_rec": 5}
+    )
+    assert response.status_code == 200
+    assert response.json() == (
+        client.post(
+            "/recommendations/",
+            json={"movie": "The Dark Knight", "num_rec": 5},
+        ).json()
+    )
+
+    response = client.post(
+        "/recommendations/", json={"movie": "dark knigt", "num_rec": 5}
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"]["did_you_mean"][0] == "the dark knight"
+
+
+def test_misspelled_titles_are_matched_off_the_event_loop(monkeypatch):
+    threads = {}
+
+    def record(name, fn):
+        def recorded(*args, **kwargs):
+            threads.setdefault(name, []).append(threading.get_ident())
+            return fn(*args, **kwargs)
+
+        return recorded
+
+    monkeypatch.setattr(
+        app_module, "resolve_title", record("loop", resolve_title)
+    )
+    monkeypatch.setattr(app_module, "match_title", record("pool", match_title))
+
+    client.post("/recommendations/", json={"movie": "Inception"})
+    assert "pool" not in threads
+
+    response = client.post(
+        "/recommendations/", json={"movie": "the dark-knigt", "num_rec": 5}
+    )
+    assert response.status_code == 200
+    assert len(threads["pool"]) == 1
+    assert threads["pool"][0] not in threads["loop"]
 
 
 def test_recommendation_result():
@@ -49,3 +115,87 @@ def test_recommendation_result():
     assert isinstance(metrics["popularity"], float)
     assert isinstance(metrics["vote_avg"], float)
     assert isinstance(metrics["vote_count"], float)
+
+
+def test_batch_recommendation_endpoint():
+    test_data = {"movies": ["Inception", "NonExistentMovie"], "num_rec": 5}
+    response = client.post("/recommendations/batch/", json=test_data)
+    assert response.status_code == 200
+
+    response_data = response.json()
+    assert response_data["not_found"] == ["Nonexistentmovie"]
+    assert list(response_data["did_you_mean"]) == ["Nonexistentmovie"]
+    assert len(response_data["results"]) == 1
+
+    result = response_data["results"][0]
+    single = client.post(
+        "/recommendations/", json={"movie": "Inception", "num_rec": 5}
+    )
+    assert result == single.json()
+
+
+def test_batch_recommendation_without_found_movies():
+    response = client.post(
+        "/recommendations/batch/", json={"movies": ["NonExistentMovie"]}
+    )
+    assert response.status_code == 200
+    assert response.json()["results"] == []
+    assert response.json()["not_found"] == ["Nonexistentmovie"]
+
+    response = client.post("/recommendations/batch/", json={"movies": []})
+    assert response.status_code == 200
+    assert response.json() == {
+        "results": [],
+        "not_found": [],
+        "did_you_mean": {},
+    }
+
+
+def test_recommendations_need_at_least_one_movie():
+    response = client.post(
+        "/recommendations/", json={"movie": "Inception", "num_rec": 0}
+    )
+    assert response.status_code == 422
+
+    response = client.post(
+        "/recommendations/batch/", json={"movies": ["Inception"], "num_rec": 0}
+    )
+    assert response.status_code == 422
+
+
+def test_repeated_recommendation_is_cached():
+    before = client.get("/cache/").json()
+
+    test_data = {"movie": "Inception", "num_rec": 3}
+    first = client.post("/recommendations/", json=test_data)
+    second = client.post("/recommendations/", json=test_data)
+
+    after = client.get("/cache/").json()
+    assert first.json() == second.json()
+    assert after["hits"] >= before["hits"] + 1
+
+
+def test_memory_endpoint(admin_headers):
+    response = client.get("/admin/memory/", headers=admin_headers)
+    assert response.status_code == 200
+
+    memory = response.json()
+    assert memory["tfidf_dtype"] == "float64"
+    assert memory["bytes"]["tfidf_matrix"] > 0
+    assert memory["bytes"]["total"] == sum(
+        size for name, size in memory["bytes"].items() if name != "total"
+    )
+
+
+def test_memory_endpoint_needs_the_admin_token(monkeypatch):
+    monkeypatch.setattr(
+        app_module, "get_settings", lambda: Settings(admin_token="")
+    )
+    response = client.get("/admin/memory/", headers={"X-Admin-Token": ""})
+    assert response.status_code == 403
+    assert response.json()["detail"] == "The admin endpoints are disabled"
+
+    monkeypatch.setattr(
+        app_module, "get_settings", lambda: Settings(admin_token="secret")
+    )
+    assert client.get("/admin/memory/").status_code == 403
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+from movie_rec_system.app.ann import make_backend
+from movie_rec_system.app.artifact import (
+    current_version,
+    read_manifest,
+    save_artifact,
+)
+from movie_rec_system.app.config import Settings
+from movie_rec_system.app.data import prepare_movie_data
+from movie_rec_system.app.index import RecommenderIndex
+
+
+@pytest.fixture
+def index():
+    df = pd.DataFrame(
+        {
+            "title": ["Alien", "Aliens", "Amélie", "Up"],
+            "overview": [
+                "a crew in space meets an alien",
+                "marines in space fight the alien queen",
+                "a shy waitress in paris helps others",
+                "an old man flies his house with balloons",
+            ],
+            "genre_names": [
+                "Horror, Science Fiction",
+                "Action, Science Fiction",
+                "Comedy, Romance",
+                "Animation, Adventure",
+            ],
+            "popularity": [50.0, 40.0, 35.0, 60.0],
+            "vote_average": [8.4, 7.9, 7.9, 7.9],
+            "vote_count": [9000, 8000, 10000, 18000],
+        }
+    )
+    return RecommenderIndex.build(prepare_movie_data(df))
+
+
+def test_artifact_roundtrip(tmp_path, index):
+    version = save_artifact(index, tmp_path)
+
+    loaded = RecommenderIndex.from_artifact(tmp_path)
+
+    assert version == index.version == loaded.version
+    assert current_version(tmp_path) == version
+    assert read_manifest(tmp_path)["n_movies"] == len(index)
+    assert list(loaded.titles) == list(index.titles)
+    assert loaded.position("amélie") == 2
+    np.testing.assert_array_equal(loaded.data.metrics, index.data.metrics)
+    np.testing.assert_allclose(loaded.similarities(0), index.similarities(0))
+    np.testing.assert_allclose(
+        loaded.vectorizer.transform(["alien queen"]).toarray(),
+        index.vectorizer.transform(["alien queen"]).toarray(),
+    )
+
+
+def test_artifact_is_memory_mapped(tmp_path, index, memory_mapped):
+    save_artifact(index, tmp_path)
+
+    loaded = RecommenderIndex.from_artifact(tmp_path)
+
+    assert memory_mapped(loaded.tfidf_matrix.data)
+    assert memory_mapped(loaded.tfidf_matrix.indices)
+    assert memory_mapped(loaded.data.metrics)
+    assert not loaded.data.metrics.flags.writeable
+    # the title lookups are not built again by each worker
+    assert "vectorizer" not in loaded.__dict__
+    assert all(map(memory_mapped, loaded.title_index.arrays().values()))
+    assert all(map(memory_mapped, loaded.resolver.arrays().values()))
+    assert loaded.resolver.resolve("amelie") == "amélie"
+    assert loaded.resolver.suggest("alein") == ["alien", "aliens"]
+
+
+def test_saving_same_model_twice_keeps_version(tmp_path, index):
+    assert save_artifact(index, tmp_path) == save_artifact(index, tmp_path)
+    assert [p.name for p in tmp_path.iterdir() if p.is_dir()] == [
+        index.version
+    ]
+
+
+def test_artifact_with_embeddings(tmp_path, index):
+    index.reduce_dimensions(n_components=2)
+
+    save_artifact(index, tmp_path)
+    loaded = RecommenderIndex.from_artifact(tmp_path)
+
+    assert loaded.version == index.version
+    assert read_manifest(tmp_path)["svd_components"] == 2
+    np.testing.assert_array_equal(loaded.embeddings, index.embeddings)
+    np.testing.assert_array_equal(
+        loaded.top_positions(0, 2), index.top_positions(0, 2)
+    )
+
+
+def test_artifact_with_quantized_weights(tmp_path, index):
+    index.compact("uint8")
+    save_artifact(index, tmp_path)
+
+    loaded = RecommenderIndex.from_artifact(tmp_path)
+
+    assert read_manifest(tmp_path)["tfidf_dtype"] == "uint8"
+    assert loaded.tfidf_dtype == "uint8"
+    assert loaded.version == index.version
+    np.testing.assert_array_equal(loaded.tfidf_scales, index.tfidf_scales)
+    np.testing.assert_array_equal(
+        loaded.similarities(0), index.similarities(0)
+    )
+
+
+@pytest.mark.parametrize("name", ["lsh", "ivf"])
+def test_artifact_with_search_backend(tmp_path, index, memory_mapped, name):
+    settings = Settings(backend=name, lsh_bits=2, ivf_lists=2, ivf_probes=1)
+    index.use_backend(make_backend(index, settings))
+
+    save_artifact(index, tmp_path)
+    loaded = RecommenderIndex.from_artifact(tmp_path)
+
+    assert loaded.version == index.version
+    assert read_manifest(tmp_path)["backend"]["name"] == name
+    assert all(map(memory_mapped, loaded.backend.arrays().values()))
+    # the backend of the artifact is used instead of a new one
+    assert make_backend(loaded, settings) is loaded.backend
+    np.testing.assert_array_equal(
+        loaded.top_positions_batch(np.arange(4), 2),
+        index.top_positions_batch(np.arange(4), 2),
+    )
@@ -0,0 +1,63 @@
+import numpy as np
+
+from benchmarks.catalog import make_movies
+from benchmarks.compare import compare
+from benchmarks.run import bench_catalog, summarize
+from movie_rec_system.etl.extract import MOVIE_COLUMNS
+
+
+def test_make_movies():
+    movies = make_movies(500, seed=1)
+
+    assert list(movies.columns) == MOVIE_COLUMNS
+    assert movies["id"].is_unique
+    assert movies["genre_ids"].map(len).between(1, 3).all()
+    assert (movies["vote_count"] >= 1).all()
+    assert make_movies(500, seed=1).equals(movies)
+
+
+def test_summarize():
+    summary = summarize(np.arange(1, 101) / 1000)
+
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == 50.5
+    assert summary["p99_ms"] == 99.01
+    assert summary["max_ms"] == 100
+
+
+def test_compare():
+    def report(p99, throughput):
+        return {
+            "commit": None,
+            "results": [
+                {
+                    "size": 1000,
+                    "get_recommendation": {"p99_ms": p99},
+                    "endpoint": {"throughput_rps": throughput},
+                }
+            ],
+        }
+
+    rows = compare(report(1.0, 100), report(1.5, 70), threshold=0.2)
+
+    assert [
+        (row["metric"], row["change"], row["regression"]) for row in rows
+    ] == [
+        ("get_recommendation.p99_ms", 0.5, True),
+        ("endpoint.throughput_rps", -0.3, True),
+    ]
+    assert not any(
+        row["regression"]
+        for row in compare(report(1.0, 100), report(0.5, 150))
+    )
+
+
+def test_bench_catalog():
+    result = bench_catalog(300, num_rec=5, requests=20, concurrency=4)
+
+    assert result["size"] == 300
+    assert result["get_recommendation"]["count"] == 20
+    assert result["endpoint"]["status"] == {"200": 20}
+    assert result["cold_start"]["index_s"] > 0
+    assert result["cold_start"]["index_mb"] > 0
+    assert result["index_memory"]["tfidf_matrix"] > 0
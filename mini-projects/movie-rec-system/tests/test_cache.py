@@ -0,0 +1,73 @@
+from movie_rec_system.app.cache import MISSING, ResultCache
+
+
+def test_lru_eviction():
+    cache = ResultCache(maxsize=2)
+    cache.set("a", "v1", 1)
+    cache.set("b", "v1", 2)
+
+    # "a" is now the most recently used
+    assert cache.get("a", "v1") == 1
+    cache.set("c", "v1", 3)
+
+    assert cache.get("b", "v1") is MISSING
+    assert cache.get("a", "v1") == 1
+    assert cache.get("c", "v1") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration():
+    now = [0.0]
+    cache = ResultCache(maxsize=10, ttl=60, clock=lambda: now[0])
+    cache.set("a", "v1", 1)
+
+    now[0] = 59
+    assert cache.get("a", "v1") == 1
+
+    now[0] = 61
+    assert cache.get("a", "v1") is MISSING
+    assert cache.stats()["size"] == 0
+
+
+def test_new_version_invalidates_results():
+    cache = ResultCache(maxsize=10)
+    cache.set("a", "v1", 1)
+
+    assert cache.get("a", "v2") is MISSING
+    cache.set("a", "v2", 2)
+    assert cache.get("a", "v2") == 2
+    assert cache.stats()["version"] == "v2"
+
+
+def test_result_of_a_replaced_model_is_not_cached():
+    cache = ResultCache(maxsize=10)
+    # a slow request looked up "a" on the old model...
+    assert cache.get("a", "v1") is MISSING
+    # ...while the model was reloaded and another request cached "b"
+    assert cache.get("b", "v2") is MISSING
+    cache.set("b", "v2", 2)
+
+    cache.set("a", "v1", 1)
+
+    assert cache.get("b", "v2") == 2
+    assert cache.get("a", "v2") is MISSING
+    assert cache.stats()["version"] == "v2"
+    assert cache.stats()["size"] == 1
+
+
+def test_hit_miss_counters():
+    cache = ResultCache(maxsize=10)
+    cache.get("a", "v1")
+    cache.set("a", "v1", None)
+    cache.get("a", "v1")
+    cache.get("a", "v1")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_disabled_cache():
+    cache = ResultCache(maxsize=0)
+    cache.set("a", "v1", 1)
+
+    assert cache.get("a", "v1") is MISSING
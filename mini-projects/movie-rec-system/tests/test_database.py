@@ -0,0 +1,97 @@
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from movie_rec_system.app.data import prepare_movie_data, read_movie_data
+from movie_rec_system.etl.database import MovieDatabase
+
+
+@pytest.fixture
+def database(tmp_path, make_movies):
+    path = str(tmp_path / "movies.duckdb")
+
+    with MovieDatabase(path) as db:
+        db.insert_movies(make_movies(1, 2))
+        db.insert_genres(pd.DataFrame({"id": [28], "name": ["Action"]}))
+
+    return path
+
+
+def movie_ids(conn):
+    return [row[0] for row in conn.execute("SELECT id FROM movies").fetchall()]
+
+
+def tables(conn):
+    return sorted(row[0] for row in conn.execute("SHOW TABLES").fetchall())
+
+
+def test_replace_swaps_the_tables_on_exit(database, make_movies):
+    with MovieDatabase(database) as db:
+        db.insert_movies(make_movies(3))
+        db.insert_movies(make_movies(4))
+
+        # other connections still see the previous table
+        reader = db.conn.cursor()
+        assert movie_ids(reader) == [1, 2]
+        reader.close()
+
+    conn = duckdb.connect(database)
+    assert movie_ids(conn) == [3, 4]
+    # genres were not loaded, they are kept
+    assert tables(conn) == [
+        "genres",
+        "movie_genre_data",
+        "movies",
+        "recommender_movies",
+    ]
+    conn.close()
+
+
+def test_failed_load_keeps_the_tables(database, make_movies):
+    with pytest.raises(RuntimeError):
+        with MovieDatabase(database) as db:
+            db.insert_movies(make_movies(3))
+            raise RuntimeError("the API is down")
+
+    conn = duckdb.connect(database)
+    assert movie_ids(conn) == [1, 2]
+    assert "movies_staging" not in tables(conn)
+    conn.close()
+
+
+def test_upsert_into_the_existing_tables(database, make_movies):
+    with MovieDatabase(database, replace=False) as db:
+        db.insert_movies(make_movies(2, 3), upsert=True)
+        db.insert_genres(pd.DataFrame({"id": [28], "name": ["Adventure"]}))
+
+    conn = duckdb.connect(database)
+    assert sorted(movie_ids(conn)) == [1, 2, 3]
+    assert conn.execute("SELECT * FROM genres").fetchall() == [
+        (28, "Adventure")
+    ]
+    conn.close()
+
+
+def test_recommender_table(database, make_movies):
+    with MovieDatabase(database) as db:
+        db.insert_movies(make_movies(3, 1, 2))
+        db.insert_genres(
+            pd.DataFrame({"id": [28, 12], "name": ["Action", "Adventure"]})
+        )
+
+    conn = duckdb.connect(database)
+    movie_genre_data = conn.execute(
+        "SELECT * FROM movie_genre_data ORDER BY id"
+    ).fetchdf()
+    conn.close()
+
+    data = read_movie_data(database)
+    expected = prepare_movie_data(movie_genre_data)
+
+    assert list(data.ids) == [1, 2, 3]
+    assert list(data.titles) == ["movie 1", "movie 2", "movie 3"]
+    assert list(data.combined) == list(expected.combined)
+    assert data.combined[0] == "an overview Action, Action, "
+    np.testing.assert_array_equal(data.metrics, expected.metrics)
+    np.testing.assert_array_equal(data.digests, expected.digests)
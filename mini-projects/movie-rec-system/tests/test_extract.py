@@ -0,0 +1,76 @@
+import duckdb
+import pytest
+
+from movie_rec_system.etl.extract import (
+    init_duck_db_genres,
+    init_duck_db_movies,
+)
+
+
+def make_movie(id, **values):
+    movie = {
+        "adult": False,
+        "genre_ids": [28, 12],
+        "id": id,
+        "original_language": "en",
+        "overview": "a crew's heist goes 'wrong'",
+        "popularity": 1.5,
+        "release_date": "2020-01-01",
+        "title": "Ocean's Eleven",
+        "vote_average": 7.0,
+        "vote_count": 10,
+    }
+    movie.update(values)
+    return movie
+
+
+@pytest.fixture
+def database(tmp_path):
+    return str(tmp_path / "movies.duckdb")
+
+
+def query(database, sql):
+    conn = duckdb.connect(database, read_only=True)
+    rows = conn.execute(sql).fetchall()
+    conn.close()
+    return rows
+
+
+def test_init_duck_db_movies(database):
+    init_duck_db_movies(
+        database,
+        {
+            "results": [
+                make_movie(1),
+                make_movie(2, genre_ids=[], release_date=""),
+            ]
+        },
+    )
+
+    rows = query(database, "SELECT * FROM movies ORDER BY id")
+
+    assert [row[1] for row in rows] == [1, 2]
+    assert rows[0][0] == [28, 12]
+    assert rows[0][3] == "a crew's heist goes 'wrong'"
+    assert rows[0][6] == "Ocean's Eleven"
+    assert rows[1][0] == []
+    assert rows[1][5] is None
+
+
+def test_init_duck_db_movies_incremental(database):
+    init_duck_db_movies(database, {"results": [make_movie(1), make_movie(2)]})
+    init_duck_db_movies(
+        database,
+        {"results": [make_movie(2, title="Up"), make_movie(3)]},
+        incremental=True,
+    )
+
+    rows = query(database, "SELECT id, title FROM movies ORDER BY id")
+
+    assert rows == [(1, "Ocean's Eleven"), (2, "Up"), (3, "Ocean's Eleven")]
+
+
+def test_init_duck_db_genres(database):
+    init_duck_db_genres(database, [{"id": 28, "name": "Children's"}])
+
+    assert query(database, "SELECT * FROM genres") == [(28, "Children's")]
@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import duckdb
+import pytest
+import requests
+
+from movie_rec_system.etl.database import MovieDatabase
+from movie_rec_system.etl.extract import get_genres, get_movies
+from movie_rec_system.etl.fetch import (
+    TokenBucket,
+    fetch_json,
+    fetch_pages,
+    make_session,
+)
+
+PAGE_SIZE = 2
+TOTAL_PAGES = 5
+
+
+class StubTMDB(BaseHTTPRequestHandler):
+    """
+    Serves /movie/popular with PAGE_SIZE movies per page, rate limiting
+    the first request for every page in ``server.limited``
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+
+        if url.path == "/genre/movie/list":
+            return self.send_json({"genres": [{"id": 28, "name": "Action"}]})
+
+        page = int(parse_qs(url.query)["page"][0])
+        self.server.requests.append(page)
+
+        if page in self.server.limited:
+            self.server.limited.discard(page)
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+
+        if url.path == "/broken":
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        results = [
+            {
+                "genre_ids": [28],
+                "id": page * 100 + i,
+                "original_language": "en",
+                "overview": f"movie {i} of page {page}",
+                "popularity": 1.0,
+                "release_date": "2020-01-01",
+                "title": f"Movie {page}-{i}",
+                "vote_average": 7.0,
+                "vote_count": 10,
+            }
+            for i in range(PAGE_SIZE)
+        ]
+        self.send_json(
+            {"page": page, "results": results, "total_pages": TOTAL_PAGES}
+        )
+
+    def send_json(self, content):
+        body = json.dumps(content).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTMDB)
+    server.requests = []
+    server.limited = set()
+    thread = threading.Thread(
+        target=server.serve_forever,
+        kwargs={"poll_interval": 0.01},
+        daemon=True,
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_token_bucket_limits_the_rate():
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+
+    for _ in range(4):
+        bucket.acquire()
+
+    # the first two use the burst capacity, then one every 0.5s
+    assert waits == [0.5, 0.5]
+
+
+def test_fetch_json_retries_rate_limited_requests(server):
+    server.limited = {3}
+
+    with make_session() as session:
+        result = fetch_json(
+            session, base_url(server) + "/movie/popular", {"page": 3}
+        )
+
+    assert result["page"] == 3
+    assert server.requests == [3, 3]
+
+
+def test_fetch_json_gives_up(server):
+    with make_session() as session, pytest.raises(requests.HTTPError):
+        fetch_json(
+            session,
+            base_url(server) + "/broken",
+            {"page": 1},
+            retries=2,
+            sleep=lambda seconds: None,
+        )
+
+    assert server.requests == [1, 1, 1]
+
+
+def test_fetch_pages_keeps_the_order():
+    def fetch(page):
+        time.sleep(0.01 * (5 - page))
+        return page * 10
+
+    results = list(fetch_pages(fetch, range(1, 6), concurrency=3))
+
+    assert results == [(1, 10), (2, 20), (3, 30), (4, 40), (5, 50)]
+
+
+def test_get_movies(server, tmp_path):
+    database = str(tmp_path / "movies.duckdb")
+    server.limited = {2}
+
+    movies = get_movies(
+        "en", 7, database, "key", concurrency=3, base_url=base_url(server)
+    )
+
+    conn = duckdb.connect(database, read_only=True)
+    ids = [row[0] for row in conn.execute("SELECT id FROM movies").fetchall()]
+    conn.close()
+
+    # 4 pages of 2 movies, written in page order
+    assert movies == 8
+    assert ids == [100, 101, 200, 201, 300, 301, 400, 401]
+    assert sorted(server.requests) == [1, 2, 2, 3, 4]
+
+
+def test_load_in_a_single_run(server, tmp_path):
+    database = str(tmp_path / "movies.duckdb")
+
+    with MovieDatabase(database) as db:
+        movies = get_movies("en", 4, db, "key", base_url=base_url(server))
+        genres = get_genres("en", db, "key", base_url=base_url(server))
+
+    conn = duckdb.connect(database, read_only=True)
+    assert conn.execute("SELECT count(*) FROM movies").fetchone() == (4,)
+    assert conn.execute("SELECT * FROM genres").fetchall() == [(28, "Action")]
+    conn.close()
+    assert (movies, genres) == (4, 1)
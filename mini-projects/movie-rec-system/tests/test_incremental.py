@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from movie_rec_system.app.artifact import read_manifest, save_artifact
+from movie_rec_system.app.data import prepare_movie_data
+from movie_rec_system.app.index import RecommenderIndex, refresh_index
+
+
+@pytest.fixture
+def movies():
+    return pd.DataFrame(
+        {
+            "id": [11, 12, 13, 14],
+            "title": ["alien", "aliens", "toy story", "heat"],
+            "overview": [
+                "a crew in space meets an alien",
+                "marines in space fight the alien queen",
+                "toys come to life when nobody is looking",
+                "a detective hunts a crew of thieves",
+            ],
+            "genre_names": [
+                "Horror, Science Fiction",
+                "Action, Science Fiction",
+                "Animation, Comedy",
+                "Crime, Thriller",
+            ],
+            "popularity": [50.0, 40.0, 80.0, 30.0],
+            "vote_average": [8.4, 7.9, 8.0, 8.3],
+            "vote_count": [9000, 8000, 17000, 6000],
+        }
+    )
+
+
+@pytest.fixture
+def updated(movies):
+    new = pd.DataFrame(
+        {
+            "id": [15, 16],
+            "title": ["up", "toy story 2"],
+            "overview": [
+                "an old man flies his house with balloons",
+                "the toys rescue a cowboy from a collector",
+            ],
+            "genre_names": ["Animation, Adventure", "Animation, Comedy"],
+            "popularity": [60.0, 70.0],
+            "vote_average": [7.9, 7.6],
+            "vote_count": [18000, 12000],
+        }
+    )
+    df = pd.concat([movies, new], ignore_index=True)
+    df.loc[df["id"] == 14, "overview"] = "a detective hunts a thief in space"
+    df.loc[df["id"] == 11, "popularity"] = 55.0
+    # a different row order than the indexed snapshot
+    return df.iloc[::-1].reset_index(drop=True)
+
+
+def test_update_matches_full_fit(movies, updated):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+    update = index.update(prepare_movie_data(updated))
+    full = RecommenderIndex.build(update.data)
+
+    assert list(update.data.ids) == [11, 12, 13, 14, 16, 15]
+    assert update.data.popularity[0] == 55.0
+    assert update.updates == 1
+
+    for position in range(len(full)):
+        np.testing.assert_allclose(
+            update.similarities(position), full.similarities(position)
+        )
+        assert update.recommend(update.titles[position], 3) == full.recommend(
+            full.titles[position], 3
+        )
+
+    # the index is not modified
+    assert len(index) == 4
+
+
+def test_update_without_changes_keeps_the_model(movies):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+    update = index.update(prepare_movie_data(movies))
+
+    assert update.version == index.version
+    assert update.tfidf_matrix is index.tfidf_matrix
+
+
+@pytest.mark.parametrize(
+    "rows",
+    [
+        [0, 1, 2],
+        [0, 1, 2, 3, 3],
+    ],
+    ids=["removed-movie", "duplicated-id"],
+)
+def test_update_not_possible(movies, rows):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+    assert index.update(prepare_movie_data(movies.iloc[rows])) is None
+
+
+def test_refresh_index_rebuilds_periodically(movies, updated):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+    data = prepare_movie_data(updated)
+
+    update = refresh_index(index, data, full_rebuild_every=1)
+    assert update.updates == 1
+
+    rebuilt = refresh_index(update, data, full_rebuild_every=1)
+    assert rebuilt.updates == 0
+    assert list(rebuilt.data.ids) == list(updated["id"])
+
+
+def test_update_index_loaded_from_artifact(tmp_path, movies, updated):
+    save_artifact(RecommenderIndex.build(prepare_movie_data(movies)), tmp_path)
+    loaded = RecommenderIndex.from_artifact(tmp_path)
+
+    assert read_manifest(tmp_path)["incremental"]
+
+    data = prepare_movie_data(updated)
+    update = loaded.update(data)
+    save_artifact(update, tmp_path)
+
+    assert read_manifest(tmp_path)["updates"] == 1
+    assert update.recommend("toy story", 1) == ["toy story 2"]
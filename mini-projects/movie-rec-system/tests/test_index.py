@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity
+from movie_rec_system.app.data import prepare_movie_data
+from movie_rec_system.app.index import RecommenderIndex, fit_memory_budget
+from movie_rec_system.app.recommenderhelper import (
+    compute_tfidf_vectorization,
+    create_combined,
+)
+
+
+@pytest.fixture
+def movies():
+    df = pd.DataFrame(
+        {
+            "title": ["alien", "aliens", "toy story", "up", "heat"],
+            "overview": [
+                "a crew in space meets an alien",
+                "marines in space fight the alien queen",
+                "toys come to life when nobody is looking",
+                "an old man flies his house with balloons",
+                "a detective hunts a crew of thieves",
+            ],
+            "genre_names": [
+                "Horror, Science Fiction",
+                "Action, Science Fiction",
+                "Animation, Comedy",
+                "Animation, Adventure",
+                "Crime, Thriller",
+            ],
+            "popularity": [50.0, 40.0, 80.0, 60.0, 30.0],
+            "vote_average": [8.4, 7.9, 8.0, 7.9, 8.3],
+            "vote_count": [9000, 8000, 17000, 18000, 6000],
+        }
+    )
+    return df
+
+
+def test_similarities_match_full_cosine_matrix(movies):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+    expected = cosine_similarity(
+        compute_tfidf_vectorization(create_combined(movies))
+    )
+
+    for position in range(len(index)):
+        np.testing.assert_allclose(
+            index.similarities(position), expected[position]
+        )
+
+
+def test_recommend_excludes_input_movie(movies):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+
+    recommendations = index.recommend("alien", 2)
+
+    assert recommendations[0] == "aliens"
+    assert "alien" not in recommendations
+    assert len(recommendations) == 2
+
+
+def test_recommend_unknown_movie(movies):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+
+    assert index.recommend("not a movie", 2) == []
+
+
+def test_prepare_movie_data_does_not_modify_input(movies):
+    original = movies.copy()
+
+    data = prepare_movie_data(movies)
+
+    pd.testing.assert_frame_equal(movies, original)
+    assert list(data.titles) == list(movies["title"].str.lower())
+    assert not data.metrics.flags.writeable
+    assert data.metrics.flags.c_contiguous
+
+
+def test_top_positions_batch_matches_single_queries(movies):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+
+    top = index.top_positions_batch([0, 3, 0], 10)
+
+    assert top.shape == (3, len(index) - 1)
+    for position, rows in zip([0, 3, 0], top):
+        np.testing.assert_array_equal(rows, index.top_positions(position, 10))
+
+
+def test_reduce_dimensions(movies):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+
+    index.reduce_dimensions(n_components=4)
+
+    assert index.embeddings.dtype == np.float32
+    assert index.embeddings.shape == (len(index), 4)
+    assert index.embeddings.flags.c_contiguous
+    assert index.similarities(0)[0] == pytest.approx(1)
+    assert index.recommend("alien", 1) == ["aliens"]
+    np.testing.assert_allclose(
+        index.similarities_batch([0])[0], index.similarities(0), rtol=1e-6
+    )
+
+
+@pytest.mark.parametrize("dtype", ["float32", "uint8"])
+def test_compact(movies, dtype):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+    expected = index.similarities(0)
+    version = index.version
+
+    index.compact(dtype)
+
+    assert index.tfidf_dtype == dtype
+    assert index.version != version
+    np.testing.assert_allclose(index.similarities(0), expected, atol=0.02)
+    np.testing.assert_allclose(
+        index.similarities_batch([0])[0], index.similarities(0), rtol=1e-6
+    )
+    assert index.recommend("alien", 1) == ["aliens"]
+
+
+def test_memory_usage(movies):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+    usage = index.memory_usage()
+    matrix = index.tfidf_matrix
+
+    assert usage["tfidf_matrix"] == (
+        matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    )
+    assert usage["total"] == sum(
+        size for name, size in usage.items() if name != "total"
+    )
+    assert index.compact("float32").memory_usage()["tfidf_matrix"] == (
+        usage["tfidf_matrix"] - matrix.data.nbytes // 2
+    )
+
+
+def test_fit_memory_budget(movies):
+    index = RecommenderIndex.build(prepare_movie_data(movies))
+    usage = index.memory_usage()
+    # too small for float32 weights (4 bytes less per weight), enough
+    # for uint8 weights (7 bytes less, and a float32 scale per row)
+    budget = (usage["total"] - 6 * index.tfidf_matrix.nnz) / 2**20
+
+    assert fit_memory_budget(index, 0).tfidf_dtype == "float64"
+    assert fit_memory_budget(index, budget).tfidf_dtype == "uint8"
+
+    with pytest.raises(MemoryError):
+        fit_memory_budget(index, budget / 2)
@@ -0,0 +1,112 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from movie_rec_system.app import app as app_module
+from movie_rec_system.app.config import Settings
+from movie_rec_system.app.metrics import (
+    StageMetrics,
+    collect_timings,
+    server_timing,
+    timed,
+)
+
+client = TestClient(app_module.app)
+
+
+@pytest.fixture
+def metrics_enabled(monkeypatch):
+    monkeypatch.setattr(
+        app_module, "get_settings", lambda: Settings(metrics=True)
+    )
+
+
+def test_timed_does_nothing_outside_of_a_timed_call():
+    assert timed("a") is timed("b")
+
+    with timed("a"):
+        pass
+
+
+def test_collect_timings():
+    def work(x):
+        with timed("first"):
+            pass
+
+        with timed("second"):
+            with timed("third"):
+                pass
+
+        with timed("first"):
+            return x * 2
+
+    result, timings = collect_timings(work, 21)
+
+    assert result == 42
+    assert list(timings) == ["first", "second", "third"]
+    assert timings["second"] >= timings["third"] >= 0
+
+
+def test_server_timing():
+    assert server_timing({"cache": 0.0001, "similarity": 0.0125}) == (
+        "cache;dur=0.100, similarity;dur=12.500"
+    )
+
+
+def test_stage_metrics_render():
+    metrics = StageMetrics(buckets=(0.1, 1))
+    metrics.observe("recommendation", {"similarity": 0.05, "total": 2})
+    metrics.observe("recommendation", {"similarity": 0.1, "total": 0.5})
+
+    lines = metrics.render().splitlines()
+    labels = 'operation="recommendation",stage="similarity"'
+
+    assert lines[1] == "# TYPE recommender_stage_seconds histogram"
+    assert f'recommender_stage_seconds_bucket{{{labels},le="0.1"}} 2' in lines
+    assert f'recommender_stage_seconds_bucket{{{labels},le="1"}} 2' in lines
+    assert f'recommender_stage_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert f"recommender_stage_seconds_count{{{labels}}} 2" in lines
+    assert (
+        'recommender_stage_seconds_bucket{operation="recommendation",'
+        'stage="total",le="1"} 1'
+    ) in lines
+
+
+def test_metrics_are_disabled_by_default():
+    response = client.post(
+        "/recommendations/", json={"movie": "Inception", "num_rec": 5}
+    )
+
+    assert "Server-Timing" not in response.headers
+    assert client.get("/metrics").status_code == 404
+
+
+def test_server_timing_header(metrics_enabled):
+    response = client.post(
+        "/recommendations/", json={"movie": "The Dark Knight", "num_rec": 3}
+    )
+    assert response.status_code == 200
+
+    stages = [
+        entry.split(";")[0]
+        for entry in response.headers["Server-Timing"].split(", ")
+    ]
+    assert stages[:3] == ["resolve", "queue", "cache"]
+    assert stages[-2:] == ["serialize", "total"]
+
+    response = client.post(
+        "/recommendations/batch/",
+        json={"movies": ["Inception"], "num_rec": 3},
+    )
+    assert "similarity;dur=" in response.headers["Server-Timing"]
+
+
+def test_metrics_endpoint(metrics_enabled):
+    client.post("/recommendations/", json={"movie": "Inception", "num_rec": 4})
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'recommender_stage_seconds_count{operation="recommendation",'
+        'stage="total"}'
+    ) in response.text
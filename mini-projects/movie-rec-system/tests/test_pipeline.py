@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from movie_rec_system.etl.pipeline import Pipeline
+
+
+def test_pipeline_runs_the_stages_in_order():
+    pipeline = Pipeline(
+        range(10),
+        [("double", lambda x: 2 * x), ("str", str)],
+        maxsize=2,
+        source_name="numbers",
+    )
+
+    assert list(pipeline) == [str(2 * x) for x in range(10)]
+    assert [stats.name for stats in pipeline.stats] == [
+        "numbers",
+        "double",
+        "str",
+    ]
+    assert [stats.items for stats in pipeline.stats] == [10, 10, 10]
+
+
+def test_pipeline_overlaps_the_stages():
+    def slow(x):
+        time.sleep(0.05)
+        return x
+
+    start = time.perf_counter()
+    assert list(Pipeline(range(4), [("a", slow), ("b", slow)])) == [0, 1, 2, 3]
+    # sequentially it would take 8 * 0.05s
+    assert time.perf_counter() - start < 0.35
+
+
+def test_pipeline_applies_backpressure():
+    produced = []
+    release = threading.Event()
+
+    def source():
+        for x in range(100):
+            produced.append(x)
+            yield x
+
+    def blocked(x):
+        release.wait()
+        return x
+
+    pipeline = Pipeline(source(), [("blocked", blocked)], maxsize=2)
+    items = iter(pipeline)
+    thread = threading.Thread(target=lambda: next(items))
+    thread.start()
+    time.sleep(0.2)
+
+    # the source queue is full and one item is being processed
+    assert len(produced) <= 4
+
+    release.set()
+    thread.join()
+    assert list(items) == list(range(1, 100))
+    assert pipeline.stats[0].blocked > 0
+
+
+def test_pipeline_raises_stage_errors():
+    def fail(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    results = []
+
+    with pytest.raises(ValueError, match="bad item"):
+        for x in Pipeline(range(10), [("fail", fail)]):
+            results.append(x)
+
+    assert results == [0, 1, 2]
+
+
+def test_pipeline_stops_when_the_consumer_stops():
+    closed = threading.Event()
+
+    def source():
+        try:
+            for x in range(1000):
+                yield x
+        finally:
+            closed.set()
+
+    for x in Pipeline(source(), [("identity", lambda x: x)], maxsize=1):
+        if x == 2:
+            break
+
+    assert closed.wait(1)
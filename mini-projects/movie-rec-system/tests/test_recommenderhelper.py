@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+from movie_rec_system.app.recommenderhelper import (
+    compute_metrics,
+    compute_metrics_batch,
+    content_movie_recommender,
+    top_similar_positions,
+)
+from movie_rec_system.app.titles import TitleIndex
+
+
+@pytest.mark.parametrize("top_n", [0, 1, 3, 10, 50, 200])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_top_similar_positions_matches_full_sort(top_n, seed):
+    rng = np.random.default_rng(seed)
+    # few distinct values, so there are plenty of ties
+    movie_sim = rng.integers(0, 5, size=100) / 4
+
+    ranking = np.argsort(movie_sim, kind="stable")[::-1]
+    expected = ranking[1 : top_n + 1]  # noqa E203
+
+    np.testing.assert_array_equal(
+        top_similar_positions(movie_sim, top_n), expected
+    )
+
+
+def test_content_movie_recommender():
+    titles = np.array(["a", "b", "c", "d"])
+    similarity_df = pd.DataFrame(
+        [
+            [1.0, 0.2, 0.9, 0.5],
+            [0.2, 1.0, 0.1, 0.3],
+            [0.9, 0.1, 1.0, 0.4],
+            [0.5, 0.3, 0.4, 1.0],
+        ],
+        index=titles,
+        columns=titles,
+    )
+
+    assert content_movie_recommender("a", similarity_df, titles, 2) == [
+        "c",
+        "d",
+    ]
+    assert content_movie_recommender("e", similarity_df, titles, 2) == []
+
+
+def test_metrics_with_duplicated_titles():
+    df = pd.DataFrame(
+        {
+            "title": ["heat", "up", "heat", "alien"],
+            "popularity": [10.0, 20.0, 30.0, 40.0],
+            "vote_average": [7.0, 8.0, 6.0, 9.0],
+            "vote_count": [100, 200, 300, 400],
+        }
+    )
+    title_index = TitleIndex(df["title"].values)
+
+    assert title_index.positions("heat") == (0, 2)
+    np.testing.assert_array_equal(
+        title_index.gather(["heat", "alien", "missing"]),
+        np.flatnonzero(df["title"].isin(["heat", "alien", "missing"])),
+    )
+
+    # the source movie is the first "heat", every "heat" is recommended
+    assert compute_metrics(df, "heat", ["heat", "alien"], title_index) == (
+        round(float(np.sqrt(np.mean([0.0, 20.0**2, 30.0**2]))), 3),
+        round(float(np.sqrt(np.mean([0.0, 1.0, 2.0**2]))), 3),
+        round(float(np.sqrt(np.mean([0.0, 200.0**2, 300.0**2]))), 3),
+    )
+
+
+def test_compute_metrics_batch():
+    rng = np.random.default_rng(0)
+    metrics = rng.random((50, 3))
+    sources = np.array([0, 7, 42])
+    recommendations = rng.integers(0, 50, size=(3, 5))
+
+    rmse = compute_metrics_batch(metrics, sources, recommendations)
+
+    for query, (source, rows) in enumerate(zip(sources, recommendations)):
+        for metric in range(3):
+            values = metrics[:, metric]
+            expected = np.sqrt(np.mean((values[source] - values[rows]) ** 2))
+            assert rmse[query, metric] == pytest.approx(expected)
+
+
+def test_metrics_match_titles_in_any_case():
+    df = pd.DataFrame(
+        {
+            "title": ["Heat", "Up", "Alien"],
+            "popularity": [10.0, 20.0, 40.0],
+            "vote_average": [7.0, 8.0, 9.0],
+            "vote_count": [100, 200, 400],
+        }
+    )
+
+    # the same title is found by every metric
+    assert compute_metrics(df, "HEAT", ["up", "alien"]) == (
+        round(float(np.sqrt(np.mean([10.0**2, 30.0**2]))), 3),
+        round(float(np.sqrt(np.mean([1.0, 2.0**2]))), 3),
+        round(float(np.sqrt(np.mean([100.0**2, 300.0**2]))), 3),
+    )
+    assert np.isnan(compute_metrics(df, "missing", ["up"])[2])
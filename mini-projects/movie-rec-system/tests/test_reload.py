@@ -0,0 +1,120 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from movie_rec_system.app import app as app_module
+from movie_rec_system.app import reload as reload_module
+from movie_rec_system.app.artifact import FORMAT_VERSION
+from movie_rec_system.app.config import Settings
+from movie_rec_system.app.index import get_index
+from movie_rec_system.app.reload import Reloader, source_version
+
+client = TestClient(app_module.app)
+
+
+def test_source_version(tmp_path):
+    settings = Settings(
+        database_path=str(tmp_path / "movies.duckdb"),
+        artifact_path=str(tmp_path / "model"),
+        snapshot_path=str(tmp_path / "snapshots"),
+    )
+    assert source_version(settings) is None
+
+    (tmp_path / "movies.duckdb").write_bytes(b"movies")
+    first = source_version(settings)
+    assert first.startswith("database:")
+
+    (tmp_path / "movies.duckdb").write_bytes(b"more movies")
+    assert source_version(settings) != first
+
+    snapshot = tmp_path / "snapshots" / "v1"
+    snapshot.mkdir(parents=True)
+    (snapshot / "recommender_movies.parquet").write_bytes(b"")
+    (tmp_path / "snapshots" / "CURRENT").write_text("v1")
+    assert source_version(settings) == "snapshot:v1"
+
+    (tmp_path / "model" / "abc").mkdir(parents=True)
+    (tmp_path / "model" / "CURRENT").write_text("abc")
+    manifest = {"format_version": FORMAT_VERSION, "version": "abc"}
+    (tmp_path / "model" / "abc" / "manifest.json").write_text(
+        json.dumps(manifest)
+    )
+    assert source_version(settings) == "artifact:abc"
+
+    # an artifact fitted on older data does not hide the new data
+    manifest["data_version"] = "snapshot:v0"
+    (tmp_path / "model" / "abc" / "manifest.json").write_text(
+        json.dumps(manifest)
+    )
+    assert source_version(settings) == "snapshot:v1"
+
+
+def test_reload_only_when_the_data_changes(monkeypatch):
+    version = ["v1"]
+    rebuilt = []
+    monkeypatch.setattr(reload_module, "source_version", lambda: version[0])
+    monkeypatch.setattr(
+        reload_module,
+        "rebuild_index",
+        lambda stop_words: rebuilt.append(stop_words) or get_index(stop_words),
+    )
+
+    reloader = Reloader().start()
+
+    assert not reloader.check()
+    version[0] = "v2"
+    assert reloader.check()
+    assert not reloader.reload()
+    assert reloader.reload(force=True)
+    assert rebuilt == ["english", "english"]
+    assert reloader.status()["reloads"] == 2
+    assert reloader.status()["source_version"] == "v2"
+
+
+def test_admin_endpoints(admin_headers):
+    version = get_index().version
+
+    response = client.get("/admin/version/", headers=admin_headers)
+    assert response.json()["version"] == version
+
+    response = client.post(
+        "/admin/reload/", params={"force": True}, headers=admin_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["reloaded"]
+    # same data, same model
+    assert response.json()["version"] == version
+
+
+def test_admin_endpoints_check_the_token(admin_headers):
+    assert client.get("/admin/version/").status_code == 403
+
+    response = client.get(
+        "/admin/version/", headers={"X-Admin-Token": "wrong"}
+    )
+    assert response.status_code == 403
+
+    response = client.get("/admin/version/", headers=admin_headers)
+    assert response.status_code == 200
+
+
+def test_admin_endpoints_are_disabled_without_a_token(monkeypatch):
+    reloads = []
+    monkeypatch.setattr(
+        app_module, "get_settings", lambda: Settings(admin_token="")
+    )
+    monkeypatch.setattr(
+        reload_module, "rebuild_index", lambda stop_words: reloads.append(1)
+    )
+
+    for headers in ({}, {"X-Admin-Token": ""}):
+        response = client.get("/admin/version/", headers=headers)
+        assert response.status_code == 403
+
+        response = client.post(
+            "/admin/reload/", params={"force": True}, headers=headers
+        )
+        assert response.status_code == 403
+        assert response.json()["detail"] == "The admin endpoints are disabled"
+
+    assert reloads == []
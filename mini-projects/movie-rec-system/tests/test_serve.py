@@ -0,0 +1,123 @@
+from dataclasses import replace
+
+from movie_rec_system.app import index as index_module
+from movie_rec_system.app import serve
+from movie_rec_system.app.artifact import (
+    current_version,
+    read_manifest,
+    save_artifact,
+)
+from movie_rec_system.app.config import get_settings
+from movie_rec_system.app.index import load_index, refresh_index
+
+
+def use_settings(monkeypatch, **settings):
+    settings = replace(get_settings(), **settings)
+    monkeypatch.setattr(index_module, "get_settings", lambda: settings)
+    monkeypatch.setattr(serve, "get_settings", lambda: settings)
+
+
+def use_data_version(monkeypatch, version):
+    monkeypatch.setattr(index_module, "data_version", lambda _: version)
+    monkeypatch.setattr(serve, "data_version", lambda _: version)
+
+
+def count_fits(monkeypatch):
+    fits = []
+    monkeypatch.setattr(
+        index_module,
+        "refresh_index",
+        lambda *args: fits.append(1) or refresh_index(*args),
+    )
+    return fits
+
+
+def test_prepare_artifact(tmp_path, monkeypatch, memory_mapped):
+    model = tmp_path / "model"
+    use_settings(monkeypatch, artifact_path=str(model), tfidf_dtype="float32")
+
+    version = serve.prepare_artifact()
+
+    assert current_version(model) == version
+    assert read_manifest(model)["tfidf_dtype"] == "float32"
+    # the workers map the artifact without converting it
+    worker = load_index()
+    assert worker.version == version
+    assert memory_mapped(worker.tfidf_matrix.data)
+    assert memory_mapped(worker.tfidf_matrix.indices)
+
+    assert serve.prepare_artifact() == version
+    assert len(list(model.iterdir())) == 2  # the version and CURRENT
+
+
+def test_artifact_keeps_its_lower_precision(
+    tmp_path, monkeypatch, memory_mapped
+):
+    model = tmp_path / "model"
+    use_settings(monkeypatch, artifact_path=str(model), tfidf_dtype="uint8")
+    version = serve.prepare_artifact()
+
+    use_settings(monkeypatch, artifact_path=str(model))
+    worker = load_index()
+
+    assert worker.tfidf_dtype == "uint8"
+    assert worker.version == version
+    assert memory_mapped(worker.tfidf_matrix.data)
+
+
+def test_stale_artifact_is_fitted_again(tmp_path, monkeypatch):
+    model = tmp_path / "model"
+    use_settings(monkeypatch, artifact_path=str(model))
+    use_data_version(monkeypatch, "database:1")
+    version = serve.prepare_artifact()
+    assert read_manifest(model)["data_version"] == "database:1"
+
+    fits = count_fits(monkeypatch)
+    assert serve.prepare_artifact() == version
+    assert fits == []
+
+    # the data was refreshed, the workers no longer load the artifact
+    use_data_version(monkeypatch, "database:2")
+    assert index_module.current_manifest() is None
+    assert serve.prepare_artifact() == version  # same movies, same model
+    assert fits == [1]
+    assert read_manifest(model)["data_version"] == "database:2"
+    assert index_module.current_manifest()["version"] == version
+
+
+def test_model_task_artifact_is_kept(tmp_path, monkeypatch):
+    model = tmp_path / "model"
+    use_settings(monkeypatch, artifact_path=str(model))
+    use_data_version(monkeypatch, "database:1")
+    version = save_artifact(load_index(), model)
+
+    use_data_version(monkeypatch, "database:2")
+    fits = count_fits(monkeypatch)
+
+    assert serve.prepare_artifact() == version
+    assert fits == []
+    assert read_manifest(model)["data_version"] is None
+
+
+def test_prepare_in_subprocess(tmp_path, monkeypatch):
+    # the loader process reads the settings from the environment
+    monkeypatch.setenv("RECOMMENDER_ARTIFACT_PATH", str(tmp_path / "model"))
+
+    version = serve.prepare_in_subprocess()
+
+    assert current_version(tmp_path / "model") == version
+
+
+def test_workers_map_the_search_backend(tmp_path, monkeypatch, memory_mapped):
+    model = tmp_path / "model"
+    use_settings(monkeypatch, artifact_path=str(model), backend="lsh")
+    fits = count_fits(monkeypatch)
+
+    version = serve.prepare_artifact()
+    worker = load_index()
+
+    assert fits == [1]
+    assert worker.version == version
+    assert worker.backend.name == "lsh"
+    assert all(map(memory_mapped, worker.backend.arrays().values()))
+    assert all(map(memory_mapped, worker.resolver.arrays().values()))
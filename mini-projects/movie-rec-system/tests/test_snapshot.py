@@ -0,0 +1,98 @@
+import duckdb
+import pandas as pd
+import pytest
+
+from movie_rec_system.app.artifact import current_version
+from movie_rec_system.app.data import read_movie_data
+from movie_rec_system.app.snapshot import (
+    list_snapshots,
+    publish_snapshot,
+    read_snapshot,
+    rollback_snapshot,
+)
+from movie_rec_system.etl.database import MovieDatabase
+
+
+def load(database, snapshots, movies):
+    with MovieDatabase(database, snapshot_path=snapshots) as db:
+        db.insert_movies(movies)
+        db.insert_genres(pd.DataFrame({"id": [28], "name": ["Action"]}))
+
+    return db.snapshot
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "movies.duckdb"), tmp_path / "snapshots"
+
+
+def test_the_etl_publishes_a_snapshot(paths, make_movies):
+    database, snapshots = paths
+    version = load(database, snapshots, make_movies(1, 2))
+
+    assert current_version(snapshots) == version
+    assert list_snapshots(snapshots) == [version]
+
+    df = read_snapshot(snapshots, "movie_genre_data", ["id", "genre_names"])
+    assert list(df.columns) == ["id", "genre_names"]
+    assert sorted(df["id"]) == [1, 2]
+
+    # the database is not needed to read the movie data
+    data = read_movie_data(str(snapshots / "missing.duckdb"), snapshots)
+    assert list(data.ids) == [1, 2]
+    assert list(data.titles) == ["movie 1", "movie 2"]
+    assert data.combined[0] == "an overview Action, Action, "
+
+
+def test_snapshots_can_be_read_while_the_etl_writes(paths, make_movies):
+    database, snapshots = paths
+    load(database, snapshots, make_movies(1, 2))
+
+    with MovieDatabase(database, snapshot_path=snapshots) as db:
+        db.insert_movies(make_movies(3))
+        data = read_movie_data(database, snapshots)
+        assert list(data.ids) == [1, 2]
+
+    assert list(read_movie_data(database, snapshots).ids) == [3]
+
+
+def test_failed_load_does_not_publish(paths, make_movies):
+    database, snapshots = paths
+    version = load(database, snapshots, make_movies(1, 2))
+
+    with pytest.raises(RuntimeError):
+        with MovieDatabase(database, snapshot_path=snapshots) as db:
+            db.insert_movies(make_movies(3))
+            raise RuntimeError("the API is down")
+
+    assert list_snapshots(snapshots) == [version]
+
+
+def test_rollback(paths, make_movies):
+    database, snapshots = paths
+    first = load(database, snapshots, make_movies(1, 2))
+    second = load(database, snapshots, make_movies(3))
+
+    assert rollback_snapshot(snapshots) == first
+    assert list(read_movie_data(database, snapshots).ids) == [1, 2]
+
+    with pytest.raises(ValueError, match="older"):
+        rollback_snapshot(snapshots)
+
+    assert rollback_snapshot(snapshots, second) == second
+
+    with pytest.raises(ValueError, match="Unknown"):
+        rollback_snapshot(snapshots, "missing")
+
+
+def test_old_snapshots_are_deleted(tmp_path):
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE movies AS SELECT 1 AS id")
+    versions = [
+        publish_snapshot(conn, tmp_path, ["movies"], keep=2) for _ in range(3)
+    ]
+    conn.close()
+
+    assert list_snapshots(tmp_path) == versions[1:]
+    assert current_version(tmp_path) == versions[-1]
+    assert not list(tmp_path.glob(".*-*"))
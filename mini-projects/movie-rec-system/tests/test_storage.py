@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from movie_rec_system.app import storage
+from movie_rec_system.app.storage import (
+    convert_tfidf,
+    dequantize_rows,
+    dot_rows,
+    dot_rows_batch,
+    nbytes,
+    quantize_rows,
+)
+
+
+@pytest.fixture
+def matrix():
+    rng = np.random.default_rng(0)
+    dense = rng.random((7, 5)) * (rng.random((7, 5)) < 0.5)
+    dense[3] = 0
+    return csr_matrix(dense)
+
+
+def test_quantize_rows(matrix):
+    quantized, scales = quantize_rows(matrix)
+
+    assert quantized.dtype == np.uint8
+    assert np.shares_memory(quantized.indices, matrix.indices)
+    assert scales[3] == 0
+    np.testing.assert_allclose(
+        dequantize_rows(quantized, scales).toarray(),
+        matrix.toarray(),
+        atol=scales.max() / 2 + 1e-7,
+    )
+
+
+def test_convert_tfidf(matrix):
+    converted, scales = convert_tfidf(matrix, None, "float32")
+
+    assert converted.dtype == np.float32
+    assert scales is None
+    assert np.shares_memory(converted.indptr, matrix.indptr)
+    assert convert_tfidf(converted, None, "float32")[0] is converted
+
+    restored, scales = convert_tfidf(*quantize_rows(matrix), "float64")
+    assert restored.dtype == np.float64
+    assert scales is None
+
+    with pytest.raises(ValueError, match="Unknown TF-IDF dtype"):
+        convert_tfidf(matrix, None, "float16")
+
+
+def test_quantized_products(monkeypatch, matrix):
+    # several chunks of rows
+    monkeypatch.setattr(storage, "_CHUNK_ROWS", 3)
+    quantized, scales = quantize_rows(matrix)
+    weights = dequantize_rows(quantized, scales)
+    vector = np.arange(5, dtype=np.float32)
+
+    np.testing.assert_allclose(
+        dot_rows(quantized, scales, vector), weights @ vector, rtol=1e-6
+    )
+    np.testing.assert_allclose(
+        dot_rows_batch(quantized, scales, weights[[0, 2]]),
+        (weights[[0, 2]] @ weights.T).toarray(),
+        rtol=1e-6,
+    )
+
+
+def test_nbytes_counts_shared_objects_once():
+    array = np.zeros(100)
+    seen = set()
+
+    assert nbytes(array, seen) == array.nbytes
+    assert nbytes({"a": array}, seen) < array.nbytes
+    assert nbytes([array, array]) < 2 * array.nbytes
@@ -0,0 +1,83 @@
+import pytest
+
+from movie_rec_system.app.titles import TitleResolver, normalize_title
+
+TITLES = [
+    "spider-man: across the spider-verse",
+    "the dark knight",
+    "the dark knight rises",
+    "amélie",
+    "heat",
+    "heat!",
+    "heal",
+    "up",
+]
+
+
+@pytest.fixture
+def resolver():
+    return TitleResolver(TITLES)
+
+
+@pytest.mark.parametrize(
+    "title, key",
+    [
+        (
+            "Spider-Man: Across the Spider-Verse",
+            "spiderman across the spiderverse",
+        ),
+        ("  Ocean’s   Eleven ", "oceans eleven"),
+        ("Amélie (2001)", "amelie 2001"),
+        ("WALL·E", "wall e"),
+    ],
+)
+def test_normalize_title(title, key):
+    assert normalize_title(title) == key
+
+
+@pytest.mark.parametrize(
+    "title, expected",
+    [
+        ("The Dark Knight", "the dark knight"),
+        ("Spiderman - Across The Spiderverse", TITLES[0]),
+        ("AMELIE", "amélie"),
+        # exact titles win over titles with the same key
+        ("Heat!", "heat!"),
+        ("heat", "heat"),
+        # misspelled
+        ("the dark knigth rises", "the dark knight rises"),
+        ("spider man accross the spiderverse", TITLES[0]),
+        # as similar to two titles, or not similar enough
+        ("hea", None),
+        ("the", None),
+        ("interstellar", None),
+    ],
+)
+def test_resolve(resolver, title, expected):
+    assert resolver.resolve(title) == expected
+
+
+def test_resolve_without_fuzzy_matches(resolver):
+    assert resolver.resolve("the dark knigth rises", threshold=0) is None
+    assert resolver.resolve("The Dark Knight!", threshold=0) == (
+        "the dark knight"
+    )
+
+
+def test_suggest(resolver):
+    assert resolver.suggest("the dark") == [
+        "the dark knight",
+        "the dark knight rises",
+    ]
+    assert resolver.suggest("dark knight", limit=1) == ["the dark knight"]
+    assert resolver.suggest("xyz") == []
+    assert resolver.suggest("") == []
+
+
+def test_matches_are_sorted_by_score(resolver):
+    matches = resolver.matches("the dark knight ris", limit=10, min_score=0)
+    scores = [score for _, score in matches]
+
+    assert matches[0][0] == "the dark knight rises"
+    assert scores == sorted(scores, reverse=True)
+    assert all(0 < score <= 1 for score in scores)
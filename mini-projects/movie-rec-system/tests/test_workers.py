@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+
+from movie_rec_system.app import app as app_module
+from movie_rec_system.app.workers import PoolSaturated, WorkerPool
+from fastapi.testclient import TestClient
+
+
+def test_pool_runs_jobs():
+    pool = WorkerPool("thread", max_workers=2, max_queue=0)
+
+    async def run():
+        return await asyncio.gather(*(pool.run(pow, 2, n) for n in range(2)))
+
+    assert asyncio.run(run()) == [1, 2]
+    assert pool.pending == 0
+    pool.shutdown()
+
+
+def test_process_pool_runs_jobs():
+    pool = WorkerPool("process", max_workers=1, max_queue=0)
+    assert asyncio.run(pool.run(pow, 2, 10)) == 1024
+    pool.shutdown()
+
+
+def test_saturated_pool_rejects_jobs():
+    pool = WorkerPool("thread", max_workers=1, max_queue=1, retry_after=5)
+    release = threading.Event()
+
+    async def run():
+        running = [
+            asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+
+        with pytest.raises(PoolSaturated) as excinfo:
+            await pool.run(release.wait)
+
+        release.set()
+        return await asyncio.gather(*running), excinfo.value
+
+    results, error = asyncio.run(run())
+
+    assert results == [True, True]
+    assert error.retry_after == 5
+    assert pool.stats()["rejected"] == 1
+    assert pool.pending == 0
+    pool.shutdown()
+
+
+def test_unknown_pool():
+    with pytest.raises(ValueError, match="Unknown worker pool"):
+        WorkerPool("fibers")
+
+
+def test_busy_endpoint_returns_503(monkeypatch):
+    pool = WorkerPool("thread", max_workers=1, max_queue=0, retry_after=3)
+    pool.pending = pool.capacity
+    monkeypatch.setattr(app_module, "get_worker_pool", lambda: pool)
+    client = TestClient(app_module.app)
+
+    response = client.post(
+        "/recommendations/", json={"movie": "Inception", "num_rec": 5}
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+    assert client.get("/").status_code == 200
+    pool.shutdown()